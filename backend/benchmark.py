@@ -0,0 +1,361 @@
+"""Offline load generator and benchmark for the try-on API.
+
+The FastAPI app runs in-process behind ``httpx.ASGITransport`` with Mongo
+replaced by ``mongomock-motor`` and results written to a temporary local blob
+store, so a run needs no network or database. Concurrent workers drive a
+weighted mix of operations and the report (throughput, p50/p95/p99 latency
+per operation, memory high-water marks and DB bytes written per job) is
+written as JSON::
+
+    python benchmark.py --concurrency 16 --duration 30 \\
+        --mix create=1,poll=4,batch_status=1,catalog_import=0.2,catalog_list=2,analytics=1 \\
+        --output run.json
+
+Server settings come from the environment as usual, e.g. ``TRYON_WORKERS``,
+``IMAGE_EXECUTOR`` or ``TRYON_BACKEND=fake`` with ``FAKE_INFERENCE_LATENCY_MS``.
+Rate limits are off unless their variables are set explicitly.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from PIL import Image
+
+OPERATIONS = ("create", "poll", "batch_status", "catalog_import", "catalog_list", "analytics")
+DEFAULT_MIX = "create=1,poll=4,batch_status=1,catalog_import=0.2,catalog_list=2,analytics=1"
+PLAN_TIERS = ("enterprise", "premium", "basic")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse ``name=weight,...`` into operation weights"""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile of already sorted samples"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 3)
+
+
+def max_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def test_image_base64(seed: int, size=(512, 768)) -> str:
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def catalog_ndjson(tenant_id: str, start: int, count: int) -> bytes:
+    lines = []
+    for i in range(start, start + count):
+        lines.append(json.dumps({
+            "productId": f"{tenant_id}-p{i:06d}",
+            "title": f"Benchmark product {i}",
+            "variants": [{"id": f"v{i}", "size": "M", "color": "blue"}]
+        }))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class OperationStats:
+    """Latencies and outcomes of one operation"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, latency_ms: float, status: str, failed: bool):
+        self.latencies_ms.append(latency_ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if failed:
+            self.errors += 1
+
+    def report(self, elapsed_seconds: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "throughput_rps": round(len(ordered) / elapsed_seconds, 3) if elapsed_seconds > 0 else None,
+            "latency_ms": {
+                "mean": round(sum(ordered) / len(ordered), 3) if ordered else None,
+                "p50": percentile(ordered, 0.50),
+                "p95": percentile(ordered, 0.95),
+                "p99": percentile(ordered, 0.99),
+                "max": round(ordered[-1], 3) if ordered else None
+            },
+            "statuses": dict(sorted(self.statuses.items()))
+        }
+
+
+class Benchmark:
+    """Drives a weighted operation mix against the app from ``concurrency`` workers"""
+
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.rng = random.Random(args.seed)
+        self.tenants = [f"bench-tenant-{i}" for i in range(args.tenants)]
+        self.person_images = [test_image_base64(i) for i in range(args.distinct_inputs)]
+        self.clothing_images = [test_image_base64(10000 + i) for i in range(args.distinct_inputs)]
+        self.job_ids: List[str] = []
+        self.next_product: Dict[str, int] = {tenant: 0 for tenant in self.tenants}
+        self.stats = {name: OperationStats() for name in self.mix}
+        self.operations: Dict[str, Callable[[], Awaitable[httpx.Response]]] = {
+            "create": self.create,
+            "poll": self.poll,
+            "batch_status": self.batch_status,
+            "catalog_import": self.catalog_import,
+            "catalog_list": self.catalog_list,
+            "analytics": self.analytics,
+        }
+
+    async def create(self) -> httpx.Response:
+        response = await self.client.post(
+            "/api/tryon/jobs",
+            params={"mode": self.args.job_mode},
+            json={
+                "tenant_id": self.rng.choice(self.tenants),
+                "person_image": self.rng.choice(self.person_images),
+                "clothing_image": self.rng.choice(self.clothing_images)
+            }
+        )
+        if response.status_code in (200, 202):
+            self.job_ids.append(response.json()["job_id"])
+        return response
+
+    async def poll(self) -> httpx.Response:
+        if not self.job_ids:
+            return await self.create()
+        return await self.client.get(f"/api/tryon/jobs/{self.rng.choice(self.job_ids)}")
+
+    async def batch_status(self) -> httpx.Response:
+        if not self.job_ids:
+            return await self.create()
+        job_ids = self.rng.sample(self.job_ids, min(len(self.job_ids), self.args.status_batch_size))
+        return await self.client.post("/api/tryon/jobs/status", json={"job_ids": job_ids})
+
+    async def catalog_import(self) -> httpx.Response:
+        tenant_id = self.rng.choice(self.tenants)
+        start = self.next_product[tenant_id]
+        self.next_product[tenant_id] = start + self.args.import_size
+        return await self.client.post(
+            "/api/catalog/import/ndjson",
+            params={"tenant_id": tenant_id},
+            content=catalog_ndjson(tenant_id, start, self.args.import_size),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+    async def catalog_list(self) -> httpx.Response:
+        return await self.client.get(
+            "/api/catalog/products",
+            params={"tenant_id": self.rng.choice(self.tenants), "limit": self.args.page_size}
+        )
+
+    async def analytics(self) -> httpx.Response:
+        return await self.client.get("/api/analytics/usage", params={"tenant_id": self.rng.choice(self.tenants)})
+
+    async def seed(self):
+        """Give every tenant a plan tier, some catalog products and a few jobs before measuring"""
+        for index, tenant_id in enumerate(self.tenants):
+            await self.client.post("/api/tenants", json={"client_id": tenant_id, "plan_tier": PLAN_TIERS[index % len(PLAN_TIERS)]})
+            self.next_product[tenant_id] = self.args.seed_products
+            await self.client.post(
+                "/api/catalog/import/ndjson",
+                params={"tenant_id": tenant_id},
+                content=catalog_ndjson(tenant_id, 0, self.args.seed_products),
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+        for _ in range(self.args.seed_jobs):
+            await self.create()
+
+    async def worker(self, deadline: float, budget: List[int]):
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            if budget:
+                if budget[0] <= 0:
+                    return
+                budget[0] -= 1
+            name = self.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self.operations[name]()
+                status, failed = str(response.status_code), response.status_code >= 400
+            except Exception as e:
+                status, failed = type(e).__name__, True
+            self.stats[name].record((time.perf_counter() - start) * 1000, status, failed)
+
+    async def run(self) -> Dict[str, Any]:
+        await self.seed()
+        if self.args.tracemalloc:
+            tracemalloc.start()
+        budget = [self.args.requests] if self.args.requests else []
+        deadline = time.perf_counter() + (self.args.duration if self.args.duration else float("inf"))
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(deadline, budget) for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        memory = {"max_rss_mb": max_rss_mb(resource.RUSAGE_SELF)}
+        if self.args.tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory["python_heap_peak_mb"] = round(peak / (1024 * 1024), 2)
+
+        total_requests = sum(len(stats.latencies_ms) for stats in self.stats.values())
+        return {
+            "started_at": started_at.isoformat(),
+            "elapsed_seconds": round(elapsed, 3),
+            "config": {
+                "concurrency": self.args.concurrency,
+                "duration": self.args.duration,
+                "requests": self.args.requests,
+                "mix": self.mix,
+                "tenants": self.args.tenants,
+                "job_mode": self.args.job_mode,
+                "distinct_inputs": self.args.distinct_inputs,
+                "seed": self.args.seed,
+                "server": {
+                    name: os.environ.get(name)
+                    for name in ("TRYON_WORKERS", "TRYON_QUEUE_SIZE", "IMAGE_EXECUTOR", "IMAGE_EXECUTOR_WORKERS", "TRYON_BACKEND")
+                }
+            },
+            "totals": {
+                "requests": total_requests,
+                "errors": sum(stats.errors for stats in self.stats.values()),
+                "throughput_rps": round(total_requests / elapsed, 3) if elapsed > 0 else None
+            },
+            "operations": {name: stats.report(elapsed) for name, stats in self.stats.items()},
+            "memory": memory
+        }
+
+
+def write_path_report(server) -> Dict[str, Any]:
+    """Job write volume and response serialization time, from the server's own counters since startup"""
+    jobs = server.stage_metrics.jobs.total()
+    written = {
+        operation: int(server.db_bytes_written.total(operation=operation))
+        for operation in ("insert", "status", "result", "failure")
+    }
+    serialization_ms, serialized = server.stage_metrics.stage_latency.total(stage="serialization")
+    return {
+        "jobs_finished": int(jobs),
+        "db_bytes_written": written,
+        "db_bytes_per_job": round(sum(written.values()) / jobs, 1) if jobs else None,
+        "sync_responses_serialized": serialized,
+        "serialization_ms_mean": round(serialization_ms / serialized, 3) if serialized else None,
+        "json_encoder": "orjson" if server.orjson is not None else "json"
+    }
+
+
+def offline_environment(workdir: str):
+    """Point the server at throwaway local storage before it is imported"""
+    os.environ.setdefault("MONGO_URL", "mongodb://benchmark.invalid")
+    os.environ.setdefault("DB_NAME", "tryon_benchmark")
+    os.environ["BLOB_STORE"] = "local"
+    os.environ["BLOB_STORE_DIR"] = os.path.join(workdir, "blobs")
+    os.environ.setdefault("RESULT_CACHE_STORE", "mongo")
+    os.environ["RESULT_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ.setdefault("TENANT_RATE_LIMIT_PER_SECOND", "0")
+    os.environ.setdefault("SESSION_RATE_LIMIT_PER_SECOND", "0")
+    # mongomock has no $bsonSize
+    os.environ.setdefault("RETENTION_MEASURE_BYTES", "false")
+    # Garment URLs may only point at a stand-in server on this machine
+    os.environ.setdefault("GARMENT_SOURCE_URL_ORIGINS", "http://localhost,http://127.0.0.1")
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("The benchmark needs mongomock-motor: pip install mongomock-motor")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="tryon-benchmark-") as workdir:
+        offline_environment(workdir)
+        import server
+
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                # Measure the warmed-up service, as a load balancer would only route to it once ready
+                while (await client.get("/ready")).status_code != 200:
+                    await asyncio.sleep(0.05)
+                report = await Benchmark(client, args).run()
+            report["write_path"] = write_path_report(server)
+            report["startup"] = server.startup_timer.report()
+        # Only counts image executor processes once they have exited at shutdown
+        report["memory"]["children_max_rss_mb"] = max_rss_mb(resource.RUSAGE_CHILDREN)
+        return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client workers")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run; 0 runs until --requests are sent")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--tenants", type=int, default=3, help="Tenants to spread load over, cycling through plan tiers")
+    parser.add_argument("--job-mode", choices=("sync", "async"), default="async")
+    parser.add_argument("--distinct-inputs", type=int, default=8, help="Distinct person and garment images; fewer means more cache hits")
+    parser.add_argument("--seed-products", type=int, default=500, help="Catalog products imported per tenant before measuring")
+    parser.add_argument("--seed-jobs", type=int, default=10, help="Jobs created before measuring, so polls have targets")
+    parser.add_argument("--import-size", type=int, default=200, help="Products per catalog_import request")
+    parser.add_argument("--page-size", type=int, default=100, help="Products per catalog_list page")
+    parser.add_argument("--status-batch-size", type=int, default=50, help="Job ids per batch_status request")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the operation mix")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slows the run)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = json.dumps(asyncio.run(main(arguments)), indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            f.write(result + "\n")
+    else:
+        print(result)
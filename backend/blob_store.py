@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class BlobNotFoundError(Exception):
+    """Raised when a blob key does not exist in the store"""
+
+
+class BlobInfo(BaseModel):
+    key: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+class BlobStore:
+    """Interface for storing result images outside of the job documents"""
+
+    async def put(self, key: str, data: bytes, content_type: str) -> BlobInfo:
+        raise NotImplementedError
+
+    def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield the blob in chunks; raises BlobNotFoundError on first iteration if missing"""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> int:
+        """Delete a blob and return the number of bytes reclaimed (0 if it did not exist)"""
+        raise NotImplementedError
+
+    async def read(self, key: str) -> bytes:
+        chunks = [chunk async for chunk in self.stream(key)]
+        return b"".join(chunks)
+
+    async def close(self):
+        pass
+
+
+def blob_info(key: str, data: bytes, content_type: str) -> BlobInfo:
+    return BlobInfo(
+        key=key,
+        size=len(data),
+        sha256=hashlib.sha256(data).hexdigest(),
+        content_type=content_type
+    )
+
+
+class LocalBlobStore(BlobStore):
+    """Blob store backed by a directory on the local filesystem"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        if path.exists() and path.stat().st_size == len(data):
+            # Keys are content addressed, so an existing file already holds these bytes
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def _delete(self, key: str) -> int:
+        path = self._path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            return size
+        except FileNotFoundError:
+            return 0
+
+    async def put(self, key: str, data: bytes, content_type: str) -> BlobInfo:
+        await asyncio.to_thread(self._write, key, data)
+        return blob_info(key, data, content_type)
+
+    async def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        try:
+            handle = await asyncio.to_thread(open, self._path(key), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            handle.close()
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).exists)
+
+    async def delete(self, key: str) -> int:
+        return await asyncio.to_thread(self._delete, key)
+
+
+class GridFSBlobStore(BlobStore):
+    """Blob store backed by a GridFS bucket in the application database"""
+
+    def __init__(self, db, bucket_name: str = "tryon_results"):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def put(self, key: str, data: bytes, content_type: str) -> BlobInfo:
+        if not await self.exists(key):
+            await self.bucket.upload_from_stream(
+                key,
+                data,
+                metadata={"content_type": content_type}
+            )
+        return blob_info(key, data, content_type)
+
+    async def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        from gridfs.errors import NoFile
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            raise BlobNotFoundError(key)
+        while True:
+            chunk = await grid_out.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def exists(self, key: str) -> bool:
+        return await self.files.find_one({"filename": key}, {"_id": 1}) is not None
+
+    async def delete(self, key: str) -> int:
+        reclaimed = 0
+        async for file_doc in self.files.find({"filename": key}, {"_id": 1, "length": 1}):
+            await self.bucket.delete(file_doc["_id"])
+            reclaimed += file_doc.get("length", 0)
+        return reclaimed
+
+
+class S3BlobStore(BlobStore):
+    """Blob store for S3 or any S3-compatible service (e.g. a local MinIO)"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region_name: Optional[str] = None):
+        import boto3
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+
+    def _is_missing(self, error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def put(self, key: str, data: bytes, content_type: str) -> BlobInfo:
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type
+        )
+        return blob_info(key, data, content_type)
+
+    async def stream(self, key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        try:
+            response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._is_missing(e):
+                raise BlobNotFoundError(key)
+            raise
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    async def delete(self, key: str) -> int:
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._is_missing(e):
+                return 0
+            raise
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+        return head.get("ContentLength", 0)
+
+
+def create_blob_store(kind: str, db=None, root: Optional[str] = None, bucket: Optional[str] = None,
+                      endpoint_url: Optional[str] = None, region_name: Optional[str] = None) -> BlobStore:
+    """Build the configured blob store implementation"""
+    if kind == "local":
+        return LocalBlobStore(root)
+    if kind == "gridfs":
+        return GridFSBlobStore(db, bucket_name=bucket or "tryon_results")
+    if kind == "s3":
+        return S3BlobStore(bucket, endpoint_url=endpoint_url, region_name=region_name)
+    raise ValueError(f"Unknown blob store: {kind}")
@@ -0,0 +1,180 @@
+import json
+import logging
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Gzipped bodies are inflated at most this much per step, so one small chunk cannot expand in memory
+GUNZIP_STEP_BYTES = 256 * 1024
+
+
+class CatalogLineError(Exception):
+    """Raised for an NDJSON line that cannot be parsed"""
+
+
+class CatalogTooLargeError(Exception):
+    """Raised when an NDJSON body inflates past the import size limit"""
+
+
+class CatalogImporter:
+    """Buffers product upserts and writes them as unordered ``bulk_write`` batches.
+
+    ``build_update`` turns one product payload into an ``UpdateOne``; payloads
+    it rejects (any exception) are counted as errors without failing the batch.
+    """
+
+    def __init__(self, collection, build_update: Callable[[Dict[str, Any]], UpdateOne], batch_size: int = 1000):
+        self.collection = collection
+        self.build_update = build_update
+        self.batch_size = max(1, batch_size)
+        self.batches: List[Dict[str, Any]] = []
+        self.received = 0
+        self.upserted = 0
+        self.modified = 0
+        self.matched = 0
+        self.errors = 0
+        self._pending: List[UpdateOne] = []
+        self._pending_errors = 0
+        self._started = time.perf_counter()
+
+    async def add(self, product_data: Dict[str, Any]):
+        self.received += 1
+        try:
+            self._pending.append(self.build_update(product_data))
+        except Exception as e:
+            logger.warning(f"Skipping invalid catalog product: {str(e)}")
+            self._pending_errors += 1
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    def add_error(self):
+        """Count an input that never became a product (e.g. a malformed line)"""
+        self.received += 1
+        self._pending_errors += 1
+
+    async def flush(self):
+        if not self._pending and not self._pending_errors:
+            return
+        ops, self._pending = self._pending, []
+        batch = {
+            "batch": len(self.batches) + 1,
+            "products": len(ops) + self._pending_errors,
+            "upserted": 0,
+            "modified": 0,
+            "matched": 0,
+            "errors": self._pending_errors
+        }
+        self._pending_errors = 0
+
+        start = time.perf_counter()
+        if ops:
+            try:
+                result = await self.collection.bulk_write(ops, ordered=False)
+                details = {
+                    "nUpserted": result.upserted_count,
+                    "nModified": result.modified_count,
+                    "nMatched": result.matched_count,
+                    "writeErrors": []
+                }
+            except BulkWriteError as e:
+                # Unordered batches keep going past failures; count what made it
+                details = e.details
+            batch["upserted"] = details.get("nUpserted", 0)
+            batch["modified"] = details.get("nModified", 0)
+            batch["matched"] = details.get("nMatched", 0)
+            batch["errors"] += len(details.get("writeErrors", []))
+        batch["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        self.upserted += batch["upserted"]
+        self.modified += batch["modified"]
+        self.matched += batch["matched"]
+        self.errors += batch["errors"]
+        self.batches.append(batch)
+
+    def summary(self) -> Dict[str, Any]:
+        duration_s = time.perf_counter() - self._started
+        written = self.upserted + self.matched
+        return {
+            "imported_products": written,
+            "received_products": self.received,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "errors": self.errors,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "duration_ms": round(duration_s * 1000, 2),
+            "products_per_second": round(written / duration_s, 2) if duration_s > 0 else 0
+        }
+
+
+def gunzip(decompressor, data: bytes) -> Iterator[bytes]:
+    """Inflate ``data`` in bounded steps, draining ``unconsumed_tail`` between them"""
+    while True:
+        piece = decompressor.decompress(data, GUNZIP_STEP_BYTES)
+        if piece:
+            yield piece
+        data = decompressor.unconsumed_tail
+        if not data and len(piece) < GUNZIP_STEP_BYTES:
+            return
+
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int,
+    max_total_bytes: Optional[int] = None
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Parse NDJSON from a byte stream incrementally, transparently gunzipping it.
+
+    Yields one object per non-blank line, or ``None`` for a line that is not a
+    JSON object so the caller can count it as an error and keep going. Raises
+    ``CatalogTooLargeError`` once more than ``max_total_bytes`` have been
+    read after decompression.
+    """
+    decompressor = None
+    first_chunk = True
+    buffer = b""
+    total = 0
+
+    async for chunk in chunks:
+        if first_chunk and chunk:
+            first_chunk = False
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for piece in (gunzip(decompressor, chunk) if decompressor is not None else (chunk,)):
+            total += len(piece)
+            if max_total_bytes is not None and total > max_total_bytes:
+                raise CatalogTooLargeError(f"NDJSON body exceeds {max_total_bytes} bytes")
+            buffer += piece
+
+            *lines, buffer = buffer.split(b"\n")
+            if len(buffer) > max_line_bytes:
+                raise CatalogLineError(f"NDJSON line exceeds {max_line_bytes} bytes")
+            for line in lines:
+                parsed = parse_ndjson_line(line)
+                if parsed is not False:
+                    yield parsed
+
+    if decompressor is not None:
+        buffer += decompressor.flush()
+    for line in buffer.split(b"\n"):
+        parsed = parse_ndjson_line(line)
+        if parsed is not False:
+            yield parsed
+
+
+def parse_ndjson_line(line: bytes):
+    """Parse one line: the object, ``None`` if invalid, ``False`` if blank"""
+    line = line.strip()
+    if not line:
+        return False
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,57 @@
+"""Stand-in for a remote try-on inference service, for local testing.
+
+Run it with ``uvicorn fake_inference:app --port 8010`` and point the API at it
+with ``TRYON_BACKEND=http TRYON_BACKEND_URL=http://localhost:8010``, or set
+``TRYON_BACKEND=fake`` to mount it in-process behind the same HTTP client.
+Latency and failures are injected through ``FAKE_INFERENCE_*`` variables.
+"""
+import asyncio
+import io
+import json
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+
+from imaging import OUTPUT_SIZE, encode_image, flatten_to_rgb, render_demo_tryon
+
+FAKE_INFERENCE_LATENCY_MS = float(os.environ.get('FAKE_INFERENCE_LATENCY_MS', '0'))
+FAKE_INFERENCE_JITTER_MS = float(os.environ.get('FAKE_INFERENCE_JITTER_MS', '0'))
+FAKE_INFERENCE_FAILURE_RATE = float(os.environ.get('FAKE_INFERENCE_FAILURE_RATE', '0'))
+
+app = FastAPI(title="Fake try-on inference")
+
+
+def render_placeholder(person_bytes: bytes, clothing_bytes: bytes, output_size) -> bytes:
+    # Decoding both inputs makes malformed uploads fail like a real model would
+    person = flatten_to_rgb(Image.open(io.BytesIO(person_bytes)))
+    clothing = flatten_to_rgb(Image.open(io.BytesIO(clothing_bytes)))
+    return encode_image(render_demo_tryon(person, clothing, output_size), 'PNG', compress_level=1)
+
+
+@app.post("/render")
+async def render(request: Request):
+    form = await request.form()
+    try:
+        person_bytes = await form["person_image"].read()
+        clothing_bytes = await form["clothing_image"].read()
+        settings = json.loads(form.get("settings") or "{}")
+    except (KeyError, AttributeError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"detail": f"Bad render request: {str(e)}"})
+    finally:
+        await form.close()
+
+    delay_ms = FAKE_INFERENCE_LATENCY_MS + random.uniform(0, FAKE_INFERENCE_JITTER_MS)
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000)
+    if random.random() < FAKE_INFERENCE_FAILURE_RATE:
+        return JSONResponse(status_code=503, content={"detail": "Injected failure"})
+
+    output_size = tuple(settings.get("output_size") or OUTPUT_SIZE)
+    try:
+        result = await asyncio.to_thread(render_placeholder, person_bytes, clothing_bytes, output_size)
+    except Exception as e:
+        return JSONResponse(status_code=422, content={"detail": f"Invalid image data: {str(e)}"})
+    return Response(content=result, media_type="image/png")
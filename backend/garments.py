@@ -0,0 +1,283 @@
+import asyncio
+import base64
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from cachetools import LRUCache
+
+from imaging import load_prepared_input, prepare_stored_input
+
+logger = logging.getLogger(__name__)
+
+# Pre-warming only runs when no try-on work is waiting for the image executor
+PREWARM_PRIORITY = 10
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class GarmentSourceError(Exception):
+    """Raised when a variant's garment image cannot be loaded"""
+
+
+def garment_asset_key(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    return f"garments/{digest[:2]}/{digest}.png"
+
+
+def url_origin(url: str) -> Optional[Tuple[str, str, int]]:
+    """``(scheme, host, port)`` of an http(s) URL with the default port filled in, or None"""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    return scheme, parts.hostname, port or DEFAULT_PORTS[scheme]
+
+
+def image_size(entry: Tuple[Any, bytes]) -> int:
+    image = entry[0]
+    return image.width * image.height * len(image.getbands())
+
+
+class GarmentSources:
+    """Loads the original garment image a catalog variant points at.
+
+    A variant's ``image`` is base64 (optionally a data URI) or an http(s) URL
+    on one of ``allowed_origins``, e.g. a local stand-in server; scheme, host
+    and port must match exactly, an origin without a port meaning the
+    scheme's default. ``image_path`` is a file under ``root``.
+    """
+
+    def __init__(self, root: Optional[str], allowed_origins: Tuple[str, ...] = (), timeout: float = 10):
+        self.root = Path(root) if root else None
+        self.allowed_origins = set()
+        for origin in allowed_origins:
+            if not origin.strip():
+                continue
+            parsed = url_origin(origin)
+            if parsed is None:
+                logger.warning(f"Ignoring invalid garment source origin: {origin}")
+            else:
+                self.allowed_origins.add(parsed)
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def has_source(variant: Dict[str, Any]) -> bool:
+        return bool(variant.get("image") or variant.get("image_path"))
+
+    def _read_path(self, relative: str) -> bytes:
+        if self.root is None:
+            raise GarmentSourceError("Garment image paths are not enabled")
+        path = (self.root / relative).resolve()
+        if self.root.resolve() not in path.parents:
+            raise GarmentSourceError(f"Garment image path outside the source directory: {relative}")
+        try:
+            return path.read_bytes()
+        except OSError as e:
+            raise GarmentSourceError(f"Cannot read garment image {relative}: {str(e)}")
+
+    async def _fetch(self, url: str) -> bytes:
+        if url_origin(url) not in self.allowed_origins:
+            raise GarmentSourceError(f"Garment image URL not allowed: {url}")
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=False)
+        try:
+            response = await self._client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise GarmentSourceError(f"Cannot fetch garment image {url}: {str(e)}")
+        return response.content
+
+    async def load(self, variant: Dict[str, Any]) -> bytes:
+        if variant.get("image_path"):
+            return await asyncio.to_thread(self._read_path, variant["image_path"])
+        image = variant.get("image")
+        if not image:
+            raise GarmentSourceError("Variant has no garment image")
+        if image.startswith(("http://", "https://")):
+            return await self._fetch(image)
+        if image.startswith("data:image"):
+            image = image.split(",", 1)[1]
+        try:
+            return base64.b64decode(image)
+        except ValueError as e:
+            raise GarmentSourceError(f"Invalid base64 garment image: {str(e)}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GarmentAssets:
+    """Garment images prepared ahead of try-on jobs, keyed by tenant, product, variant and ``max_res``.
+
+    ``enqueue`` hands imported products to background workers that load each
+    variant's source, preprocess it on the image executor at the tenant's
+    default ``max_res`` and store it losslessly in the blob store, recorded in
+    ``collection``. ``get`` serves prepared images from a memory LRU bounded
+    by ``max_bytes``, falling back to the stored asset. Assets keep the
+    digest of their source, so jobs using them share result cache entries
+    with jobs that uploaded the same garment.
+    """
+
+    def __init__(
+        self,
+        collection,
+        catalog,
+        blob_store,
+        image_executor,
+        sources: GarmentSources,
+        default_max_res: Callable[[str], Awaitable[int]],
+        max_bytes: int,
+        workers: int = 2,
+        max_queue: int = 10000,
+        outcomes=None
+    ):
+        self.collection = collection
+        self.catalog = catalog
+        self.blob_store = blob_store
+        self.image_executor = image_executor
+        self.sources = sources
+        self.default_max_res = default_max_res
+        self.memory = LRUCache(maxsize=max(1, max_bytes), getsizeof=image_size)
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.outcomes = outcomes
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _count(self, outcome: str, amount: int = 1):
+        if self.outcomes is not None:
+            self.outcomes.inc(outcome, amount=amount)
+
+    def _remember(self, key: tuple, image: Any, digest: bytes):
+        if image_size((image, digest)) <= self.memory.maxsize:
+            self.memory[key] = (image, digest)
+
+    async def get(self, tenant_id: str, product_id: str, variant_id: str, max_res: int, priority: int) -> Optional[Tuple[Any, bytes]]:
+        """The prepared garment image and its source digest, or None if it was not pre-warmed at ``max_res``"""
+        key = (tenant_id, product_id, variant_id, max_res)
+        cached = self.memory.get(key)
+        if cached is not None:
+            return cached
+        asset = await self.collection.find_one(
+            {"tenant_id": tenant_id, "product_id": product_id, "variant_id": variant_id, "max_res": max_res},
+            {"_id": 0, "blob_key": 1, "source_digest": 1}
+        )
+        if asset is None:
+            return None
+        try:
+            data = await self.blob_store.read(asset["blob_key"])
+        except Exception as e:
+            logger.warning(f"Garment asset {asset['blob_key']} unreadable: {str(e)}")
+            return None
+        image = await self.image_executor.run(load_prepared_input, data, priority=priority)
+        digest = bytes.fromhex(asset["source_digest"])
+        self._remember(key, image, digest)
+        return image, digest
+
+    async def prewarm_variant(self, tenant_id: str, product_id: str, variant: Dict[str, Any], max_res: int) -> str:
+        """Prepare and store one variant's garment, returning the outcome"""
+        variant_id = str(variant["id"])
+        source = await self.sources.load(variant)
+        source_digest = hashlib.sha256(source).hexdigest()
+        query = {"tenant_id": tenant_id, "product_id": product_id, "variant_id": variant_id, "max_res": max_res}
+        existing = await self.collection.find_one(query, {"_id": 0, "source_digest": 1})
+        if existing is not None and existing.get("source_digest") == source_digest:
+            return "unchanged"
+
+        data, width, height, _ = await self.image_executor.run(
+            prepare_stored_input, source, max_res, priority=PREWARM_PRIORITY
+        )
+        del source
+        blob = await self.blob_store.put(garment_asset_key(data), data, "image/png")
+        await self.collection.update_one(
+            query,
+            {"$set": {
+                **query,
+                "blob_key": blob.key,
+                "source_digest": source_digest,
+                "width": width,
+                "height": height,
+                "size": blob.size,
+                "prepared_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+        # A re-imported garment must not be served from the old decoded copy
+        self.memory.pop((tenant_id, product_id, variant_id, max_res), None)
+        return "prepared"
+
+    async def prewarm_product(self, tenant_id: str, product_id: str):
+        product = await self.catalog.find_one(
+            {"tenant_id": tenant_id, "product_id": product_id},
+            {"_id": 0, "variants": 1}
+        )
+        if product is None:
+            return
+        max_res = await self.default_max_res(tenant_id)
+        for variant in product.get("variants") or []:
+            if not isinstance(variant, dict) or variant.get("id") is None or not self.sources.has_source(variant):
+                self._count("no_source")
+                continue
+            try:
+                self._count(await self.prewarm_variant(tenant_id, product_id, variant, max_res))
+            except Exception as e:
+                logger.warning(f"Pre-warming garment {tenant_id}/{product_id}/{variant.get('id')} failed: {str(e)}")
+                self._count("failed")
+
+    def enqueue(self, tenant_id: str, product_ids: List[str]) -> int:
+        """Queue products for pre-warming and return how many fit in the queue"""
+        if self._queue is None:
+            return 0
+        queued = 0
+        for product_id in product_ids:
+            try:
+                self._queue.put_nowait((tenant_id, product_id))
+                queued += 1
+            except asyncio.QueueFull:
+                break
+        if queued < len(product_ids):
+            self._count("dropped", len(product_ids) - queued)
+        return queued
+
+    async def _worker(self):
+        while True:
+            tenant_id, product_id = await self._queue.get()
+            try:
+                await self.prewarm_product(tenant_id, product_id)
+            except Exception as e:
+                logger.error(f"Pre-warming product {tenant_id}/{product_id} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"garment-prewarm-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        await self.sources.close()
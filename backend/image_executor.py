@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY = 2
+
+
+class PrioritySlots:
+    """Counting semaphore that hands freed slots to the lowest priority value first.
+
+    Waiters with equal priority are served in arrival order.
+    """
+
+    def __init__(self, slots: int):
+        self._free = slots
+        self._waiters: List[list] = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority: int = DEFAULT_PRIORITY):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._order), future])
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller was cancelled
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # Cancelled waiters are left in the heap and skipped here
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+
+class ImageExecutor:
+    """Runs CPU-bound image work off the event loop.
+
+    Uses a ``ProcessPoolExecutor`` by default and falls back to a thread pool
+    when processes are unavailable (restricted containers, broken pools) or
+    when configured with ``kind="thread"``. At most ``queue_depth`` calls are
+    handed to the pool at once; further callers wait for a slot, and freed
+    slots go to the waiting caller with the lowest ``priority`` value.
+    """
+
+    def __init__(self, kind: str = "process", workers: Optional[int] = None, queue_depth: Optional[int] = None):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown image executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_depth = max(1, queue_depth or self.workers * 2)
+        self._pool: Optional[Executor] = None
+        self._slots: Optional[PrioritySlots] = None
+        self._in_flight = 0
+        self._waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls currently submitted to the pool"""
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers waiting for a free submission slot"""
+        return self._waiting
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of pool workers busy, assuming submitted calls keep workers occupied"""
+        return min(self._in_flight, self.workers) / self.workers
+
+    def start(self):
+        if self._pool is not None:
+            return
+        self._slots = PrioritySlots(self.queue_depth)
+        if self.kind == "process":
+            try:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, NotImplementedError, PermissionError) as e:
+                logger.warning(f"Process pool unavailable ({str(e)}), falling back to threads")
+                self.kind = "thread"
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+        logger.info(f"Started {self.kind} image executor with {self.workers} workers (queue depth {self.queue_depth})")
+
+    async def warm_up(self, fn: Callable[[], Any]) -> int:
+        """Start the pool's workers by running ``fn`` once per worker, e.g. to load codecs.
+
+        Process pools spawn workers on demand, so without this the first jobs
+        pay for interpreter start-up and imports. Returns how many distinct
+        results came back (one per process when ``fn`` returns its pid).
+        """
+        results = await asyncio.gather(*(self.run(fn) for _ in range(self.workers)))
+        return len(set(results))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _fall_back_to_threads(self, reason: str):
+        if self.kind == "thread":
+            # Another caller already replaced the broken pool
+            return
+        logger.warning(f"Image process pool broken ({reason}), falling back to threads")
+        self.shutdown()
+        self.kind = "thread"
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+
+    async def run(self, fn: Callable[..., Any], *args: Any, priority: int = DEFAULT_PRIORITY) -> Any:
+        """Run ``fn(*args)`` on the pool and await its result; lower ``priority`` values go first"""
+        if self._pool is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        self._waiting += 1
+        try:
+            await self._slots.acquire(priority)
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        # The slot is held until the pool work itself finishes: a caller cancelled
+        # by a timeout cannot take back work already handed to the pool
+        work = asyncio.ensure_future(self._submit(loop, fn, *args))
+        work.add_done_callback(self._finished)
+        return await asyncio.shield(work)
+
+    async def _submit(self, loop: asyncio.AbstractEventLoop, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        except BrokenProcessPool as e:
+            self._fall_back_to_threads(str(e))
+            return await loop.run_in_executor(self._pool, fn, *args)
+
+    def _finished(self, work: asyncio.Future):
+        self._in_flight -= 1
+        self._slots.release()
+        if not work.cancelled():
+            # Retrieve the error of work whose caller went away, so it is not logged as unhandled
+            work.exception()
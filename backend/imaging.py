@@ -0,0 +1,347 @@
+"""Pillow work for the try-on pipeline.
+
+Everything here is plain, picklable, module-level functions so it can run in a
+worker process of the image executor without touching the event loop.
+"""
+import functools
+import io
+import os
+import threading
+import time
+from typing import Optional, Union
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+OUTPUT_SIZE = (1024, 1536)
+WATERMARK_TEXT = "TryOn.fit"
+
+# JPEG quality of the inputs uploaded to a remote inference backend
+REMOTE_INPUT_QUALITY = 92
+
+# Pillow encoder name, content type and file extension per output format
+OUTPUT_FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "avif": ("AVIF", "image/avif", "avif"),
+}
+
+# Width of each rendition produced per job, largest first; None keeps the full canvas
+RENDITIONS = {
+    "full": None,
+    "mobile": 640,
+    "thumb": 256,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def format_available(output_format: str) -> bool:
+    """Whether this Pillow build can encode the format (WebP and AVIF are optional)"""
+    if output_format in ("webp", "avif"):
+        try:
+            return bool(features.check(output_format))
+        except ValueError:
+            # Pillow versions without AVIF support do not know the feature at all
+            return False
+    return output_format in OUTPUT_FORMATS
+
+DEMO_TEXT = "DEMO TRY-ON RESULT\n\nThis is a placeholder image.\nIn production, this would be\na realistic try-on generated\nby OpenAI's image API."
+
+
+def flatten_to_rgb(img: Image.Image, background=(255, 255, 255)) -> Image.Image:
+    """Convert any mode to RGB, compositing transparency onto a solid background"""
+    if img.mode == 'RGB':
+        return img
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        canvas = Image.new('RGB', rgba.size, background)
+        canvas.paste(rgba, mask=rgba.getchannel('A'))
+        return canvas
+    return img.convert('RGB')
+
+
+# EXIF orientation tag values mapped to the transpose that puts the image upright
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+
+def check_input(image_bytes: bytes):
+    """Cheaply reject data that is not an image Pillow can open; only the header is read"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)):
+            pass
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+
+def decode_input(image_bytes: bytes, max_res: int) -> tuple[Image.Image, Optional[int]]:
+    """Decode an input image, returning it with its EXIF orientation.
+
+    Large JPEGs are decoded in draft mode at the smallest DCT scale whose
+    longest side still covers ``max_res``, so the decoder skips most pixels.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.format == 'JPEG' and max(img.size) > max_res:
+            ratio = max_res / max(img.size)
+            img.draft('RGB', (max(1, int(img.width * ratio)), max(1, int(img.height * ratio))))
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG)
+        img.load()
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+    return img, orientation
+
+
+# Modes Image.reduce and the LANCZOS resize accept as they are
+RESAMPLE_MODES = ("L", "LA", "RGB", "RGBA")
+
+
+def normalize_input(img: Image.Image, orientation: Optional[int], max_res: int) -> Image.Image:
+    """Shrink, rotate upright, convert to RGB and strip metadata.
+
+    The longest side is brought down to ``max_res`` with a cheap integer
+    ``reduce`` followed by one resampling pass. Resizing happens before the
+    EXIF rotation since the longest side does not change under rotation.
+    Modes ``reduce`` cannot handle (palette, bilevel, 16-bit) are flattened
+    to RGB first; the rest are flattened once they are small.
+    """
+    if img.mode not in RESAMPLE_MODES:
+        img = flatten_to_rgb(img)
+    longest = max(img.size)
+    if longest > max_res:
+        factor = longest // max_res
+        if factor >= 2:
+            img = img.reduce(factor)
+        scale = max_res / max(img.size)
+        if scale < 1:
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.Resampling.LANCZOS)
+
+    if orientation in EXIF_TRANSPOSE:
+        img = img.transpose(EXIF_TRANSPOSE[orientation])
+
+    img = flatten_to_rgb(img)
+    # Drop EXIF, ICC and any other ancillary chunks picked up from the upload
+    img.info = {}
+    return img
+
+
+def encode_image(img: Image.Image, format: str = 'PNG', **params) -> bytes:
+    """Encode a PIL image to bytes; ``params`` are passed to the encoder"""
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+# FreeType faces must not be shared between threads, so thread pools keep one font per thread
+_fonts = threading.local()
+
+
+def default_font() -> ImageFont.ImageFont:
+    """Pillow's default font, loaded once per worker rather than on every render"""
+    font = getattr(_fonts, "default", None)
+    if font is None:
+        font = _fonts.default = ImageFont.load_default()
+    return font
+
+
+def warm_up() -> int:
+    """Register Pillow's codecs, load the font and round-trip a tiny image through every
+    available output format, so the first job in this process does not pay for it.
+
+    Returns the process id, letting callers count the workers they reached.
+    """
+    Image.init()
+    default_font()
+    img = Image.new('RGB', (16, 16))
+    for output_format, (encoder, _, _) in OUTPUT_FORMATS.items():
+        if format_available(output_format):
+            Image.open(io.BytesIO(encode_image(img, encoder))).load()
+    return os.getpid()
+
+
+def render_demo_tryon(person: Image.Image, clothing: Image.Image, output_size=OUTPUT_SIZE) -> Image.Image:
+    """Render the placeholder try-on result (purple canvas with text)"""
+    width, height = output_size
+    img = Image.new('RGB', (width, height), color=(72, 72, 192))
+    draw = ImageDraw.Draw(img)
+    font = default_font()
+
+    # Calculate text position for centering
+    bbox = draw.textbbox((0, 0), DEMO_TEXT, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (width - text_width) // 2
+    y = (height - text_height) // 2
+
+    draw.multiline_text((x, y), DEMO_TEXT, fill=(255, 255, 255), font=font, align='center')
+    return img
+
+
+def apply_watermark(img: Image.Image, text: str = WATERMARK_TEXT) -> Image.Image:
+    """Stamp the watermark text in the bottom-right corner"""
+    draw = ImageDraw.Draw(img)
+    font = default_font()
+    bbox = draw.textbbox((0, 0), text, font=font)
+    margin = max(8, img.width // 64)
+    x = img.width - (bbox[2] - bbox[0]) - margin
+    y = img.height - (bbox[3] - bbox[1]) - margin
+    draw.text((x, y), text, fill=(255, 255, 255), font=font)
+    return img
+
+
+def elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def encode_params(output_format: str, settings: dict) -> dict:
+    """Encoder arguments for a format: compression level for PNG, quality for the lossy ones"""
+    if output_format == "png":
+        return {"compress_level": settings["png_compress_level"]}
+    if output_format == "webp":
+        return {"quality": settings["quality"], "method": 4}
+    return {"quality": settings["quality"]}
+
+
+def encode_renditions(result: Image.Image, settings: dict) -> dict:
+    """Encode the result once per rendition, each resized from the next larger one.
+
+    Returns ``{name: {"data", "width", "height", "encode_ms"}}``.
+    """
+    output_format = settings["format"]
+    pillow_format = OUTPUT_FORMATS[output_format][0]
+    params = encode_params(output_format, settings)
+    renditions = {}
+    img = result
+    for name, width in settings["renditions"].items():
+        if width is not None and width < img.width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        start = time.perf_counter()
+        data = encode_image(img, pillow_format, **params)
+        renditions[name] = {"data": data, "width": img.width, "height": img.height, "encode_ms": elapsed_ms(start)}
+    return renditions
+
+
+def prepare_input(image_bytes: bytes, max_res: int) -> tuple[Image.Image, dict]:
+    """Decode and normalize one input, returning it with its decode/preprocessing times in ms"""
+    start = time.perf_counter()
+    img, orientation = decode_input(image_bytes, max_res)
+    decode_ms = elapsed_ms(start)
+
+    start = time.perf_counter()
+    img = normalize_input(img, orientation, max_res)
+    return img, {"decode": decode_ms, "preprocessing": elapsed_ms(start)}
+
+
+def encode_prepared_input(img: Image.Image) -> bytes:
+    """Store a prepared input as fast lossless PNG, read back by ``load_prepared_input``"""
+    return encode_image(img, 'PNG', compress_level=1)
+
+
+def prepare_stored_input(image_bytes: bytes, max_res: int) -> tuple[bytes, int, int, dict]:
+    """``prepare_input`` for an asset kept for later jobs, encoded as fast lossless PNG.
+
+    Returns the PNG bytes, the prepared width and height and the decode/preprocessing times in ms.
+    """
+    img, timings = prepare_input(image_bytes, max_res)
+    return encode_prepared_input(img), img.width, img.height, timings
+
+
+def load_prepared_input(data: bytes) -> Image.Image:
+    """Decode an asset written by ``encode_prepared_input``; it needs no further preprocessing"""
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def prepare_inputs(sources, max_res: int) -> tuple[list, dict]:
+    """``prepare_input`` for each source, passing through images that are already prepared"""
+    timings = {"decode": 0.0, "preprocessing": 0.0}
+    inputs = []
+    for source in sources:
+        if isinstance(source, Image.Image):
+            inputs.append(source)
+            continue
+        img, measured = prepare_input(source, max_res)
+        for stage, duration_ms in measured.items():
+            timings[stage] = round(timings[stage] + duration_ms, 2)
+        inputs.append(img)
+    return inputs, timings
+
+
+def render_tryon(
+    person: Union[bytes, Image.Image],
+    clothing: Union[bytes, Image.Image],
+    settings: dict
+) -> tuple[dict, dict]:
+    """Decode and preprocess both inputs, render the try-on result and encode its renditions.
+
+    Either input may instead be an image already returned by ``prepare_input``
+    (e.g. the person image shared by a batch), which skips its decode and
+    preprocessing. ``settings`` are the tenant's render settings (``max_res``,
+    ``output_size``, ``format``, ``quality``, ``png_compress_level``,
+    ``watermark`` and ``renditions``). Returns the renditions (see
+    ``encode_renditions``) and the measured time of each stage in ms.
+    """
+    (person, clothing), timings = prepare_inputs((person, clothing), settings["max_res"])
+
+    start = time.perf_counter()
+    result = render_demo_tryon(person, clothing, tuple(settings["output_size"]))
+    if settings["watermark"]:
+        result = apply_watermark(result)
+    inference_ms = elapsed_ms(start)
+
+    start = time.perf_counter()
+    renditions = encode_renditions(result, settings)
+    encode_ms = elapsed_ms(start)
+
+    return renditions, {
+        **timings,
+        "inference": inference_ms,
+        "encode": encode_ms
+    }
+
+
+def prepare_remote_inputs(
+    person: Union[bytes, Image.Image],
+    clothing: Union[bytes, Image.Image],
+    settings: dict
+) -> tuple[tuple[bytes, bytes], dict]:
+    """Shrink and normalize both inputs locally and JPEG encode them for a remote backend.
+
+    Uploading ``max_res``-sized JPEGs instead of the original files keeps
+    request bodies small. Returns the two payloads and the decode/preprocessing
+    times in ms (encoding the payloads counts as preprocessing).
+    """
+    inputs, timings = prepare_inputs((person, clothing), settings["max_res"])
+    start = time.perf_counter()
+    payloads = tuple(encode_image(img, 'JPEG', quality=REMOTE_INPUT_QUALITY) for img in inputs)
+    timings["preprocessing"] = round(timings["preprocessing"] + elapsed_ms(start), 2)
+    return payloads, timings
+
+
+def finish_remote_result(result_bytes: bytes, settings: dict) -> tuple[dict, dict]:
+    """Decode a remote backend's result, fit it to the output canvas, watermark it and encode the renditions"""
+    start = time.perf_counter()
+    try:
+        result = flatten_to_rgb(Image.open(io.BytesIO(result_bytes)))
+    except Exception as e:
+        raise ValueError(f"Invalid result image from backend: {str(e)}")
+    output_size = tuple(settings["output_size"])
+    if result.size != output_size:
+        result = result.resize(output_size, Image.Resampling.LANCZOS)
+    if settings["watermark"]:
+        result = apply_watermark(result)
+    postprocessing_ms = elapsed_ms(start)
+
+    start = time.perf_counter()
+    renditions = encode_renditions(result, settings)
+    return renditions, {"postprocessing": postprocessing_ms, "encode": elapsed_ms(start)}
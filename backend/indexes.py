@@ -0,0 +1,83 @@
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import ConnectionFailure
+
+logger = logging.getLogger(__name__)
+
+# Expired jobs are deleted by the retention service, which also reclaims their
+# blobs; the TTL index only catches jobs it has not reached within this grace period
+JOB_TTL_GRACE_SECONDS = 24 * 3600
+
+# Indexes the application relies on, created (idempotently) at startup
+INDEXES: Dict[str, List[IndexModel]] = {
+    "product_catalog": [
+        IndexModel([("tenant_id", ASCENDING), ("product_id", ASCENDING)], unique=True, name="tenant_product_unique"),
+    ],
+    "tryon_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel(
+            [("tenant_id", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)],
+            name="tenant_status_created"
+        ),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=JOB_TTL_GRACE_SECONDS, name="expires_at_ttl"),
+        # Retention checks whether any remaining job still references a shared blob
+        IndexModel([("result_blob_key", ASCENDING)], name="result_blob_key"),
+        # Queue workers claim pending jobs by priority and age, and reap expired leases
+        IndexModel(
+            [("priority", ASCENDING), ("created_at", ASCENDING)],
+            partialFilterExpression={"status": "pending", "inputs": {"$exists": True}},
+            name="queue_claim"
+        ),
+        IndexModel(
+            [("lease_expires_at", ASCENDING)],
+            partialFilterExpression={"status": "processing"},
+            name="lease_expiry"
+        ),
+    ],
+    "sdk_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True, name="session_token_unique"),
+        # Mongo's TTL monitor deletes sessions once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    "tenant_configs": [
+        IndexModel([("client_id", ASCENDING)], unique=True, name="client_id_unique"),
+    ],
+    "usage_rollups": [
+        IndexModel(
+            [("tenant_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+            unique=True,
+            name="tenant_granularity_bucket_unique"
+        ),
+    ],
+    "garment_assets": [
+        IndexModel(
+            [("tenant_id", ASCENDING), ("product_id", ASCENDING), ("variant_id", ASCENDING), ("max_res", ASCENDING)],
+            unique=True,
+            name="tenant_product_variant_res_unique"
+        ),
+    ],
+    "tryon_result_cache": [
+        IndexModel([("key", ASCENDING)], unique=True, name="key_unique"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index, logging (not raising) per-collection failures.
+
+    A failure such as duplicate data blocking a unique index should not keep
+    the API from starting; it is reported so it can be fixed. Losing the
+    connection is raised instead, so the caller can retry once Mongo is back.
+    """
+    created = {}
+    for collection_name, models in INDEXES.items():
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(models)
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to create indexes on {collection_name}: {str(e)}")
+    logger.info(f"Ensured indexes on {len(created)}/{len(INDEXES)} collections")
+    return created
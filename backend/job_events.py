@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+from cachetools import TTLCache
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def job_topic(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def tenant_topic(tenant_id: str) -> str:
+    return f"tenant:{tenant_id}"
+
+
+def is_terminal(event: Dict[str, Any]) -> bool:
+    return event.get("type") == "status" and event.get("status") in TERMINAL_STATUSES
+
+
+class Subscription:
+    """Bounded buffer of events for one subscriber.
+
+    When a slow consumer falls ``max_pending`` events behind, the oldest are
+    dropped; the newest event, such as a job's final status, is always kept.
+    """
+
+    def __init__(self, hub: "JobEventHub", topic: str, max_pending: int):
+        self.hub = hub
+        self.topic = topic
+        self.dropped = 0
+        self._events: deque = deque(maxlen=max(1, max_pending))
+        self._ready = asyncio.Event()
+
+    def push(self, event: Dict[str, Any]):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if nothing arrived within ``timeout`` seconds"""
+        while not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JobEventHub:
+    """In-process pub/sub for job status and stage events.
+
+    Events are published to the job's topic and its tenant's topic and fanned
+    out to subscribers in memory, so pushing progress costs no database reads.
+    The latest status event of each recent job is kept, so a subscriber that
+    joins late gets the current state without reading ``tryon_jobs``. Only
+    jobs run by this process are published here.
+    """
+
+    def __init__(self, max_pending: int = 100, state_ttl_seconds: float = 600, max_states: int = 10000):
+        self.max_pending = max_pending
+        self.states = TTLCache(maxsize=max(1, max_states), ttl=state_ttl_seconds)
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._seq = itertools.count(1)
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, self.max_pending)
+        self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.topic]
+
+    def latest(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Most recent status event published for a job, if it is still remembered"""
+        return self.states.get(job_id)
+
+    def publish(self, job_id: str, tenant_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        event = {
+            **event,
+            "job_id": job_id,
+            "seq": next(self._seq),
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+        if event.get("type") == "status":
+            self.states[job_id] = event
+        for topic in (job_topic(job_id), tenant_topic(tenant_id)):
+            for subscription in self._subscribers.get(topic, ()):
+                subscription.push(event)
+        return event
@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the try-on queue cannot accept more work"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Try-on queue is full")
+        self.retry_after = retry_after
+
+
+class PoolUnavailableError(Exception):
+    """Raised when the worker pool is not accepting work (stopped or draining)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Try-on workers are unavailable")
+        self.retry_after = retry_after
+
+
+class TryOnWorkerPool:
+    """Fixed set of asyncio workers draining a bounded, weighted fair queue of try-on jobs.
+
+    Work is admitted with ``submit``; when the queue (or the tenant's share
+    of it) is at capacity the caller gets ``QueueFullError`` immediately
+    instead of piling up more open requests.
+
+    Jobs are dispatched by start-time fair queueing: each job is tagged with
+    a virtual finish time ``max(now, tenant's last tag) + 1 / weight`` and the
+    smallest tag runs next. A tenant with weight 3 therefore gets three times
+    the dispatches of a weight-1 tenant while both have work queued, and a
+    tenant flooding the queue only delays its own jobs.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64, retry_after: int = 5, max_tenant_queue: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.max_tenant_queue = max(1, max_tenant_queue or self.max_queue)
+        self.retry_after = retry_after
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._virtual_time = 0.0
+        self._tenant_tags: Dict[str, float] = {}
+        self._tenant_depth: Dict[str, int] = {}
+        self._unfinished = 0
+        self._drained: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._busy = 0
+        self._accepting = False
+        # Jobs whose worker was cancelled mid-run by ``stop``
+        self._abandoned: List[str] = []
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return len(self._heap)
+
+    @property
+    def busy(self) -> int:
+        """Number of workers currently running a job"""
+        return self._busy
+
+    def tenant_depth(self, tenant_id: str) -> int:
+        return self._tenant_depth.get(tenant_id, 0)
+
+    def check_capacity(self, jobs: int = 1, tenant_id: Optional[str] = None):
+        """Raise if ``jobs`` new jobs would not all be accepted, without enqueueing anything"""
+        if not self._accepting:
+            raise PoolUnavailableError(self.retry_after)
+        if self.max_queue - len(self._heap) < jobs:
+            raise QueueFullError(self.retry_after)
+        if tenant_id is not None and self.max_tenant_queue - self.tenant_depth(tenant_id) < jobs:
+            raise QueueFullError(self.retry_after)
+
+    async def start(self):
+        if self._accepting:
+            return
+        self._ready = asyncio.Semaphore(0)
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"tryon-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._accepting = True
+        logger.info(f"Started {self.workers} try-on workers (queue size {self.max_queue})")
+
+    async def stop(self, drain_timeout: float = 30.0) -> List[str]:
+        """Stop accepting work, give queued jobs a chance to finish, then cancel workers.
+
+        Jobs still queued or running when the drain times out have their
+        futures failed with ``PoolUnavailableError``, so callers waiting on
+        them are released; their ids are returned for the caller to record.
+        """
+        self._accepting = False
+        if self._drained is not None:
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Try-on queue not drained after {drain_timeout}s, cancelling {self.depth} jobs")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        abandoned, self._abandoned = self._abandoned, []
+        while self._heap:
+            _, _, _, job_id, _, future, _, _ = heapq.heappop(self._heap)
+            if not future.done():
+                future.set_exception(PoolUnavailableError(self.retry_after))
+            abandoned.append(job_id)
+        self._tenant_depth.clear()
+        self._tenant_tags.clear()
+        self._unfinished = 0
+        if self._drained is not None:
+            self._drained.set()
+        return abandoned
+
+    def submit(
+        self,
+        job_id: str,
+        handler: Callable[[], Awaitable[Any]],
+        tenant_id: str = "default",
+        weight: float = 1.0,
+        on_dequeue: Optional[Callable[[float], None]] = None
+    ) -> asyncio.Future:
+        """Enqueue ``handler`` for a worker and return a future for its result.
+
+        ``on_dequeue`` is called with the time the job spent queued, in ms,
+        just before ``handler`` runs.
+        """
+        self.check_capacity(tenant_id=tenant_id)
+        future = asyncio.get_running_loop().create_future()
+        start_tag = max(self._virtual_time, self._tenant_tags.get(tenant_id, 0.0))
+        finish_tag = start_tag + 1.0 / max(weight, 1e-6)
+        self._tenant_tags[tenant_id] = finish_tag
+        self._tenant_depth[tenant_id] = self._tenant_depth.get(tenant_id, 0) + 1
+        heapq.heappush(
+            self._heap,
+            (finish_tag, next(self._order), tenant_id, job_id, handler, future, on_dequeue, time.perf_counter())
+        )
+        self._unfinished += 1
+        self._drained.clear()
+        self._ready.release()
+        return future
+
+    def _dequeue(self) -> tuple:
+        item = heapq.heappop(self._heap)
+        finish_tag, _, tenant_id = item[:3]
+        self._virtual_time = max(self._virtual_time, finish_tag)
+        depth = self._tenant_depth[tenant_id] - 1
+        if depth:
+            self._tenant_depth[tenant_id] = depth
+        else:
+            del self._tenant_depth[tenant_id]
+            # An idle tenant restarts from the current virtual time, so it banks no credit
+            if self._tenant_tags.get(tenant_id, 0.0) <= self._virtual_time:
+                self._tenant_tags.pop(tenant_id, None)
+        return item
+
+    async def _worker(self, index: int):
+        while True:
+            await self._ready.acquire()
+            _, _, _, job_id, handler, future, on_dequeue, enqueued_at = self._dequeue()
+            self._busy += 1
+            try:
+                if on_dequeue is not None:
+                    on_dequeue((time.perf_counter() - enqueued_at) * 1000)
+                result = await handler()
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(PoolUnavailableError(self.retry_after))
+                self._abandoned.append(job_id)
+                raise
+            except Exception as e:
+                logger.error(f"Try-on worker {index} failed on job {job_id}: {str(e)}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._busy -= 1
+                self._unfinished -= 1
+                if self._unfinished == 0:
+                    self._drained.set()
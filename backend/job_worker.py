@@ -0,0 +1,120 @@
+"""Standalone try-on worker for jobs queued by the API with ``TRYON_EXECUTION=queue``.
+
+Run any number of these, on any node, next to any number of API processes::
+
+    cd backend && python job_worker.py
+
+Workers share the API's ``.env``: ``MONGO_URL``/``DB_NAME``, the blob store
+(``gridfs`` or ``s3`` when they run on other nodes than the API) and the
+try-on backend settings. Each worker claims pending jobs from ``tryon_jobs``
+under a lease it renews while they run; if it dies, any worker's reaper puts
+its jobs back once the lease expires. A single local mongod is enough to
+try it: start uvicorn and one or more workers against the same database.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Dict, Union
+
+import server
+from imaging import load_prepared_input
+from lease_queue import JobLeaseQueue, LeaseLostError, LeaseWorker
+
+logger = logging.getLogger("job_worker")
+
+WORKER_ID = os.environ.get('TRYON_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# Jobs run at once by this process, and claimed per round trip
+WORKER_CONCURRENCY = int(os.environ.get('TRYON_WORKER_CONCURRENCY', str(server.TRYON_WORKERS)))
+WORKER_CLAIM_BATCH = int(os.environ.get('TRYON_WORKER_CLAIM_BATCH', str(WORKER_CONCURRENCY)))
+# Leases are renewed every third of their length; a job is failed after this many lost leases
+WORKER_LEASE_SECONDS = float(os.environ.get('TRYON_WORKER_LEASE_SECONDS', '60'))
+WORKER_MAX_ATTEMPTS = int(os.environ.get('TRYON_WORKER_MAX_ATTEMPTS', '3'))
+WORKER_POLL_SECONDS = float(os.environ.get('TRYON_WORKER_POLL_SECONDS', '0.2'))
+WORKER_MAX_POLL_SECONDS = float(os.environ.get('TRYON_WORKER_MAX_POLL_SECONDS', '2'))
+WORKER_REAP_INTERVAL_SECONDS = float(os.environ.get('TRYON_WORKER_REAP_INTERVAL_SECONDS', '15'))
+# On SIGTERM running jobs get this long to finish; the rest go back to the queue
+WORKER_DRAIN_SECONDS = float(os.environ.get('TRYON_WORKER_DRAIN_SECONDS', '30'))
+
+
+async def load_job_input(ref: Dict[str, Any], priority: int) -> Union[bytes, server.PreparedImage]:
+    data = await server.blob_store.read(ref["key"])
+    if not ref.get("prepared"):
+        return data
+    image = await server.image_executor.run(load_prepared_input, data, priority=priority)
+    return server.PreparedImage(image, bytes.fromhex(ref["digest"]))
+
+
+async def delete_job_inputs(job: Dict[str, Any]):
+    """Inputs are scoped to their job, so they go as soon as it is finished"""
+    for ref in (job.get("inputs") or {}).values():
+        try:
+            await server.blob_store.delete(ref["key"])
+        except Exception as e:
+            logger.warning(f"Failed to delete job input {ref.get('key')}: {str(e)}")
+
+
+async def run_queued_job(document: Dict[str, Any]):
+    job = server.TryOnJob(**document)
+    profile = await server.tenant_configs.get(job.tenant_id)
+    trace = server.job_trace(job)
+    try:
+        try:
+            with trace.stage("storage"):
+                person = await load_job_input(job.inputs["person"], profile.priority)
+                clothing = await load_job_input(job.inputs["clothing"], profile.priority)
+        except Exception as e:
+            await server.fail_pending_job(job, f"Try-on inputs unavailable: {str(e)}")
+        else:
+            await server.run_tryon_job(job, trace, profile, person, clothing, job.settings, claimed=True)
+    except LeaseLostError:
+        # The reaper handed the job on; its inputs now belong to the next worker
+        logger.warning(f"Dropped the outcome of job {job.id}: its lease expired before it finished")
+        return
+    await delete_job_inputs(document)
+
+
+async def abandon_job(document: Dict[str, Any]):
+    """A job the reaper failed after too many lost leases"""
+    await server.record_usage(server.TryOnJob(**document))
+    await delete_job_inputs(document)
+
+
+async def main():
+    server.image_executor.start()
+    await server.tryon_backend.start()
+    # Claim nothing until Mongo answers, the indexes exist and the image workers are up
+    await server.warm_up()
+
+    worker = LeaseWorker(
+        JobLeaseQueue(server.db.tryon_jobs, WORKER_ID, WORKER_LEASE_SECONDS, WORKER_MAX_ATTEMPTS),
+        run_queued_job,
+        concurrency=WORKER_CONCURRENCY,
+        claim_batch=WORKER_CLAIM_BATCH,
+        poll_seconds=WORKER_POLL_SECONDS,
+        max_poll_seconds=WORKER_MAX_POLL_SECONDS,
+        reap_interval_seconds=WORKER_REAP_INTERVAL_SECONDS,
+        on_abandoned=abandon_job
+    )
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    worker.start()
+    logger.info(f"Try-on worker {WORKER_ID} running {WORKER_CONCURRENCY} jobs at a time")
+    try:
+        await stopping.wait()
+    finally:
+        logger.info(f"Try-on worker {WORKER_ID} stopping after {worker.completed} jobs")
+        await worker.stop(WORKER_DRAIN_SECONDS)
+        await server.tryon_backend.close()
+        server.image_executor.shutdown()
+        await server.blob_store.close()
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
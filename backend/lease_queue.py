@@ -0,0 +1,290 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Only jobs whose inputs were persisted can be run by another process
+QUEUED_JOB_FILTER = {"status": "pending", "inputs": {"$exists": True}}
+
+
+class LeaseLostError(Exception):
+    """Raised when a worker writes to a job whose lease it no longer holds"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Lease on try-on job {job_id} was lost")
+        self.job_id = job_id
+
+
+class QueueBacklogError(Exception):
+    """Raised when too many queued jobs are already waiting for workers"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Try-on queue backlog is full")
+        self.retry_after = retry_after
+
+
+def held_lease_query(job_id: str, owner: str) -> Dict[str, Any]:
+    """Matches a job only while ``owner`` still holds its lease, so a reaped worker cannot overwrite it"""
+    return {"id": job_id, "status": "processing", "lease_owner": owner}
+
+
+class QueueBacklog:
+    """Admission limit on pending queued jobs, overall and per tenant.
+
+    The API's counterpart to ``TryOnWorkerPool.check_capacity`` when jobs run
+    on queue workers: counts stop at the limits, so a check costs at most two
+    short index scans.
+    """
+
+    def __init__(self, collection, max_pending: int, max_tenant_pending: int, retry_after: int):
+        self.collection = collection
+        self.max_pending = max(1, max_pending)
+        self.max_tenant_pending = max(1, max_tenant_pending)
+        self.retry_after = retry_after
+
+    async def check(self, jobs: int = 1, tenant_id: Optional[str] = None):
+        """Raise ``QueueBacklogError`` if ``jobs`` more queued jobs would exceed a limit"""
+        pending = await self.collection.count_documents(QUEUED_JOB_FILTER, limit=self.max_pending)
+        if self.max_pending - pending < jobs:
+            raise QueueBacklogError(self.retry_after)
+        if tenant_id is not None:
+            tenant_pending = await self.collection.count_documents(
+                {**QUEUED_JOB_FILTER, "tenant_id": tenant_id}, limit=self.max_tenant_pending
+            )
+            if self.max_tenant_pending - tenant_pending < jobs:
+                raise QueueBacklogError(self.retry_after)
+
+
+class JobLeaseQueue:
+    """Pending try-on jobs in ``tryon_jobs``, claimed by workers under time-limited leases.
+
+    ``claim`` atomically flips a pending job to ``processing`` with the
+    worker's ``lease_owner`` and a ``lease_expires_at`` that the worker keeps
+    pushing forward with ``heartbeat`` while it runs the job. A worker that
+    dies stops renewing, and ``reap`` (run by every worker) puts its jobs back
+    to pending, or fails them once they have been claimed ``max_attempts``
+    times, so a job that crashes its workers cannot loop forever. Jobs are
+    claimed by plan priority, then oldest first.
+    """
+
+    def __init__(self, collection, owner: str, lease_seconds: float = 60, max_attempts: int = 3):
+        self.collection = collection
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+
+    def _lease_expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    async def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` pending jobs; each claim is atomic, so no job goes to two workers"""
+        claimed = []
+        for _ in range(limit):
+            job = await self.collection.find_one_and_update(
+                QUEUED_JOB_FILTER,
+                {
+                    "$set": {"status": "processing", "lease_owner": self.owner, "lease_expires_at": self._lease_expiry()},
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("priority", 1), ("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                break
+            job.pop("_id", None)
+            claimed.append(job)
+        return claimed
+
+    async def heartbeat(self, job_ids: List[str]) -> int:
+        """Extend the leases this worker still holds, returning how many it kept"""
+        if not job_ids:
+            return 0
+        result = await self.collection.update_many(
+            {"id": {"$in": job_ids}, "status": "processing", "lease_owner": self.owner},
+            {"$set": {"lease_expires_at": self._lease_expiry()}}
+        )
+        # Matched, not modified: a renewal within the same millisecond changes nothing but still holds
+        return result.matched_count
+
+    async def release(self, job_ids: List[str]) -> int:
+        """Hand unfinished jobs back to the queue, e.g. on shutdown, without waiting for their leases to expire"""
+        if not job_ids:
+            return 0
+        result = await self.collection.update_many(
+            {"id": {"$in": job_ids}, "status": "processing", "lease_owner": self.owner},
+            {"$set": {"status": "pending"}, "$unset": {"lease_owner": "", "lease_expires_at": ""}, "$inc": {"attempts": -1}}
+        )
+        return result.modified_count
+
+    async def reap(self, limit: int = 100) -> tuple[List[str], List[Dict[str, Any]]]:
+        """Requeue jobs whose lease expired; returns the requeued ids and the jobs failed instead"""
+        now = datetime.now(timezone.utc)
+        expired = await self.collection.find(
+            {"status": "processing", "lease_expires_at": {"$lt": now}},
+            {"_id": 0, "id": 1, "attempts": 1}
+        ).limit(limit).to_list(limit)
+        requeued, failed = [], []
+        for job in expired:
+            # Conditional on the lease still being expired, so a late heartbeat wins
+            query = {"id": job["id"], "status": "processing", "lease_expires_at": {"$lt": now}}
+            if job.get("attempts", 0) < self.max_attempts:
+                result = await self.collection.update_one(
+                    query,
+                    {"$set": {"status": "pending"}, "$unset": {"lease_owner": "", "lease_expires_at": ""}}
+                )
+                if result.modified_count:
+                    requeued.append(job["id"])
+                continue
+            document = await self.collection.find_one_and_update(
+                query,
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error_message": f"Try-on worker lost the job {job.get('attempts', 0)} times",
+                        "completed_at": now
+                    },
+                    "$unset": {"lease_owner": "", "lease_expires_at": ""}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            if document is not None:
+                document.pop("_id", None)
+                failed.append(document)
+        return requeued, failed
+
+
+class LeaseWorker:
+    """Runs leased jobs with bounded concurrency, renewing their leases and reaping expired ones.
+
+    ``handler`` receives each claimed job document and must leave the job in
+    a terminal state; ``on_abandoned`` receives jobs the reaper failed. Idle
+    polling backs off from ``poll_seconds`` to ``max_poll_seconds``.
+    """
+
+    def __init__(
+        self,
+        queue: JobLeaseQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        concurrency: int = 4,
+        claim_batch: int = 4,
+        poll_seconds: float = 0.2,
+        max_poll_seconds: float = 2.0,
+        reap_interval_seconds: float = 15,
+        on_abandoned: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.claim_batch = max(1, claim_batch)
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max(poll_seconds, max_poll_seconds)
+        self.reap_interval_seconds = reap_interval_seconds
+        self.on_abandoned = on_abandoned
+        self.active: Dict[str, asyncio.Task] = {}
+        self.completed = 0
+        self._stopping: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def busy(self) -> int:
+        return len(self.active)
+
+    async def _run(self, job: Dict[str, Any]):
+        try:
+            await self.handler(job)
+        except Exception as e:
+            # The lease runs out and the reaper retries the job elsewhere
+            logger.error(f"Queued job {job.get('id')} failed in its handler: {str(e)}")
+        finally:
+            self.active.pop(job["id"], None)
+            self.completed += 1
+
+    async def _claim_loop(self):
+        delay = self.poll_seconds
+        while not self._stopping.is_set():
+            free = self.concurrency - len(self.active)
+            if free <= 0:
+                stopping = asyncio.ensure_future(self._stopping.wait())
+                await asyncio.wait([*self.active.values(), stopping], return_when=asyncio.FIRST_COMPLETED)
+                stopping.cancel()
+                continue
+            try:
+                jobs = await self.queue.claim(min(free, self.claim_batch))
+            except Exception as e:
+                logger.error(f"Claiming try-on jobs failed: {str(e)}")
+                jobs = []
+            for job in jobs:
+                self.active[job["id"]] = asyncio.create_task(self._run(job), name=f"tryon-job-{job['id']}")
+            if jobs:
+                delay = self.poll_seconds
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_poll_seconds)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await self.queue.heartbeat(list(self.active))
+            except Exception as e:
+                logger.warning(f"Lease heartbeat failed: {str(e)}")
+
+    async def _reap_loop(self):
+        while True:
+            try:
+                requeued, failed = await self.queue.reap()
+                if requeued or failed:
+                    logger.info(f"Reaped expired leases: {len(requeued)} requeued, {len(failed)} failed")
+                for job in failed:
+                    if self.on_abandoned is not None:
+                        await self.on_abandoned(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lease reaper failed: {str(e)}")
+            await asyncio.sleep(self.reap_interval_seconds)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._stopping = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._claim_loop(), name="lease-claim"),
+            asyncio.create_task(self._heartbeat_loop(), name="lease-heartbeat"),
+            asyncio.create_task(self._reap_loop(), name="lease-reaper"),
+        ]
+
+    async def wait(self):
+        """Block until the claim loop stops"""
+        if self._tasks:
+            await asyncio.gather(self._tasks[0], return_exceptions=True)
+
+    async def stop(self, drain_timeout: float = 30):
+        """Stop claiming, give running jobs ``drain_timeout`` to finish and release the rest"""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._tasks[0], return_exceptions=True)
+        if self.active:
+            await asyncio.wait(list(self.active.values()), timeout=drain_timeout)
+        unfinished = list(self.active)
+        for task in list(self.active.values()):
+            task.cancel()
+        await asyncio.gather(*self.active.values(), return_exceptions=True)
+        for task in self._tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*self._tasks[1:], return_exceptions=True)
+        self._tasks = []
+        try:
+            released = await self.queue.release(unfinished)
+            if released:
+                logger.info(f"Released {released} unfinished try-on jobs back to the queue")
+        except Exception as e:
+            logger.error(f"Releasing unfinished jobs failed: {str(e)}")
@@ -0,0 +1,54 @@
+import math
+import time
+from typing import Optional, Tuple
+
+from cachetools import TTLCache
+
+
+class RateLimitedError(Exception):
+    """Raised when a tenant or session has used up its request budget"""
+
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"Try-on rate limit exceeded for this {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by tenant or session, refilled continuously.
+
+    Each key holds up to ``burst`` tokens and regains ``rate`` tokens per
+    second; ``scale`` multiplies both, so plan tiers can share one limiter.
+    Buckets idle for ``idle_seconds`` are dropped; by then they would be
+    full again anyway, so forgetting them changes nothing.
+    """
+
+    def __init__(self, scope: str, rate: float, burst: float, max_keys: int = 100000, idle_seconds: float = 600):
+        self.scope = scope
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.buckets = TTLCache(maxsize=max(1, max_keys), ttl=idle_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, key: Optional[str], tokens: int = 1, scale: float = 1.0):
+        """Take ``tokens`` from ``key``'s bucket or raise ``RateLimitedError`` without taking any.
+
+        Requests costing more than the bucket holds are charged a full bucket,
+        so a large batch is throttled rather than rejected forever.
+        """
+        if not self.enabled or key is None:
+            return
+        rate = self.rate * scale
+        burst = self.burst * scale
+        tokens = min(tokens, burst)
+        now = time.monotonic()
+        state: Optional[Tuple[float, float]] = self.buckets.get(key)
+        available, updated_at = state if state is not None else (burst, now)
+        available = min(burst, available + (now - updated_at) * rate)
+        if available < tokens:
+            self.buckets[key] = (available, now)
+            raise RateLimitedError(self.scope, max(1, math.ceil((tokens - available) / rate)))
+        self.buckets[key] = (available - tokens, now)
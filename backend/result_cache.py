@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+MIN_MAX_RES = 64
+MAX_MAX_RES = 4096
+
+OUTPUT_FORMATS = ("png", "jpeg", "webp", "avif")
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+DEFAULT_OPTIONS = {
+    "profile": "speed",
+    "maxRes": 1024,
+    "watermark": False,
+    "format": "png",
+    "quality": None  # None uses the tenant's fidelity profile
+}
+
+# String spellings accepted for boolean options, e.g. from form fields
+TRUE_STRINGS = ("true", "1", "yes", "on")
+FALSE_STRINGS = ("false", "0", "no", "off", "")
+
+
+def parse_flag(name: str, value: Any) -> bool:
+    """A boolean option from a real boolean, null (false) or one of the usual strings; raises ValueError otherwise"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in TRUE_STRINGS:
+            return True
+        if lowered in FALSE_STRINGS:
+            return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def normalize_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce try-on options to the fields that change the rendered result.
+
+    Raises ValueError for an unknown output format or a watermark that is
+    not a boolean.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    output_format = str(options["format"]).lower()
+    output_format = FORMAT_ALIASES.get(output_format, output_format)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {options['format']}")
+    quality = options["quality"]
+    return {
+        "profile": str(options["profile"]).lower(),
+        "maxRes": min(max(int(options["maxRes"]), MIN_MAX_RES), MAX_MAX_RES),
+        "watermark": parse_flag("watermark", options["watermark"]),
+        "format": output_format,
+        "quality": None if quality is None else min(max(int(quality), 1), 100)
+    }
+
+
+def input_digest(data: bytes) -> bytes:
+    """SHA-256 of an input image, computed once per input even when many jobs share it"""
+    return hashlib.sha256(data).digest()
+
+
+def result_cache_key(person_digest: bytes, clothing_digest: bytes, settings: Dict[str, Any]) -> str:
+    """Content address for a try-on result: the ``input_digest`` of both inputs plus the render settings.
+
+    ``settings`` must hold everything that changes the output (resolved tenant
+    profile and normalized request options), so different profiles never share a key.
+    """
+    digest = hashlib.sha256()
+    digest.update(person_digest)
+    digest.update(clothing_digest)
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MongoCacheTier:
+    """Durable cache tier storing result bytes in a Mongo collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Optional[bytes]:
+        doc = await self.collection.find_one({"key": key}, {"_id": 0, "data": 1})
+        return bytes(doc["data"]) if doc else None
+
+    async def put(self, key: str, data: bytes):
+        await self.collection.update_one(
+            {"key": key},
+            {"$set": {"key": key, "data": data, "size": len(data), "created_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    async def delete(self, key: str):
+        await self.collection.delete_one({"key": key})
+
+
+class DiskCacheTier:
+    """Durable cache tier storing result bytes as files under a directory"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put(self, key: str, data: bytes):
+        await asyncio.to_thread(self._write, key, data)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+
+class TryOnResultCache:
+    """Two-tier cache of rendered try-on results with in-flight coalescing.
+
+    The memory tier is an LRU bounded by total bytes; the optional durable tier
+    (Mongo or disk) is consulted on a memory miss. Concurrent requests for the
+    same key share a single generation.
+    """
+
+    def __init__(self, max_bytes: int, store: Optional[Any] = None):
+        self.memory = LRUCache(maxsize=max(1, max_bytes), getsizeof=len)
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) <= self.memory.maxsize:
+            self.memory[key] = data
+
+    async def get(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Look a key up in both tiers, returning the bytes and the tier that had them"""
+        data = self.memory.get(key)
+        if data is not None:
+            return data, "memory"
+        if self.store is not None:
+            try:
+                data = await self.store.get(key)
+            except Exception as e:
+                logger.warning(f"Result cache store read failed: {str(e)}")
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                return data, "store"
+        return None, None
+
+    async def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self.store is not None:
+            try:
+                await self.store.put(key, data)
+            except Exception as e:
+                logger.warning(f"Result cache store write failed: {str(e)}")
+
+    async def evict(self, key: str):
+        """Drop a key from both tiers, e.g. once the blobs its result points at are deleted"""
+        self.memory.pop(key, None)
+        if self.store is not None:
+            try:
+                await self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Result cache store delete failed: {str(e)}")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[bytes]],
+        is_valid: Optional[Callable[[bytes], Awaitable[bool]]] = None
+    ) -> Tuple[bytes, str]:
+        """Return cached bytes for ``key`` or run ``compute`` once for all concurrent callers.
+
+        The second element is the cache status: ``memory``/``store`` hits,
+        ``coalesced`` when joining another caller's generation, or ``miss``.
+        Cached bytes that ``is_valid`` rejects, e.g. a manifest whose blobs
+        another process deleted, are evicted and recomputed.
+        """
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight), "coalesced"
+
+        data, tier = await self.get(key)
+        if data is not None and is_valid is not None and not await is_valid(data):
+            logger.info(f"Result cache entry {key} is stale, recomputing")
+            await self.evict(key)
+            data = None
+        if data is not None:
+            self.hits += 1
+            return data, tier
+
+        # Another caller may have started generating while we read the store
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight), "coalesced"
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            data = await compute()
+            await self.put(key, data)
+            future.set_result(data)
+            return data, "miss"
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; avoid an "exception never retrieved" warning
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from indexes import JOB_TTL_GRACE_SECONDS
+from tenant_config import parse_retention_days
+
+logger = logging.getLogger(__name__)
+
+# Only the fields needed to reclaim a job's payload
+RECLAIM_PROJECTION = {
+    "_id": 1,
+    "result_blob_key": 1,
+    "result_renditions": 1,
+    "result_cache_key": 1
+}
+# Each job's stored size, measured by the server; $bsonSize needs MongoDB 4.4+
+DOCUMENT_BYTES_PROJECTION = {"document_bytes": {"$bsonSize": "$$ROOT"}}
+
+
+def job_expiry(created_at: datetime, retention_days: int) -> datetime:
+    """When a job created at ``created_at`` falls out of its tenant's retention"""
+    return created_at + timedelta(days=retention_days)
+
+
+class RetentionReport:
+    """Documents, blobs and bytes reclaimed by one retention pass"""
+
+    def __init__(self):
+        self.documents = 0
+        self.document_bytes = 0
+        self.blobs = 0
+        self.blob_bytes = 0
+        self.restamped = 0
+        self.tenants = 0
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_ms = 0
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "document_bytes": self.document_bytes,
+            "blobs": self.blobs,
+            "blob_bytes": self.blob_bytes,
+            "restamped": self.restamped,
+            "tenants_overridden": self.tenants,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms
+        }
+
+
+class RetentionService:
+    """Deletes expired try-on jobs and their result blobs in throttled batches.
+
+    Jobs carry an ``expires_at`` stamped from their tenant's ``retention_days``
+    when they are created, and a TTL index on it (with a grace period) removes
+    any the service has not reached. The service runs ahead of that index so
+    blobs are reclaimed too: a blob is deleted, and its result cache entry
+    evicted, only once no remaining job references it. Tenants whose
+    configured retention differs from the default also get a pass by
+    ``created_at``, so shortening retention applies to jobs already stored.
+
+    Lengthening it needs the stamps moved: ``restamp`` rewrites a tenant's
+    ``expires_at`` (run in the background by ``schedule_restamp`` when a
+    config changes), and every pass re-stamps an overridden tenant's jobs
+    still within its retention before the expiry pass or the TTL index can
+    delete them, which covers jobs stamped by processes whose tenant cache
+    had not caught up yet. ``measure_bytes=False`` skips ``$bsonSize`` for
+    servers (or mocks) without it; document bytes are then reported as 0.
+    """
+
+    def __init__(
+        self,
+        jobs,
+        tenant_configs,
+        blob_store,
+        result_cache,
+        default_days: int,
+        batch_size: int = 500,
+        pause_seconds: float = 0.5,
+        interval_seconds: float = 3600,
+        reclaimed=None,
+        measure_bytes: bool = True
+    ):
+        self.jobs = jobs
+        self.tenant_configs = tenant_configs
+        self.blob_store = blob_store
+        self.result_cache = result_cache
+        self.default_days = default_days
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+        self.interval_seconds = interval_seconds
+        self.reclaimed = reclaimed
+        self.projection = {**RECLAIM_PROJECTION, **(DOCUMENT_BYTES_PROJECTION if measure_bytes else {})}
+        self.last_report: Optional[RetentionReport] = None
+        self._task: Optional[asyncio.Task] = None
+        self._restamps: Set[asyncio.Task] = set()
+
+    async def _overrides(self) -> Dict[str, int]:
+        overrides = {}
+        cursor = self.tenant_configs.find(
+            {"flags.retention_days": {"$exists": True, "$ne": self.default_days}},
+            {"_id": 0, "client_id": 1, "flags.retention_days": 1}
+        )
+        async for config in cursor:
+            try:
+                overrides[config["client_id"]] = parse_retention_days(config["flags"]["retention_days"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return overrides
+
+    async def _reclaim_blobs(self, job: Dict[str, Any], report: RetentionReport):
+        key = job.get("result_blob_key")
+        if not key:
+            return
+        # Results are content addressed, so cache hits in other jobs share these blobs
+        if await self.jobs.find_one({"result_blob_key": key}, {"_id": 1}) is not None:
+            return
+        # A cached manifest would hand the deleted blobs to the next matching job
+        if job.get("result_cache_key"):
+            await self.result_cache.evict(job["result_cache_key"])
+        renditions = job.get("result_renditions") or {"full": {"key": key}}
+        for rendition in renditions.values():
+            try:
+                size = await self.blob_store.delete(rendition["key"])
+            except Exception as e:
+                logger.warning(f"Failed to delete expired blob {rendition.get('key')}: {str(e)}")
+                continue
+            if size:
+                report.blobs += 1
+                report.blob_bytes += size
+
+    async def _purge(self, query: Dict[str, Any], report: RetentionReport):
+        while True:
+            batch: List[Dict[str, Any]] = await self.jobs.find(query, self.projection).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            result = await self.jobs.delete_many({"_id": {"$in": [job["_id"] for job in batch]}})
+            report.documents += result.deleted_count
+            report.document_bytes += sum(job.get("document_bytes", 0) for job in batch)
+            # Blobs go after their documents so the reference check no longer sees this batch
+            for job in batch:
+                await self._reclaim_blobs(job, report)
+            if len(batch) < self.batch_size:
+                return
+            await asyncio.sleep(self.pause_seconds)
+
+    async def restamp(self, tenant_id: str, days: int, query: Optional[Dict[str, Any]] = None) -> int:
+        """Set ``expires_at`` from ``days`` on a tenant's jobs (those matching ``query``), in batches.
+
+        Returns how many stamps changed.
+        """
+        query = {"tenant_id": tenant_id, "created_at": {"$exists": True}, **(query or {})}
+        restamped = 0
+        last_id = None
+        while True:
+            page = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+            batch = await self.jobs.find(page, {"_id": 1, "created_at": 1}).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return restamped
+            result = await self.jobs.bulk_write([
+                UpdateOne({"_id": job["_id"]}, {"$set": {"expires_at": job_expiry(job["created_at"], days)}})
+                for job in batch
+            ], ordered=False)
+            restamped += result.modified_count
+            if len(batch) < self.batch_size:
+                return restamped
+            last_id = batch[-1]["_id"]
+            await asyncio.sleep(self.pause_seconds)
+
+    async def _restamp_in_background(self, tenant_id: str, days: int):
+        try:
+            restamped = await self.restamp(tenant_id, days)
+            logger.info(f"Re-stamped expiry of {restamped} jobs of {tenant_id} for {days} days retention")
+        except Exception as e:
+            # The next pass still saves overridden tenants' jobs from early deletion
+            logger.error(f"Re-stamping jobs of {tenant_id} failed: {str(e)}")
+
+    def schedule_restamp(self, tenant_id: str, days: int):
+        """Re-stamp a tenant's jobs in the background after its retention changed"""
+        task = asyncio.create_task(self._restamp_in_background(tenant_id, days), name=f"retention-restamp-{tenant_id}")
+        self._restamps.add(task)
+        task.add_done_callback(self._restamps.discard)
+
+    async def run_once(self) -> RetentionReport:
+        """Run one full retention pass and return what it reclaimed"""
+        report = RetentionReport()
+        now = datetime.now(timezone.utc)
+        start = asyncio.get_running_loop().time()
+
+        overrides = await self._overrides()
+        report.tenants = len(overrides)
+        for tenant_id, days in overrides.items():
+            cutoff = now - timedelta(days=days)
+            await self._purge({"tenant_id": tenant_id, "created_at": {"$lt": cutoff}}, report)
+            # Jobs still within the tenant's retention whose stamp runs out before the TTL index's grace does
+            report.restamped += await self.restamp(tenant_id, days, {
+                "created_at": {"$gte": cutoff},
+                "expires_at": {"$lt": now + timedelta(seconds=JOB_TTL_GRACE_SECONDS)}
+            })
+        await self._purge({"expires_at": {"$lt": now}}, report)
+        # Jobs stored before expiry stamps existed fall back to the default retention
+        await self._purge({
+            "expires_at": None,
+            "tenant_id": {"$nin": list(overrides)},
+            "created_at": {"$lt": now - timedelta(days=self.default_days)}
+        }, report)
+
+        report.duration_ms = int((asyncio.get_running_loop().time() - start) * 1000)
+        self.last_report = report
+        if self.reclaimed is not None:
+            self.reclaimed.inc("documents", amount=report.documents)
+            self.reclaimed.inc("document_bytes", amount=report.document_bytes)
+            self.reclaimed.inc("blobs", amount=report.blobs)
+            self.reclaimed.inc("blob_bytes", amount=report.blob_bytes)
+        logger.info(f"Retention pass reclaimed {report.dict()}")
+        return report
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention pass failed: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="retention")
+
+    async def stop(self):
+        tasks = list(self._restamps)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,5 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import time
+# Taken before the heavy imports below so the reported import-to-ready time covers the whole cold start
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, PlainTextResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -7,29 +11,391 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union, NamedTuple, AsyncIterator
 import uuid
 from datetime import datetime, timezone
 import base64
-import io
-from PIL import Image
+import hashlib
+import json
+import zlib
 import asyncio
-from openai import OpenAI
+from contextlib import asynccontextmanager
+from bson import encode as bson_encode
+try:
+    import orjson
+except ImportError:  # job responses fall back to the standard library encoder
+    orjson = None
+from job_queue import TryOnWorkerPool, QueueFullError, PoolUnavailableError
+from lease_queue import LeaseLostError, QueueBacklog, QueueBacklogError, held_lease_query
+from image_executor import ImageExecutor
+from imaging import check_input, prepare_input, encode_prepared_input, format_available, warm_up as warm_up_codecs, OUTPUT_FORMATS
+from tryon_backends import BackendPolicy, create_tryon_backend
+from result_cache import TryOnResultCache, MongoCacheTier, DiskCacheTier, result_cache_key, input_digest
+from blob_store import create_blob_store, BlobNotFoundError
+from uploads import parse_multipart_upload, UploadTooLargeError, UploadFormatError
+from telemetry import MetricsRegistry, StageMetrics, JobTrace, StartupTimer
+from catalog_import import CatalogImporter, CatalogLineError, CatalogTooLargeError, iter_ndjson
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import ConnectionFailure
+from indexes import ensure_indexes
+from usage_rollups import UsageRollups, as_utc
+from tenant_config import TenantConfigCache, TenantProfile, DEFAULT_TENANT_FLAGS, resolve_profile, validate_flags
+from session_auth import SessionAuthenticator, SessionAuthMiddleware, request_token
+from rate_limits import TokenBucketLimiter, RateLimitedError
+from retention import RetentionService, job_expiry
+from session_images import SessionImageCache
+from garments import GarmentAssets, GarmentSources, GarmentSourceError
+from job_events import JobEventHub, Subscription, job_topic, tenant_topic, is_terminal
+
+startup_timer = StartupTimer(started_at=IMPORT_STARTED)
+startup_timer.mark("imports")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Initialize OpenAI with Emergent key
-EMERGENT_API_KEY = os.environ.get('EMERGENT_LLM_KEY', 'sk-emergent-61cC33511Fd3956926')
-openai_client = OpenAI(api_key=EMERGENT_API_KEY)
+# MongoDB connection. Motor connects on first use; warm-up opens the pool before readiness.
+# minPoolSize keeps that many connections open per process once warm
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '30000'))
 
-# MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS
+)
 db = client[os.environ['DB_NAME']]
 
+# Try-on job execution: "sync" keeps the request open until the result is ready,
+# "async" answers 202 with the job id and lets the worker pool finish in the background
+TRYON_JOB_MODE = os.environ.get('TRYON_JOB_MODE', 'sync')
+TRYON_WORKERS = int(os.environ.get('TRYON_WORKERS', '4'))
+TRYON_QUEUE_SIZE = int(os.environ.get('TRYON_QUEUE_SIZE', '64'))
+TRYON_RETRY_AFTER_SECONDS = int(os.environ.get('TRYON_RETRY_AFTER_SECONDS', '5'))
+# Jobs are dispatched by weighted fair queueing across tenants (weights from plan_tier);
+# one tenant may hold at most this many queued jobs
+TRYON_TENANT_QUEUE_SIZE = int(os.environ.get('TRYON_TENANT_QUEUE_SIZE', str(max(1, TRYON_QUEUE_SIZE // 2))))
+
+# "local" runs jobs on this process's worker pool; "queue" stores their inputs and leaves them
+# pending in tryon_jobs for job_worker.py processes, which may run on other nodes
+TRYON_EXECUTION = os.environ.get('TRYON_EXECUTION', 'local')  # local | queue
+# How often a request waiting on a queued job checks whether a worker finished it, and for how
+# long; sync callers still waiting at the deadline get 202 and poll the job's Location instead
+TRYON_QUEUE_POLL_SECONDS = float(os.environ.get('TRYON_QUEUE_POLL_SECONDS', '0.25'))
+TRYON_QUEUE_WAIT_SECONDS = float(os.environ.get('TRYON_QUEUE_WAIT_SECONDS', '120'))
+# New jobs are refused with 503 while this many queued jobs (or TRYON_TENANT_QUEUE_SIZE of one
+# tenant's) are waiting for a worker
+TRYON_QUEUE_MAX_PENDING = int(os.environ.get('TRYON_QUEUE_MAX_PENDING', str(TRYON_QUEUE_SIZE)))
+
+worker_pool = TryOnWorkerPool(
+    workers=TRYON_WORKERS,
+    max_queue=TRYON_QUEUE_SIZE,
+    retry_after=TRYON_RETRY_AFTER_SECONDS,
+    max_tenant_queue=TRYON_TENANT_QUEUE_SIZE
+)
+queue_backlog = QueueBacklog(db.tryon_jobs, TRYON_QUEUE_MAX_PENDING, TRYON_TENANT_QUEUE_SIZE, TRYON_RETRY_AFTER_SECONDS)
+
+# Token-bucket limits on try-on jobs: per tenant (scaled by plan weight) and per session token.
+# A rate of 0, the default, disables that limit; e.g. 5/s with a burst of 20 per tenant and
+# 1/s with a burst of 5 per session suit a multi-tenant deployment
+TENANT_RATE_LIMIT_PER_SECOND = float(os.environ.get('TENANT_RATE_LIMIT_PER_SECOND', '0'))
+TENANT_RATE_LIMIT_BURST = float(os.environ.get('TENANT_RATE_LIMIT_BURST', '20'))
+SESSION_RATE_LIMIT_PER_SECOND = float(os.environ.get('SESSION_RATE_LIMIT_PER_SECOND', '0'))
+SESSION_RATE_LIMIT_BURST = float(os.environ.get('SESSION_RATE_LIMIT_BURST', '5'))
+
+tenant_rate_limiter = TokenBucketLimiter("tenant", TENANT_RATE_LIMIT_PER_SECOND, TENANT_RATE_LIMIT_BURST)
+session_rate_limiter = TokenBucketLimiter("session", SESSION_RATE_LIMIT_PER_SECOND, SESSION_RATE_LIMIT_BURST)
+
+# CPU-bound Pillow work (decode, render, encode) runs here instead of on the event loop
+IMAGE_EXECUTOR = os.environ.get('IMAGE_EXECUTOR', 'process')  # process | thread
+IMAGE_EXECUTOR_WORKERS = int(os.environ.get('IMAGE_EXECUTOR_WORKERS', str(os.cpu_count() or 1)))
+IMAGE_EXECUTOR_QUEUE_DEPTH = int(os.environ.get('IMAGE_EXECUTOR_QUEUE_DEPTH', str(IMAGE_EXECUTOR_WORKERS * 2)))
+
+image_executor = ImageExecutor(
+    kind=IMAGE_EXECUTOR,
+    workers=IMAGE_EXECUTOR_WORKERS,
+    queue_depth=IMAGE_EXECUTOR_QUEUE_DEPTH
+)
+
+# Content-addressed cache of rendered results: in-memory LRU backed by a durable tier
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+RESULT_CACHE_STORE = os.environ.get('RESULT_CACHE_STORE', 'mongo')  # mongo | disk | none
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', str(ROOT_DIR / 'cache' / 'results'))
+
+if RESULT_CACHE_STORE == 'mongo':
+    result_cache_store = MongoCacheTier(db.tryon_result_cache)
+elif RESULT_CACHE_STORE == 'disk':
+    result_cache_store = DiskCacheTier(RESULT_CACHE_DIR)
+else:
+    result_cache_store = None
+
+result_cache = TryOnResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, store=result_cache_store)
+
+# Result images live in a blob store; job documents only keep a URL and metadata
+BLOB_STORE = os.environ.get('BLOB_STORE', 'local')  # local | gridfs | s3
+BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR', str(ROOT_DIR / 'blobs'))
+BLOB_STORE_BUCKET = os.environ.get('BLOB_STORE_BUCKET', 'tryon-results')
+BLOB_STORE_ENDPOINT_URL = os.environ.get('BLOB_STORE_ENDPOINT_URL')  # S3-compatible stand-ins such as MinIO
+BLOB_STORE_REGION = os.environ.get('BLOB_STORE_REGION')
+BLOB_CHUNK_SIZE = int(os.environ.get('BLOB_CHUNK_SIZE', str(64 * 1024)))
+
+blob_store = create_blob_store(
+    BLOB_STORE,
+    db=db,
+    root=BLOB_STORE_DIR,
+    bucket=BLOB_STORE_BUCKET,
+    endpoint_url=BLOB_STORE_ENDPOINT_URL,
+    region_name=BLOB_STORE_REGION
+)
+
+# Prometheus metrics: per-stage/per-tenant histograms plus queue and executor gauges
+metrics_registry = MetricsRegistry()
+stage_metrics = StageMetrics(metrics_registry)
+metrics_registry.gauge(
+    "app_import_to_ready_seconds", "Seconds from importing the app to passing readiness (0 until ready)",
+    lambda: startup_timer.import_to_ready_seconds or 0
+)
+metrics_registry.gauge(
+    "tryon_queue_depth", "Try-on jobs waiting for a worker",
+    lambda: worker_pool.depth
+)
+metrics_registry.gauge(
+    "tryon_workers_busy", "Try-on workers currently running a job",
+    lambda: worker_pool.busy
+)
+metrics_registry.gauge(
+    "tryon_worker_utilization", "Fraction of try-on workers running a job",
+    lambda: worker_pool.busy / worker_pool.workers
+)
+rate_limited_requests = metrics_registry.counter(
+    "tryon_rate_limited_total",
+    "Try-on requests rejected by a token-bucket rate limit",
+    ("scope", "tenant")
+)
+metrics_registry.gauge(
+    "image_executor_in_flight", "Image work items submitted to the executor pool",
+    lambda: image_executor.in_flight
+)
+metrics_registry.gauge(
+    "image_executor_waiting", "Image work items waiting for an executor slot",
+    lambda: image_executor.waiting
+)
+metrics_registry.gauge(
+    "image_executor_utilization", "Fraction of image executor workers busy",
+    lambda: image_executor.utilization
+)
+
+db_bytes_written = metrics_registry.counter(
+    "tryon_db_bytes_written_total",
+    "BSON bytes of try-on job inserts and updates sent to Mongo, by operation",
+    ("operation",)
+)
+
+# Job responses carry large base64 strings; orjson renders them without re-validating through Pydantic
+JobJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+# Usage analytics are answered from per-tenant rollups updated as jobs finish
+usage_rollups = UsageRollups(db.usage_rollups, db.usage_rollup_state)
+# Until some process has finished the one-off backfill from job history, each retries at this interval
+USAGE_BACKFILL_RETRY_SECONDS = float(os.environ.get('USAGE_BACKFILL_RETRY_SECONDS', '300'))
+usage_backfill_task: Optional[asyncio.Task] = None
+
+# Tenant configs drive output resolution, encode settings, executor priority and queue weight;
+# they are cached in memory and invalidated when written through POST /api/tenants
+TENANT_CONFIG_TTL_SECONDS = float(os.environ.get('TENANT_CONFIG_TTL_SECONDS', '60'))
+TENANT_CONFIG_CACHE_SIZE = int(os.environ.get('TENANT_CONFIG_CACHE_SIZE', '10000'))
+
+tenant_configs = TenantConfigCache(
+    db.tenant_configs,
+    ttl_seconds=TENANT_CONFIG_TTL_SECONDS,
+    max_size=TENANT_CONFIG_CACHE_SIZE
+)
+
+# Expired jobs and their result blobs are deleted in throttled batches in the background;
+# a TTL index on expires_at backs this up for jobs the service has not reached
+RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'true').lower() == 'true'
+RETENTION_INTERVAL_SECONDS = float(os.environ.get('RETENTION_INTERVAL_SECONDS', '3600'))
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '500'))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.environ.get('RETENTION_BATCH_PAUSE_SECONDS', '0.5'))
+# Reports the bytes of deleted job documents with $bsonSize (MongoDB 4.4+); turn off for older servers
+RETENTION_MEASURE_BYTES = os.environ.get('RETENTION_MEASURE_BYTES', 'true').lower() == 'true'
+
+retention_service = RetentionService(
+    db.tryon_jobs,
+    db.tenant_configs,
+    blob_store,
+    result_cache,
+    default_days=DEFAULT_TENANT_FLAGS["retention_days"],
+    batch_size=RETENTION_BATCH_SIZE,
+    pause_seconds=RETENTION_BATCH_PAUSE_SECONDS,
+    interval_seconds=RETENTION_INTERVAL_SECONDS,
+    reclaimed=metrics_registry.counter(
+        "tryon_retention_reclaimed_total",
+        "Expired job documents and result blobs deleted by retention, and their bytes",
+        ("kind",)
+    ),
+    measure_bytes=RETENTION_MEASURE_BYTES
+)
+
+# SDK session tokens guard the try-on and catalog routes once enabled; validated
+# tokens are cached so only the first request per token reads sdk_sessions
+SESSION_AUTH_ENABLED = os.environ.get('SESSION_AUTH_ENABLED', 'false').lower() == 'true'
+SESSION_AUTH_PREFIXES = ("/api/tryon/", "/api/catalog/")
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '100000'))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '300'))
+
+session_authenticator = SessionAuthenticator(
+    db.sdk_sessions,
+    max_size=SESSION_CACHE_SIZE,
+    cache_ttl_seconds=SESSION_CACHE_TTL_SECONDS
+)
+
+# Person images registered by a session are kept decoded and preprocessed so repeat
+# try-ons can send person_image_id instead of the image; bounded by total bytes
+SESSION_IMAGE_CACHE_MAX_BYTES = int(os.environ.get('SESSION_IMAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+session_images = SessionImageCache(max_bytes=SESSION_IMAGE_CACHE_MAX_BYTES)
+metrics_registry.gauge(
+    "session_image_cache_bytes", "Bytes held by registered session person images",
+    lambda: session_images.bytes
+)
+
+# Job status and stage progress are pushed over SSE/WebSocket from an in-process hub
+JOB_EVENTS_MAX_PENDING = int(os.environ.get('JOB_EVENTS_MAX_PENDING', '100'))
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('JOB_EVENTS_KEEPALIVE_SECONDS', '15'))
+
+job_events = JobEventHub(max_pending=JOB_EVENTS_MAX_PENDING)
+metrics_registry.gauge(
+    "job_event_subscribers", "Open SSE/WebSocket job event subscriptions",
+    lambda: job_events.subscriber_count
+)
+
+# Inference backend: demo renderer, a remote HTTP service, or the in-process fake service.
+# Calls are capped globally and per tenant, time-boxed, retried with jitter and optionally hedged
+TRYON_BACKEND = os.environ.get('TRYON_BACKEND', 'demo')  # demo | http | fake
+TRYON_BACKEND_URL = os.environ.get('TRYON_BACKEND_URL')
+TRYON_BACKEND_POOL_SIZE = int(os.environ.get('TRYON_BACKEND_POOL_SIZE', '32'))
+TRYON_BACKEND_MAX_CONCURRENCY = int(os.environ.get('TRYON_BACKEND_MAX_CONCURRENCY', '16'))
+TRYON_BACKEND_TENANT_CONCURRENCY = int(os.environ.get('TRYON_BACKEND_TENANT_CONCURRENCY', '4'))
+TRYON_BACKEND_TIMEOUT_SECONDS = float(os.environ.get('TRYON_BACKEND_TIMEOUT_SECONDS', '30'))
+TRYON_BACKEND_RETRIES = int(os.environ.get('TRYON_BACKEND_RETRIES', '2'))
+TRYON_BACKEND_BACKOFF_SECONDS = float(os.environ.get('TRYON_BACKEND_BACKOFF_SECONDS', '0.2'))
+TRYON_BACKEND_HEDGE_AFTER_MS = float(os.environ.get('TRYON_BACKEND_HEDGE_AFTER_MS', '0'))  # 0 disables hedging
+
+backend_policy = BackendPolicy(
+    max_concurrency=TRYON_BACKEND_MAX_CONCURRENCY,
+    tenant_concurrency=TRYON_BACKEND_TENANT_CONCURRENCY,
+    timeout=TRYON_BACKEND_TIMEOUT_SECONDS,
+    retries=TRYON_BACKEND_RETRIES,
+    backoff=TRYON_BACKEND_BACKOFF_SECONDS,
+    hedge_after=TRYON_BACKEND_HEDGE_AFTER_MS / 1000 if TRYON_BACKEND_HEDGE_AFTER_MS > 0 else None,
+    outcomes=metrics_registry.counter(
+        "tryon_backend_attempts_total",
+        "Inference backend attempts by outcome (ok, error, retryable_error, timeout, retry, hedge, hedge_won)",
+        ("outcome",)
+    )
+)
+tryon_backend = create_tryon_backend(
+    TRYON_BACKEND,
+    image_executor,
+    backend_policy,
+    url=TRYON_BACKEND_URL,
+    pool_size=TRYON_BACKEND_POOL_SIZE
+)
+metrics_registry.gauge(
+    "tryon_backend_in_flight", "Inference backend calls in progress",
+    lambda: backend_policy.in_flight
+)
+
+# Catalog imports can pre-warm garments: each variant's image is loaded (base64, a file
+# under GARMENT_SOURCE_DIR or a URL on one of GARMENT_SOURCE_URL_ORIGINS), preprocessed and
+# stored ahead of try-ons, so jobs naming a product and variant skip the clothing upload and
+# preprocessing. Origins match scheme, host and port exactly, e.g. http://localhost:8001; none are
+# allowed unless configured, since the server fetches these URLs on a caller's behalf
+GARMENT_SOURCE_DIR = os.environ.get('GARMENT_SOURCE_DIR', str(ROOT_DIR / 'garments'))
+GARMENT_SOURCE_URL_ORIGINS = tuple(os.environ.get('GARMENT_SOURCE_URL_ORIGINS', '').split(','))
+GARMENT_PREWARM_WORKERS = int(os.environ.get('GARMENT_PREWARM_WORKERS', '2'))
+GARMENT_PREWARM_QUEUE_SIZE = int(os.environ.get('GARMENT_PREWARM_QUEUE_SIZE', '10000'))
+GARMENT_CACHE_MAX_BYTES = int(os.environ.get('GARMENT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+async def tenant_default_max_res(tenant_id: str) -> int:
+    """The max_res a tenant's jobs use without a maxRes option, which is what gets pre-warmed"""
+    profile = await tenant_configs.get(tenant_id)
+    return profile.render_settings(None)["max_res"]
+
+garment_assets = GarmentAssets(
+    db.garment_assets,
+    db.product_catalog,
+    blob_store,
+    image_executor,
+    GarmentSources(GARMENT_SOURCE_DIR, GARMENT_SOURCE_URL_ORIGINS),
+    default_max_res=tenant_default_max_res,
+    max_bytes=GARMENT_CACHE_MAX_BYTES,
+    workers=GARMENT_PREWARM_WORKERS,
+    max_queue=GARMENT_PREWARM_QUEUE_SIZE,
+    outcomes=metrics_registry.counter(
+        "garment_prewarm_total",
+        "Garment pre-warm results per variant (prepared, unchanged, failed, no_source, dropped)",
+        ("outcome",)
+    )
+)
+metrics_registry.gauge(
+    "garment_prewarm_queue_depth", "Imported products waiting to have their garments pre-warmed",
+    lambda: garment_assets.depth
+)
+
+# Multipart uploads are spooled to temporary files and cut off past these limits
+TRYON_UPLOAD_MAX_BYTES = int(os.environ.get('TRYON_UPLOAD_MAX_BYTES', str(15 * 1024 * 1024)))
+TRYON_UPLOAD_MAX_BODY_BYTES = int(os.environ.get('TRYON_UPLOAD_MAX_BODY_BYTES', str(2 * TRYON_UPLOAD_MAX_BYTES + 64 * 1024)))
+
+# Garments per batch try-on; every item needs a queue slot, so keep it below TRYON_QUEUE_SIZE
+TRYON_BATCH_MAX_ITEMS = int(os.environ.get('TRYON_BATCH_MAX_ITEMS', '20'))
+
+# Catalog imports are written as unordered bulk_write batches of this size
+CATALOG_IMPORT_BATCH_SIZE = int(os.environ.get('CATALOG_IMPORT_BATCH_SIZE', '1000'))
+CATALOG_IMPORT_MAX_LINE_BYTES = int(os.environ.get('CATALOG_IMPORT_MAX_LINE_BYTES', str(1024 * 1024)))
+# NDJSON imports larger than this once gunzipped are cut off with 413
+CATALOG_IMPORT_MAX_BYTES = int(os.environ.get('CATALOG_IMPORT_MAX_BYTES', str(1024 * 1024 * 1024)))
+
+# Catalog listing is keyset paginated on (tenant_id, product_id)
+CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE', '100'))
+CATALOG_MAX_PAGE_SIZE = int(os.environ.get('CATALOG_MAX_PAGE_SIZE', '1000'))
+CATALOG_FIELDS = {"id", "tenant_id", "product_id", "title", "variants", "created_at"}
+
+# Status polling reads only these fields; result fields are added on request
+JOB_STATUS_BATCH_LIMIT = int(os.environ.get('JOB_STATUS_BATCH_LIMIT', '500'))
+# Job lifecycle writes only touch the fields that change; everything else is written once at insert
+JOB_RESULT_FIELDS = (
+    "status", "result_url", "result_blob_key", "result_content_type", "result_size_bytes", "result_sha256",
+    "result_renditions", "result_cache_key", "latency_ms", "completed_at", "metrics"
+)
+JOB_FAILURE_FIELDS = ("status", "error_message", "completed_at", "metrics")
+
+JOB_STATUS_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "latency_ms": 1, "error_message": 1, "result_url": 1, "result_renditions": 1
+}
+JOB_OUTCOME_PROJECTION = {"_id": 0, **{field: 1 for field in JOB_RESULT_FIELDS + JOB_FAILURE_FIELDS}}
+JOB_RESULT_PROJECTION = {
+    **JOB_STATUS_PROJECTION,
+    "result_base64": 1, "metrics": 1
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services, warm up while already serving, and stop everything on shutdown"""
+    await start_services()
+    warm_up_task = asyncio.create_task(warm_up(), name="warm-up")
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        await stop_services()
+
 # Create the main app
-app = FastAPI(title="TryOn.fit Virtual Try-On Platform", version="1.0.0")
+app = FastAPI(title="TryOn.fit Virtual Try-On Platform", version="1.0.0", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -39,37 +405,62 @@ class TryOnRequest(BaseModel):
     tenant_id: Optional[str] = Field(default="default_tenant")
     product_id: Optional[str] = None
     variant_id: Optional[str] = None
-    person_image: str  # base64 encoded
-    clothing_image: str  # base64 encoded
+    person_image: Optional[str] = None  # base64 encoded
+    person_image_id: Optional[str] = None  # from POST /api/tryon/person-images, instead of person_image
+    clothing_image: Optional[str] = None  # base64; defaults to the catalog variant's (pre-warmed) garment
     options: Optional[Dict[str, Any]] = Field(default={
         "profile": "speed",
         "maxRes": 1024,
-        "watermark": False
+        "watermark": False,
+        "format": "png",  # png | jpeg | webp | avif
+        "quality": None  # 1-100 for lossy formats; defaults to the tenant's fidelity profile
     })
 
 class TryOnJob(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tenant_id: str
-    product_id: Optional[str]
-    variant_id: Optional[str]
+    product_id: Optional[str] = None
+    variant_id: Optional[str] = None
+    batch_id: Optional[str] = None
     status: str = "pending"  # pending, processing, completed, failed
     result_url: Optional[str] = None
-    result_base64: Optional[str] = None
+    result_base64: Optional[str] = None  # legacy, results are now kept in the blob store
+    result_blob_key: Optional[str] = None
+    result_content_type: Optional[str] = None
+    result_size_bytes: Optional[int] = None
+    result_sha256: Optional[str] = None
+    result_renditions: Optional[Dict[str, Dict[str, Any]]] = None  # name -> blob key, size, sha256, type, dimensions
     latency_ms: Optional[int] = None
     error_message: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # from the tenant's retention_days; drives retention and the TTL index
+    result_cache_key: Optional[str] = None
     metrics: Optional[Dict[str, Any]] = None
+    # Queued jobs only: where a worker finds the inputs, how to render them and the claim order
+    inputs: Optional[Dict[str, Dict[str, Any]]] = None  # person/clothing -> blob key, digest, prepared
+    settings: Optional[Dict[str, Any]] = None
+    priority: Optional[int] = None
+    lease_owner: Optional[str] = None  # the queue worker running it; its writes are dropped once the lease is lost
 
 class TryOnJobResponse(BaseModel):
     job_id: str
     status: str
     result_url: Optional[str] = None
     result_base64: Optional[str] = None
+    result_renditions: Optional[Dict[str, Dict[str, Any]]] = None
     latency_ms: Optional[int] = None
     error_message: Optional[str] = None
     metrics: Optional[Dict[str, Any]] = None
 
+class JobStatusBatchRequest(BaseModel):
+    job_ids: List[str] = Field(min_length=1, max_length=JOB_STATUS_BATCH_LIMIT)
+    include_result: bool = False
+
+class JobStatusBatchResponse(BaseModel):
+    jobs: List[TryOnJobResponse]
+    missing: List[str]
+
 class ProductCatalog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tenant_id: str
@@ -82,14 +473,26 @@ class TenantConfig(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_id: str
     plan_tier: str = "basic"
-    flags: Dict[str, Any] = Field(default={
-        "speed_profile": "fast",
-        "fidelity_profile": "medium",
-        "watermarks": False,
-        "retention_days": 72
-    })
+    flags: Dict[str, Any] = Field(default_factory=lambda: dict(DEFAULT_TENANT_FLAGS))
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class TryOnBatchItem(BaseModel):
+    product_id: Optional[str] = None
+    variant_id: Optional[str] = None
+    clothing_image: Optional[str] = None  # base64; defaults to the catalog variant's (pre-warmed) garment
+
+class TryOnBatchRequest(BaseModel):
+    tenant_id: Optional[str] = Field(default="default_tenant")
+    person_image: Optional[str] = None  # base64 encoded
+    person_image_id: Optional[str] = None  # from POST /api/tryon/person-images, instead of person_image
+    items: List[TryOnBatchItem] = Field(min_length=1, max_length=TRYON_BATCH_MAX_ITEMS)
+    options: Optional[Dict[str, Any]] = None
+
+class PersonImageRequest(BaseModel):
+    tenant_id: Optional[str] = Field(default="default_tenant")
+    person_image: str  # base64 encoded
+    options: Optional[Dict[str, Any]] = None  # maxRes (and the tenant) decide how it is preprocessed
+
 class SDKSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_id: str
@@ -104,64 +507,207 @@ def decode_base64_image(base64_str: str) -> bytes:
         base64_str = base64_str.split(',')[1]
     return base64.b64decode(base64_str)
 
+def image_bytes(image: Union[str, bytes]) -> bytes:
+    """Return raw image bytes from either an uploaded file or a base64 string"""
+    if isinstance(image, bytes):
+        return image
+    return decode_base64_image(image)
+
+class PreparedImage(NamedTuple):
+    """An input decoded and preprocessed once, shared by every job that uses it"""
+    image: Any
+    digest: bytes
+
+def job_input(image: Union[str, bytes, PreparedImage]) -> tuple[Any, bytes]:
+    """Render input and its digest; prepared images pass through, the rest is decoded from base64"""
+    if isinstance(image, PreparedImage):
+        return image.image, image.digest
+    data = image_bytes(image)
+    return data, input_digest(data)
+
+def checked_input(image: Union[str, bytes, PreparedImage]) -> Union[bytes, PreparedImage]:
+    """Decode a raw input's base64 and check it opens as an image; raises ValueError otherwise"""
+    if isinstance(image, PreparedImage):
+        return image
+    data = image_bytes(image)
+    check_input(data)
+    return data
+
+def job_input_key(job_id: str, role: str) -> str:
+    return f"inputs/{job_id}/{role}"
+
+async def job_input_ref(image: Union[str, bytes, PreparedImage], priority: int) -> tuple[bytes, Dict[str, Any]]:
+    """Bytes to store for a queued job's input and how a worker reads them back.
+
+    Prepared images are kept as lossless PNG so the worker skips preprocessing;
+    raises ValueError for undecodable base64.
+    """
+    if isinstance(image, PreparedImage):
+        data = await image_executor.run(encode_prepared_input, image.image, priority=priority)
+        return data, {"digest": image.digest.hex(), "prepared": True}
+    data = image_bytes(image)
+    return data, {"digest": input_digest(data).hex(), "prepared": False}
+
+async def store_job_inputs(
+    job: TryOnJob,
+    profile: TenantProfile,
+    settings: Dict[str, Any],
+    inputs: Dict[str, tuple[bytes, Dict[str, Any]]]
+):
+    """Make ``job`` runnable by a queue worker: its inputs go to the blob store under
+    job-scoped keys (deleted by the worker once the job finishes) and the
+    render settings and claim priority onto the job"""
+    job.inputs = {}
+    for role, (data, ref) in inputs.items():
+        blob = await blob_store.put(job_input_key(job.id, role), data, "application/octet-stream")
+        job.inputs[role] = {"key": blob.key, **ref}
+    job.settings = settings
+    job.priority = profile.priority
+
+async def wait_for_queued_job(job: TryOnJob) -> TryOnJob:
+    """Poll a queued job until a worker finishes it and copy the outcome onto ``job``.
+
+    Gives up after ``TRYON_QUEUE_WAIT_SECONDS``, returning the job still
+    pending or processing.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TRYON_QUEUE_WAIT_SECONDS
+    while True:
+        stored = await db.tryon_jobs.find_one({"id": job.id}, JOB_OUTCOME_PROJECTION)
+        if stored is None:
+            job.status = "failed"
+            job.error_message = "Try-on job was deleted before it finished"
+            return job
+        if stored["status"] in ("completed", "failed"):
+            for field, value in stored.items():
+                setattr(job, field, value)
+            # Workers publish to their own process; tell this one's subscribers
+            publish_job_status(job)
+            return job
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            job.status = stored["status"]
+            return job
+        await asyncio.sleep(min(TRYON_QUEUE_POLL_SECONDS, remaining))
+
+def json_bytes(content: Any) -> bytes:
+    """JSON encode with orjson when available; datetimes become ISO strings either way"""
+    if orjson is not None:
+        return orjson.dumps(content, default=str)
+    return json.dumps(content, default=str).encode('utf-8')
+
+def job_document(job: TryOnJob) -> Dict[str, Any]:
+    """A new job as inserted: unset fields are left out rather than stored as nulls"""
+    document = job.dict(exclude_none=True)
+    db_bytes_written.inc("insert", amount=len(bson_encode(document)))
+    return document
+
+async def update_job(job: TryOnJob, operation: str, fields: tuple):
+    """Write only ``fields`` of a stored job.
+
+    A job leased by a queue worker is only written while that worker still
+    holds the lease; otherwise the write is dropped and ``LeaseLostError``
+    raised, since the job has been handed to another worker.
+    """
+    update = {"$set": {field: getattr(job, field) for field in fields}}
+    db_bytes_written.inc(operation, amount=len(bson_encode(update)))
+    if job.lease_owner is None:
+        await db.tryon_jobs.update_one({"id": job.id}, update)
+        return
+    result = await db.tryon_jobs.update_one(held_lease_query(job.id, job.lease_owner), update)
+    if not result.matched_count:
+        raise LeaseLostError(job.id)
+
 def encode_image_to_base64(image_bytes: bytes) -> str:
     """Encode image bytes to base64 string"""
     return base64.b64encode(image_bytes).decode('utf-8')
 
-async def generate_tryon_image(person_image_b64: str, clothing_image_b64: str) -> tuple[str, int]:
-    """Generate try-on image using OpenAI image generation"""
+def result_blob_key(result_bytes: bytes, extension: str) -> str:
+    """Content-addressed blob key, so identical results are stored once"""
+    digest = hashlib.sha256(result_bytes).hexdigest()
+    return f"results/{digest[:2]}/{digest}.{extension}"
+
+async def stream_blob(key: str, content_type: str, size: Optional[int] = None, etag: Optional[str] = None) -> StreamingResponse:
+    """Stream a blob in chunks, answering 404 before any bytes are sent if it is missing"""
+    chunks = blob_store.stream(key, BLOB_CHUNK_SIZE)
+    try:
+        first_chunk = await chunks.__anext__()
+    except BlobNotFoundError:
+        raise HTTPException(status_code=404, detail="Try-on result not available")
+    except StopAsyncIteration:
+        first_chunk = b""
+    
+    async def body():
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+    
+    headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+    return StreamingResponse(body(), media_type=content_type, headers=headers)
+
+async def generate_tryon_image(
+    person: Any,
+    clothing: Any,
+    settings: Dict[str, Any],
+    profile: TenantProfile
+) -> tuple[Dict[str, Dict[str, Any]], Dict[str, float]]:
+    """Generate the try-on image with the configured inference backend.
+
+    Inputs are image bytes or images already prepared by ``prepare_input``.
+    ``settings`` come from the tenant profile, whose tenant and priority
+    decide the concurrency slot and executor order. Returns the encoded
+    renditions and the measured time of each stage.
+    """
     start_time = datetime.now()
     
-    try:
-        # For demo purposes, create a sample base64 image
-        # In production, this would call OpenAI's API
-        logging.info("Generating demo try-on image...")
-        
-        # Create a simple demo image (purple square with text)
-        from PIL import Image, ImageDraw, ImageFont
-        img = Image.new('RGB', (1024, 1536), color=(72, 72, 192))
-        draw = ImageDraw.Draw(img)
-        
-        # Add demo text
-        try:
-            # Try to use a basic font, fallback to default if not available
-            font = ImageFont.load_default()
-        except:
-            font = None
-            
-        text = "DEMO TRY-ON RESULT\n\nThis is a placeholder image.\nIn production, this would be\na realistic try-on generated\nby OpenAI's image API."
-        
-        # Calculate text position for centering
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (1024 - text_width) // 2
-        y = (1536 - text_height) // 2
-        
-        draw.multiline_text((x, y), text, fill=(255, 255, 255), font=font, align='center')
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        demo_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        
-        # Calculate latency
-        end_time = datetime.now()
-        latency_ms = int((end_time - start_time).total_seconds() * 1000)
-        
-        logging.info(f"Demo try-on image generated in {latency_ms}ms")
-        return demo_base64, latency_ms
-        
-    except Exception as e:
-        logging.error(f"Error generating try-on image: {str(e)}")
-        # Create a simple error image
-        img = Image.new('RGB', (1024, 1536), color=(192, 72, 72))
-        draw = ImageDraw.Draw(img)
-        draw.text((100, 700), f"Error: {str(e)[:100]}", fill=(255, 255, 255))
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        error_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        return error_base64, 1000
+    renditions, stage_metrics = await tryon_backend.render(
+        person, clothing, settings, profile.tenant_id, profile.priority
+    )
+    
+    # Calculate latency
+    end_time = datetime.now()
+    latency_ms = int((end_time - start_time).total_seconds() * 1000)
+    
+    logging.info(f"Try-on image generated by {tryon_backend.name} backend in {latency_ms}ms")
+    return renditions, stage_metrics
+
+async def store_renditions(renditions: Dict[str, Dict[str, Any]], output_format: str) -> Dict[str, Dict[str, Any]]:
+    """Write every rendition to the blob store and return their manifest entries"""
+    _, content_type, extension = OUTPUT_FORMATS[output_format]
+    names = list(renditions)
+    blobs = await asyncio.gather(*(
+        blob_store.put(result_blob_key(renditions[name]["data"], extension), renditions[name]["data"], content_type)
+        for name in names
+    ))
+    return {
+        name: {**blob.dict(), "width": renditions[name]["width"], "height": renditions[name]["height"]}
+        for name, blob in zip(names, blobs)
+    }
+
+async def renditions_stored(manifest_bytes: bytes) -> bool:
+    """Whether every blob of a cached manifest still exists; retention in any process may have deleted them"""
+    manifest = json.loads(manifest_bytes)
+    found = await asyncio.gather(*(blob_store.exists(entry["key"]) for entry in manifest.values()))
+    return all(found)
+
+def rendition_links(job_id: str, renditions: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Public view of a job's renditions: URL, type, dimensions and size"""
+    if not renditions:
+        return None
+    return {
+        name: {
+            "url": f"/api/tryon/{job_id}/image?rendition={name}",
+            "content_type": rendition["content_type"],
+            "width": rendition["width"],
+            "height": rendition["height"],
+            "size_bytes": rendition["size"]
+        }
+        for name, rendition in renditions.items()
+    }
 
 # API Routes
 
@@ -192,186 +738,1167 @@ async def create_session(session_data: SessionCreate):
         "client_id": session_data.client_id
     }
 
-@api_router.post("/tryon/jobs", response_model=TryOnJobResponse)
-async def create_tryon_job(tryon_request: TryOnRequest):
-    """Create a new virtual try-on job"""
-    job = TryOnJob(
-        tenant_id=tryon_request.tenant_id,
-        product_id=tryon_request.product_id,
-        variant_id=tryon_request.variant_id,
-        status="processing"
-    )
-    
+@api_router.delete("/auth/session", status_code=204, responses={401: {}})
+async def delete_session(request: Request):
+    """End the caller's SDK session: its token stops working and its registered person images are dropped.
+
+    Other API processes may still accept the token for up to
+    ``SESSION_CACHE_TTL_SECONDS`` from their own session caches.
+    """
+    token = request_token(request.scope)
+    if token is None:
+        raise HTTPException(status_code=401, detail="A session token is required", headers={"WWW-Authenticate": "Bearer"})
+    result = await db.sdk_sessions.delete_one({"session_token": token})
+    session_authenticator.revoke(token)
+    session_images.end_session(token)
+    if not result.deleted_count:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(status_code=204)
+
+async def run_tryon_job(
+    job: TryOnJob,
+    trace: JobTrace,
+    profile: TenantProfile,
+    person_image: Union[str, bytes, PreparedImage],
+    clothing_image: Union[str, bytes, PreparedImage],
+    settings: Dict[str, Any],
+    claimed: bool = False
+) -> tuple[TryOnJob, Optional[bytes]]:
+    """Generate the try-on result for a stored job and persist the outcome.
+
+    Images may be raw bytes (multipart uploads), base64 strings (JSON) or
+    images prepared once for a whole batch;
+    ``settings`` are the render settings resolved from the tenant ``profile``
+    and request options. Stage timings are collected on ``trace`` and written
+    into ``job.metrics``. Returns the updated job and, when this call rendered
+    it, the full-size result bytes (None for failures and cache hits).
+    Jobs ``claimed`` from the lease queue are already marked processing.
+    """
+    result_bytes = None
     try:
-        # Store job in database
-        await db.tryon_jobs.insert_one(job.dict())
+        job.status = "processing"
+        if not claimed:
+            with trace.stage("db_update"):
+                await update_job(job, "status", ("status",))
+        publish_job_status(job)
         
-        # Generate try-on image
-        result_base64, latency_ms = await generate_tryon_image(
-            tryon_request.person_image,
-            tryon_request.clothing_image
-        )
+        start_time = datetime.now()
+        with trace.stage("decode"):
+            person, person_digest = job_input(person_image)
+            clothing, clothing_digest = job_input(clothing_image)
+        
+        # Identical inputs and render settings share one cached (or in-flight) result
+        cache_key = result_cache_key(person_digest, clothing_digest, settings)
+        rendered: Dict[str, Dict[str, Any]] = {}
+        
+        async def generate() -> bytes:
+            renditions, measured = await generate_tryon_image(person, clothing, settings, profile)
+            for stage, duration_ms in measured.items():
+                trace.add(stage, duration_ms)
+            rendered.update(renditions)
+            # Renditions are stored once in the blob store; the cache keeps only their manifest
+            with trace.stage("storage"):
+                manifest = await store_renditions(renditions, settings["format"])
+            return json.dumps(manifest).encode('utf-8')
+        
+        # Cache hits skip the executor stages, so only the stages that ran are reported
+        manifest_bytes, cache_status = await result_cache.get_or_compute(cache_key, generate, renditions_stored)
+        manifest = json.loads(manifest_bytes)
+        latency_ms = int((datetime.now() - start_time).total_seconds() * 1000)
         
         # Update job with results
+        full = manifest["full"]
         job.status = "completed"
-        job.result_base64 = result_base64
+        job.result_url = f"/api/tryon/{job.id}/image"
+        job.result_blob_key = full["key"]
+        job.result_content_type = full["content_type"]
+        job.result_size_bytes = full["size"]
+        job.result_sha256 = full["sha256"]
+        job.result_renditions = manifest
+        job.result_cache_key = cache_key
         job.latency_ms = latency_ms
         job.completed_at = datetime.now(timezone.utc)
         job.metrics = {
-            "preprocessing_ms": 200,
-            "inference_ms": latency_ms - 400,
-            "postprocessing_ms": 200
+            **trace.timings(),
+            "cache_status": cache_status,
+            "cache_hits": result_cache.hits,
+            "cache_misses": result_cache.misses,
+            "format": settings["format"],
+            # Encode time is only known for renditions this job actually encoded
+            "renditions": {
+                name: {
+                    "bytes": entry["size"],
+                    **({"encode_ms": rendered[name]["encode_ms"]} if name in rendered else {})
+                }
+                for name, entry in manifest.items()
+            }
         }
+        if "full" in rendered:
+            result_bytes = rendered["full"]["data"]
         
-        # Update in database
-        await db.tryon_jobs.update_one(
-            {"id": job.id},
-            {"$set": job.dict()}
-        )
-        
-        return TryOnJobResponse(
-            job_id=job.id,
-            status=job.status,
-            result_base64=job.result_base64,
-            latency_ms=job.latency_ms,
-            metrics=job.metrics
-        )
+        # One result write; its own duration only reaches the histograms
+        with trace.stage("db_update"):
+            await update_job(job, "result", JOB_RESULT_FIELDS)
         
+    except LeaseLostError:
+        # Another worker owns the job now; its outcome is not this one's to report
+        raise
     except Exception as e:
         # Update job with error
         job.status = "failed"
         job.error_message = str(e)
         job.completed_at = datetime.now(timezone.utc)
+        job.metrics = trace.timings()
         
-        await db.tryon_jobs.update_one(
-            {"id": job.id},
-            {"$set": job.dict()}
+        with trace.stage("db_update"):
+            await update_job(job, "failure", JOB_FAILURE_FIELDS)
+        result_bytes = None
+    
+    publish_job_status(job)
+    stage_metrics.observe_job(trace, job.status, job.latency_ms)
+    await record_usage(job)
+    return job, result_bytes
+
+def job_status_event(job_id: str, job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Status event for subscribers, built from a job document or a job's fields"""
+    return {
+        "type": "status",
+        "job_id": job_id,
+        "status": job_data.get("status"),
+        "result_url": job_data.get("result_url"),
+        "result_renditions": rendition_links(job_id, job_data.get("result_renditions")),
+        "latency_ms": job_data.get("latency_ms"),
+        "error_message": job_data.get("error_message")
+    }
+
+def publish_job_status(job: TryOnJob):
+    """Push a job's current status to its subscribers"""
+    job_events.publish(job.id, job.tenant_id, job_status_event(job.id, {
+        "status": job.status,
+        "result_url": job.result_url,
+        "result_renditions": job.result_renditions,
+        "latency_ms": job.latency_ms,
+        "error_message": job.error_message
+    }))
+
+def job_trace(job: TryOnJob) -> JobTrace:
+    """Trace for a job whose recorded stages are also pushed to subscribers as progress"""
+    return JobTrace(
+        job.tenant_id,
+        listener=lambda stage, duration_ms: job_events.publish(
+            job.id, job.tenant_id, {"type": "stage", "stage": stage, "duration_ms": duration_ms}
         )
+    )
+
+async def record_usage(job: TryOnJob):
+    """Fold a finished job into the usage rollups; analytics never fail a job"""
+    try:
+        await usage_rollups.record(job.tenant_id, job.status, job.latency_ms, job.completed_at)
+    except Exception as e:
+        logging.warning(f"Failed to record usage for job {job.id}: {str(e)}")
+
+async def fail_pending_job(job: TryOnJob, error_message: str):
+    """Mark a stored job that never reached a worker as failed"""
+    job.status = "failed"
+    job.error_message = error_message
+    job.completed_at = datetime.now(timezone.utc)
+    await update_job(job, "failure", ("status", "error_message", "completed_at"))
+    publish_job_status(job)
+    await record_usage(job)
+
+async def fail_abandoned_jobs(job_ids: List[str]):
+    """Mark jobs the worker pool dropped at shutdown as failed, so they are not left pending"""
+    result = await db.tryon_jobs.update_many(
+        {"id": {"$in": job_ids}, "status": {"$in": ["pending", "processing"]}},
+        {"$set": {
+            "status": "failed",
+            "error_message": "Try-on workers stopped before the job finished",
+            "completed_at": datetime.now(timezone.utc)
+        }}
+    )
+    logging.warning(f"Failed {result.modified_count} try-on jobs dropped by the worker pool at shutdown")
+
+def queue_rejection(error: Exception) -> HTTPException:
+    """Map a worker pool or rate limit rejection to a 429/503 response with Retry-After"""
+    status_code = 429 if isinstance(error, (QueueFullError, RateLimitedError)) else 503
+    return HTTPException(
+        status_code=status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+async def admit_tryon_request(request: Request, profile: TenantProfile, jobs: int = 1):
+    """Check queue room and the tenant and session rate limits for ``jobs`` new jobs.
+
+    ``profile`` must be the tenant resolved through ``session_tenant``, so under
+    session auth a caller is only ever charged to, and weighted as, its own
+    tenant. Queue room is checked first so a full queue does not spend the
+    caller's tokens. Raises the 429/503 response on rejection.
+    """
+    try:
+        # Queued jobs wait in tryon_jobs for however many workers are running
+        if TRYON_EXECUTION == "local":
+            worker_pool.check_capacity(jobs, tenant_id=profile.tenant_id)
+        else:
+            await queue_backlog.check(jobs, tenant_id=profile.tenant_id)
+        tenant_rate_limiter.acquire(profile.tenant_id, jobs, scale=profile.weight)
+        session_rate_limiter.acquire(request_token(request.scope), jobs)
+    except RateLimitedError as e:
+        rate_limited_requests.inc(e.scope, profile.tenant_id)
+        raise queue_rejection(e)
+    except (QueueFullError, PoolUnavailableError, QueueBacklogError) as e:
+        raise queue_rejection(e)
+
+def submit_to_pool(job: TryOnJob, trace: JobTrace, profile: TenantProfile, handler) -> asyncio.Future:
+    """Queue a job under its (authenticated) tenant's fair share; time spent queued is recorded as ``queue_wait``"""
+    return worker_pool.submit(
+        job.id,
+        handler,
+        tenant_id=profile.tenant_id,
+        weight=profile.weight,
+        on_dequeue=lambda wait_ms: trace.add("queue_wait", wait_ms)
+    )
+
+def accepted_response(job: TryOnJob) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content=TryOnJobResponse(job_id=job.id, status=job.status).dict(),
+        headers={"Location": f"/api/tryon/jobs/{job.id}"}
+    )
+
+def request_render_settings(profile: TenantProfile, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Render settings for a request, answering 400 for invalid options"""
+    try:
+        settings = profile.render_settings(options)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid options: {str(e)}")
+    if not format_available(settings["format"]):
+        raise HTTPException(status_code=400, detail=f"Output format {settings['format']} is not available on this server")
+    return settings
+
+def require_one_person_image(person_image: Optional[str], person_image_id: Optional[str]):
+    if (person_image is None) == (person_image_id is None):
+        raise HTTPException(status_code=400, detail="Send exactly one of person_image and person_image_id")
+
+async def session_person_image(
+    request: Request,
+    person_image_id: str,
+    settings: Dict[str, Any],
+    profile: TenantProfile
+) -> tuple[PreparedImage, Dict[str, float]]:
+    """A person image registered earlier in this session, preprocessed for ``settings``.
+
+    Returns the image with the decode/preprocessing time it took now (zero when
+    it was already cached at this ``max_res``). Answers 401 without a session
+    token and 404 once the session expired or the image was evicted.
+    """
+    token = request_token(request.scope)
+    if token is None:
+        raise HTTPException(status_code=401, detail="person_image_id requires a session token")
+    try:
+        digest = bytes.fromhex(person_image_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid person_image_id")
+    
+    image, source = session_images.get(token, person_image_id, settings["max_res"])
+    timings = {"decode": 0.0, "preprocessing": 0.0}
+    if image is None:
+        if source is None:
+            raise HTTPException(status_code=404, detail="Person image not found for this session; register it again")
+        # Another maxRes than it was registered with: prepare it once more from the original upload
+        image, timings = await image_executor.run(
+            prepare_input, source, settings["max_res"], priority=profile.priority
+        )
+        session_images.add_variant(token, person_image_id, settings["max_res"], image)
+    return PreparedImage(image, digest), timings
+
+async def catalog_garment(
+    tenant_id: str,
+    product_id: Optional[str],
+    variant_id: Optional[str],
+    settings: Dict[str, Any],
+    profile: TenantProfile
+) -> Optional[Union[PreparedImage, bytes]]:
+    """Garment for a catalog variant: its pre-warmed image when prepared at this ``max_res``,
+    else the variant's original image to preprocess as usual, or None without one"""
+    if not product_id or variant_id is None:
+        return None
+    prepared = await garment_assets.get(tenant_id, product_id, str(variant_id), settings["max_res"], profile.priority)
+    if prepared is not None:
+        return PreparedImage(*prepared)
+    product = await db.product_catalog.find_one(
+        {"tenant_id": tenant_id, "product_id": product_id},
+        {"_id": 0, "variants": 1}
+    )
+    for variant in (product or {}).get("variants") or []:
+        if isinstance(variant, dict) and str(variant.get("id")) == str(variant_id) and GarmentSources.has_source(variant):
+            try:
+                return await garment_assets.sources.load(variant)
+            except GarmentSourceError as e:
+                logging.warning(f"Garment image for {tenant_id}/{product_id}/{variant_id} unavailable: {str(e)}")
+                return None
+    return None
+
+async def submit_tryon_job(
+    request: Request,
+    job: TryOnJob,
+    person_image: Optional[Union[str, bytes]],
+    clothing_image: Optional[Union[str, bytes]],
+    options: Optional[Dict[str, Any]],
+    job_mode: str,
+    person_image_id: Optional[str] = None
+):
+    """Store a pending job, hand it to the worker pool and build the HTTP response.
+
+    With ``TRYON_EXECUTION=queue`` the job is stored with its inputs for a
+    queue worker instead, and sync callers wait for a worker to finish it.
+    With ``person_image_id`` the person image comes from the session's
+    registered images instead of ``person_image``; without ``clothing_image``
+    the garment comes from the job's catalog variant.
+    """
+    trace = job_trace(job)
+    
+    # Served from memory for known tenants; only a cache miss reads tenant_configs
+    with trace.stage("tenant_config"):
+        profile = await tenant_configs.get(job.tenant_id)
+    
+    # Invalid options are rejected before they can spend rate limit tokens
+    settings = request_render_settings(profile, options)
+    # Reject before touching the database when there is no room or budget for the job
+    await admit_tryon_request(request, profile)
+    
+    job.expires_at = job_expiry(job.created_at, profile.retention_days)
+    
+    if person_image_id is not None:
+        person_image, timings = await session_person_image(request, person_image_id, settings, profile)
+        for stage, duration_ms in timings.items():
+            if duration_ms:
+                trace.add(stage, duration_ms)
+    if clothing_image is None:
+        with trace.stage("garment_lookup"):
+            clothing_image = await catalog_garment(job.tenant_id, job.product_id, job.variant_id, settings, profile)
+        if clothing_image is None:
+            raise HTTPException(status_code=404, detail=f"No garment image for product {job.product_id} variant {job.variant_id}")
+    
+    # Unreadable images are the caller's error in either execution mode, so no job is stored for them
+    try:
+        person_image = checked_input(person_image)
+        clothing_image = checked_input(clothing_image)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    
+    if TRYON_EXECUTION == "queue":
+        inputs = {
+            "person": await job_input_ref(person_image, profile.priority),
+            "clothing": await job_input_ref(clothing_image, profile.priority)
+        }
+        with trace.stage("storage"):
+            await store_job_inputs(job, profile, settings, inputs)
+        del inputs
+    
+    # Store job in database; a queued job is claimable from here on
+    with trace.stage("db_insert"):
+        await db.tryon_jobs.insert_one(job_document(job))
+    publish_job_status(job)
+    
+    if TRYON_EXECUTION == "queue":
+        if job_mode == "async":
+            return accepted_response(job)
+        job, result_bytes = await wait_for_queued_job(job), None
+        if job.status not in ("completed", "failed"):
+            # No worker finished it in time; the caller polls like an async client
+            return accepted_response(job)
+    else:
+        try:
+            future = submit_to_pool(
+                job, trace, profile,
+                lambda: run_tryon_job(job, trace, profile, person_image, clothing_image, settings)
+            )
+        except (QueueFullError, PoolUnavailableError) as e:
+            # The queue filled up while the job was being stored
+            await fail_pending_job(job, str(e))
+            raise queue_rejection(e)
         
-        raise HTTPException(status_code=500, detail=str(e))
+        if job_mode == "async":
+            return accepted_response(job)
+        
+        try:
+            job, result_bytes = await future
+        except PoolUnavailableError as e:
+            # The server shut down before a worker finished the job
+            raise queue_rejection(e)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error_message)
+    
+    # Sync callers also get the full-size result inline; cache hits read it back from the store
+    if result_bytes is None:
+        try:
+            result_bytes = await blob_store.read(job.result_blob_key)
+        except BlobNotFoundError:
+            raise HTTPException(status_code=500, detail="Try-on result went missing from the blob store")
+    
+    with trace.stage("serialization"):
+        content = json_bytes(job_response_content(job, result_base64=encode_image_to_base64(result_bytes)))
+    stage_metrics.observe_stage(trace, "serialization")
+    
+    return Response(content=content, media_type="application/json")
+
+@api_router.post(
+    "/tryon/jobs",
+    response_model=TryOnJobResponse,
+    responses={202: {"model": TryOnJobResponse}, 429: {}, 503: {}}
+)
+async def create_tryon_job(
+    request: Request,
+    tryon_request: TryOnRequest,
+    mode: Optional[str] = Query(default=None, pattern="^(sync|async)$")
+):
+    """Create a new virtual try-on job.
+
+    In async mode the job is stored as pending and 202 is returned right away;
+    poll ``GET /api/tryon/jobs/{job_id}`` for the result. Send
+    ``person_image_id`` instead of ``person_image`` to reuse a person image
+    registered earlier in the same session. Under session auth the job belongs
+    to the session's client; a different ``tenant_id`` is refused with 403.
+    """
+    require_one_person_image(tryon_request.person_image, tryon_request.person_image_id)
+    if tryon_request.clothing_image is None and not (tryon_request.product_id and tryon_request.variant_id):
+        raise HTTPException(status_code=400, detail="Send clothing_image or a catalog product_id and variant_id")
+    job = TryOnJob(
+        tenant_id=session_tenant(request.scope.get("state", {}), supplied_tenant(tryon_request), "default_tenant"),
+        product_id=tryon_request.product_id,
+        variant_id=tryon_request.variant_id,
+        status="pending"
+    )
+    
+    return await submit_tryon_job(
+        request,
+        job,
+        tryon_request.person_image,
+        tryon_request.clothing_image,
+        tryon_request.options,
+        mode or TRYON_JOB_MODE,
+        person_image_id=tryon_request.person_image_id
+    )
+
+@api_router.post(
+    "/tryon/jobs/upload",
+    response_model=TryOnJobResponse,
+    responses={202: {"model": TryOnJobResponse}, 400: {}, 413: {}, 429: {}, 503: {}},
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["person_image", "clothing_image"],
+                        "properties": {
+                            "person_image": {"type": "string", "format": "binary"},
+                            "clothing_image": {"type": "string", "format": "binary"},
+                            "tenant_id": {"type": "string"},
+                            "product_id": {"type": "string"},
+                            "variant_id": {"type": "string"},
+                            "options": {"type": "string", "description": "JSON encoded options"}
+                        }
+                    }
+                }
+            },
+            "required": True
+        }
+    }
+)
+async def create_tryon_job_upload(
+    request: Request,
+    mode: Optional[str] = Query(default=None, pattern="^(sync|async)$")
+):
+    """Create a try-on job from raw image files sent as multipart/form-data.
+
+    Same pipeline and response as ``POST /api/tryon/jobs`` without the base64
+    overhead; oversize bodies are rejected with 413 while streaming.
+    """
+    try:
+        fields, files = await parse_multipart_upload(
+            request,
+            ("person_image", "clothing_image"),
+            max_file_bytes=TRYON_UPLOAD_MAX_BYTES,
+            max_body_bytes=TRYON_UPLOAD_MAX_BODY_BYTES
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    options = TryOnRequest.model_fields["options"].get_default()
+    if fields.get("options"):
+        try:
+            options = json.loads(fields["options"])
+        except ValueError:
+            options = None
+        if not isinstance(options, dict):
+            raise HTTPException(status_code=400, detail="options must be a JSON object")
+    
+    job = TryOnJob(
+        tenant_id=session_tenant(request.scope.get("state", {}), fields.get("tenant_id") or None, "default_tenant"),
+        product_id=fields.get("product_id"),
+        variant_id=fields.get("variant_id"),
+        status="pending"
+    )
+    
+    return await submit_tryon_job(
+        request,
+        job,
+        files["person_image"],
+        files["clothing_image"],
+        options,
+        mode or TRYON_JOB_MODE
+    )
+
+def session_tenant(state: Dict[str, Any], tenant_id: Optional[str], default: Optional[str] = None) -> Optional[str]:
+    """Tenant a request acts for: the authenticated session's client under session auth, else ``tenant_id``.
+
+    Under session auth a ``tenant_id`` naming another tenant is refused with
+    403; callers pass None when the request left it out. Without a session,
+    a missing ``tenant_id`` falls back to ``default``.
+    """
+    client_id = state.get("session_client_id")
+    if client_id is None:
+        return tenant_id or default
+    if tenant_id is not None and tenant_id != client_id:
+        raise HTTPException(status_code=403, detail="tenant_id does not match the session's client")
+    return client_id
+
+def supplied_tenant(body: BaseModel) -> Optional[str]:
+    """The ``tenant_id`` a request body set itself, None when it relied on the model default"""
+    return body.tenant_id if "tenant_id" in body.model_fields_set else None
+
+@api_router.post("/tryon/person-images", responses={400: {}, 401: {}})
+async def register_person_image(request: Request, registration: PersonImageRequest):
+    """Register a person image with the caller's SDK session for repeat try-ons.
+
+    The image is decoded and preprocessed for the tenant's render settings now
+    and kept in memory under the session token until the session expires.
+    Later jobs and batches in the same session send the returned
+    ``person_image_id`` instead of the image; a 404 there means it was evicted
+    and should be registered again.
+    """
+    token = request_token(request.scope)
+    session = await session_authenticator.lookup(token) if token is not None else None
+    if session is None:
+        raise HTTPException(status_code=401, detail="A valid session token is required", headers={"WWW-Authenticate": "Bearer"})
+    
+    # Under session auth the body cannot pick another tenant's render settings
+    profile = await tenant_configs.get(
+        session_tenant(request.scope.get("state", {}), supplied_tenant(registration), "default_tenant")
+    )
+    settings = request_render_settings(profile, registration.options)
+    try:
+        source = decode_base64_image(registration.person_image)
+        image, timings = await image_executor.run(
+            prepare_input, source, settings["max_res"], priority=profile.priority
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid person image: {str(e)}")
+    
+    person_image_id = input_digest(source).hex()
+    session_images.register(token, session[1], person_image_id, source, settings["max_res"], image)
+    return {
+        "person_image_id": person_image_id,
+        "width": image.width,
+        "height": image.height,
+        "max_res": settings["max_res"],
+        "expires_at": datetime.fromtimestamp(session[1], timezone.utc).isoformat(),
+        "decode_ms": timings["decode"],
+        "preprocessing_ms": timings["preprocessing"]
+    }
+
+def batch_item_line(event: str, **fields) -> bytes:
+    return json_bytes({"event": event, **fields}) + b"\n"
+
+@api_router.post(
+    "/tryon/batch",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One JSON object per line"},
+        400: {}, 429: {}, 503: {}
+    }
+)
+async def create_tryon_batch(request: Request, batch: TryOnBatchRequest):
+    """Try one person image against many garments, streaming results as NDJSON.
+
+    The person image is decoded and preprocessed once and shared by every
+    item. Items are clothing images or catalog product/variant pairs whose
+    variant has a garment image (pre-warmed ones skip preprocessing). The
+    stream starts with a ``started`` line, has one ``result`` line per item
+    in completion order and ends with a ``finished`` summary.
+    ``person_image_id`` may replace ``person_image`` and ``tenant_id`` is
+    checked against the session as for single jobs.
+    """
+    start_time = datetime.now()
+    require_one_person_image(batch.person_image, batch.person_image_id)
+    tenant_id = session_tenant(request.scope.get("state", {}), supplied_tenant(batch), "default_tenant")
+    profile = await tenant_configs.get(tenant_id)
+    settings = request_render_settings(profile, batch.options)
+    # The whole batch is admitted or rejected up front
+    await admit_tryon_request(request, profile, len(batch.items))
+    
+    if batch.person_image_id is not None:
+        person, person_timings = await session_person_image(request, batch.person_image_id, settings, profile)
+    else:
+        try:
+            person_bytes = decode_base64_image(batch.person_image)
+            person_image, person_timings = await image_executor.run(
+                prepare_input, person_bytes, settings["max_res"], priority=profile.priority
+            )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid person image: {str(e)}")
+        person = PreparedImage(person_image, input_digest(person_bytes))
+        del person_bytes
+    # Queued items share one encoding of the prepared person image
+    person_input = await job_input_ref(person, profile.priority) if TRYON_EXECUTION == "queue" else None
+    
+    batch_id = str(uuid.uuid4())
+    jobs = [
+        TryOnJob(
+            tenant_id=tenant_id,
+            product_id=item.product_id,
+            variant_id=item.variant_id,
+            batch_id=batch_id,
+            status="pending"
+        )
+        for item in batch.items
+    ]
+    for job in jobs:
+        job.expires_at = job_expiry(job.created_at, profile.retention_days)
+    await db.tryon_jobs.insert_many([job_document(job) for job in jobs])
+    for job in jobs:
+        publish_job_status(job)
+    
+    async def item_result(index: int, job: TryOnJob, item: TryOnBatchItem) -> tuple[int, TryOnJob]:
+        clothing = item.clothing_image or await catalog_garment(
+            tenant_id, item.product_id, item.variant_id, settings, profile
+        )
+        if clothing is None:
+            await fail_pending_job(job, f"No garment image for product {item.product_id} variant {item.variant_id}")
+            return index, job
+        if TRYON_EXECUTION == "queue":
+            try:
+                await store_job_inputs(job, profile, settings, {
+                    "person": person_input,
+                    "clothing": await job_input_ref(clothing, profile.priority)
+                })
+            except Exception as e:
+                await fail_pending_job(job, f"Could not queue job: {str(e)}")
+                return index, job
+            # Batch jobs were inserted without inputs, so this write is what makes them claimable
+            await update_job(job, "queue", ("inputs", "settings", "priority"))
+            return index, await wait_for_queued_job(job)
+        trace = job_trace(job)
+        try:
+            future = submit_to_pool(
+                job, trace, profile,
+                lambda: run_tryon_job(job, trace, profile, person, clothing, settings)
+            )
+        except (QueueFullError, PoolUnavailableError) as e:
+            await fail_pending_job(job, str(e))
+            return index, job
+        try:
+            job, _ = await future
+        except Exception as e:
+            job.status = "failed"
+            job.error_message = str(e) or "Try-on worker stopped"
+        return index, job
+    
+    # Submit every item before the response starts streaming
+    pending = [
+        asyncio.ensure_future(item_result(index, job, item))
+        for index, (job, item) in enumerate(zip(jobs, batch.items))
+    ]
+    
+    async def lines():
+        yield batch_item_line(
+            "started",
+            batch_id=batch_id,
+            items=len(jobs),
+            person_decode_ms=person_timings["decode"],
+            person_preprocessing_ms=person_timings["preprocessing"]
+        )
+        counts = {"completed": 0, "failed": 0}
+        for next_result in asyncio.as_completed(pending):
+            index, job = await next_result
+            counts[job.status] = counts.get(job.status, 0) + 1
+            yield batch_item_line(
+                "result",
+                index=index,
+                product_id=job.product_id,
+                variant_id=job.variant_id,
+                **job_response_content(job)
+            )
+        yield batch_item_line(
+            "finished",
+            batch_id=batch_id,
+            items=len(jobs),
+            completed=counts["completed"],
+            failed=counts["failed"],
+            duration_ms=int((datetime.now() - start_time).total_seconds() * 1000)
+        )
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def job_response_content(job: TryOnJob, result_base64: Optional[str] = None) -> Dict[str, Any]:
+    """``TryOnJobResponse`` body for a job in hand, built without model validation"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "result_url": job.result_url,
+        "result_base64": result_base64,
+        "result_renditions": rendition_links(job.id, job.result_renditions),
+        "latency_ms": job.latency_ms,
+        "error_message": job.error_message,
+        "metrics": job.metrics
+    }
+
+def job_status_response(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a ``TryOnJobResponse`` body straight from a projected document"""
+    return {
+        "job_id": job_data["id"],
+        "status": job_data["status"],
+        "result_url": job_data.get("result_url"),
+        "result_base64": job_data.get("result_base64"),
+        "result_renditions": rendition_links(job_data["id"], job_data.get("result_renditions")),
+        "latency_ms": job_data.get("latency_ms"),
+        "error_message": job_data.get("error_message"),
+        "metrics": job_data.get("metrics")
+    }
+
+@api_router.post("/tryon/jobs/status", response_model=JobStatusBatchResponse)
+async def get_tryon_job_statuses(batch: JobStatusBatchRequest):
+    """Get the status of many try-on jobs in a single query"""
+    job_ids = list(dict.fromkeys(batch.job_ids))
+    projection = JOB_RESULT_PROJECTION if batch.include_result else JOB_STATUS_PROJECTION
+    
+    found = {}
+    async for job_data in db.tryon_jobs.find({"id": {"$in": job_ids}}, projection):
+        found[job_data["id"]] = job_status_response(job_data)
+    
+    return JobJSONResponse(content={
+        "jobs": [found[job_id] for job_id in job_ids if job_id in found],
+        "missing": [job_id for job_id in job_ids if job_id not in found]
+    })
 
 @api_router.get("/tryon/jobs/{job_id}", response_model=TryOnJobResponse)
-async def get_tryon_job(job_id: str):
-    """Get try-on job status and results"""
-    job_data = await db.tryon_jobs.find_one({"id": job_id})
+async def get_tryon_job(job_id: str, include_result: bool = False):
+    """Get try-on job status, and its result fields when ``include_result`` is set"""
+    projection = JOB_RESULT_PROJECTION if include_result else JOB_STATUS_PROJECTION
+    job_data = await db.tryon_jobs.find_one({"id": job_id}, projection)
     
     if not job_data:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = TryOnJob(**job_data)
+    return JobJSONResponse(content=job_status_response(job_data))
+
+async def job_event_snapshot(job_id: str) -> Optional[Dict[str, Any]]:
+    """Current status event for a job: from the hub if it is recent, else one projected read"""
+    event = job_events.latest(job_id)
+    if event is not None:
+        return event
+    job_data = await db.tryon_jobs.find_one({"id": job_id}, JOB_STATUS_PROJECTION)
+    return job_status_event(job_id, job_data) if job_data else None
+
+async def live_job_events(
+    subscription: Subscription,
+    snapshot: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """The snapshot, then events as they are published; ``None`` marks an idle keepalive interval.
+
+    Job streams (those with a snapshot) end after the final status.
+    """
+    last_seq = 0
+    if snapshot is not None:
+        yield snapshot
+        if is_terminal(snapshot):
+            return
+        last_seq = snapshot.get("seq", 0)
+    while True:
+        event = await subscription.get(JOB_EVENTS_KEEPALIVE_SECONDS)
+        if event is None and snapshot is not None and TRYON_EXECUTION == "queue":
+            # Queue workers publish in their own process; check on the job once per keepalive
+            job_data = await db.tryon_jobs.find_one(
+                {"id": snapshot["job_id"]},
+                {**JOB_STATUS_PROJECTION, "tenant_id": 1}
+            )
+            if job_data is not None and job_data["status"] in ("completed", "failed"):
+                job_events.publish(job_data["id"], job_data["tenant_id"], job_status_event(job_data["id"], job_data))
+                continue
+        if event is not None and event["seq"] <= last_seq:
+            # Already covered by the snapshot
+            continue
+        yield event
+        if snapshot is not None and event is not None and is_terminal(event):
+            return
+
+def sse_message(event: Optional[Dict[str, Any]]) -> bytes:
+    if event is None:
+        return b": keepalive\n\n"
+    lines = f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    if "seq" in event:
+        lines = f"id: {event['seq']}\n" + lines
+    return lines.encode('utf-8')
+
+def sse_response(subscription: Subscription, snapshot: Optional[Dict[str, Any]] = None) -> StreamingResponse:
+    async def body():
+        with subscription:
+            async for event in live_job_events(subscription, snapshot):
+                yield sse_message(event)
     
-    return TryOnJobResponse(
-        job_id=job.id,
-        status=job.status,
-        result_base64=job.result_base64,
-        latency_ms=job.latency_ms,
-        error_message=job.error_message,
-        metrics=job.metrics
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+async def send_websocket_events(websocket: WebSocket, subscription: Subscription, snapshot: Optional[Dict[str, Any]] = None):
+    await websocket.accept()
+    with subscription:
+        try:
+            async for event in live_job_events(subscription, snapshot):
+                # Idle keepalives also surface clients that went away
+                await websocket.send_json(event or {"type": "keepalive"})
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+
+@api_router.get("/tryon/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-Sent Events for one job: its current status, stage progress and final result, then the stream ends"""
+    # Subscribe before reading the snapshot so no transition falls in between
+    subscription = job_events.subscribe(job_topic(job_id))
+    snapshot = await job_event_snapshot(job_id)
+    if snapshot is None:
+        subscription.close()
+        raise HTTPException(status_code=404, detail="Job not found")
+    return sse_response(subscription, snapshot)
+
+@api_router.websocket("/tryon/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket carrying the same events as ``/tryon/jobs/{job_id}/events``"""
+    subscription = job_events.subscribe(job_topic(job_id))
+    snapshot = await job_event_snapshot(job_id)
+    if snapshot is None:
+        subscription.close()
+        await websocket.close(code=1008, reason="Job not found")
+        return
+    await send_websocket_events(websocket, subscription, snapshot)
+
+@api_router.get("/tryon/events")
+async def stream_session_events(request: Request, tenant_id: Optional[str] = None):
+    """Server-Sent Events for every job of the session's client (or ``tenant_id`` when auth is off)"""
+    tenant = session_tenant(request.scope.get("state", {}), tenant_id)
+    if not tenant:
+        raise HTTPException(status_code=400, detail="tenant_id is required without a session token")
+    return sse_response(job_events.subscribe(tenant_topic(tenant)))
+
+@api_router.websocket("/tryon/ws")
+async def session_events_websocket(websocket: WebSocket, tenant_id: Optional[str] = None):
+    """WebSocket carrying the same events as ``/tryon/events``"""
+    try:
+        tenant = session_tenant(websocket.scope.get("state", {}), tenant_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    if not tenant:
+        await websocket.close(code=1008, reason="tenant_id is required without a session token")
+        return
+    await send_websocket_events(websocket, job_events.subscribe(tenant_topic(tenant)))
+
 @api_router.get("/tryon/{tryon_id}/base64")
 async def get_tryon_base64(tryon_id: str):
     """Get try-on result as base64 encoded image"""
-    job_data = await db.tryon_jobs.find_one({"id": tryon_id})
+    job_data = await db.tryon_jobs.find_one(
+        {"id": tryon_id},
+        {"_id": 0, "id": 1, "status": 1, "result_blob_key": 1, "result_content_type": 1, "result_base64": 1}
+    )
     
     if not job_data:
         raise HTTPException(status_code=404, detail="Try-on not found")
     
-    job = TryOnJob(**job_data)
+    if job_data["status"] != "completed" or not (job_data.get("result_blob_key") or job_data.get("result_base64")):
+        raise HTTPException(status_code=404, detail="Try-on result not available")
+    
+    if job_data.get("result_blob_key"):
+        try:
+            result_base64 = encode_image_to_base64(await blob_store.read(job_data["result_blob_key"]))
+        except BlobNotFoundError:
+            raise HTTPException(status_code=404, detail="Try-on result not available")
+        content_type = job_data.get("result_content_type")
+    else:
+        result_base64 = job_data["result_base64"]
+        content_type = "image/png"
     
-    if job.status != "completed" or not job.result_base64:
+    return JobJSONResponse(content={
+        "image_data": f"data:{content_type};base64,{result_base64}",
+        "job_id": job_data["id"],
+        "status": job_data["status"]
+    })
+
+@api_router.get("/tryon/{tryon_id}/image")
+async def get_tryon_image(tryon_id: str, rendition: str = Query("full", pattern="^(full|mobile|thumb)$")):
+    """Stream a rendition of the try-on result (full size by default) as raw bytes"""
+    job_data = await db.tryon_jobs.find_one(
+        {"id": tryon_id},
+        {"_id": 0, "status": 1, "result_blob_key": 1, "result_content_type": 1,
+         "result_size_bytes": 1, "result_sha256": 1, f"result_renditions.{rendition}": 1}
+    )
+    
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Try-on not found")
+    
+    if job_data.get("status") != "completed" or not job_data.get("result_blob_key"):
         raise HTTPException(status_code=404, detail="Try-on result not available")
     
-    return {
-        "image_data": f"data:image/png;base64,{job.result_base64}",
-        "job_id": job.id,
-        "status": job.status
-    }
+    entry = (job_data.get("result_renditions") or {}).get(rendition)
+    if entry:
+        return await stream_blob(entry["key"], entry["content_type"], size=entry["size"], etag=entry["sha256"])
+    if rendition != "full":
+        # Jobs finished before renditions existed only have the full-size result
+        raise HTTPException(status_code=404, detail=f"Rendition {rendition} not available")
+    
+    return await stream_blob(
+        job_data["result_blob_key"],
+        job_data.get("result_content_type") or "application/octet-stream",
+        size=job_data.get("result_size_bytes"),
+        etag=job_data.get("result_sha256")
+    )
+
+def catalog_upsert(tenant_id: str, product_data: Dict[str, Any]) -> UpdateOne:
+    """Build the upsert for one imported product"""
+    catalog = ProductCatalog(
+        tenant_id=tenant_id,
+        product_id=product_data["productId"],
+        title=product_data["title"],
+        variants=product_data.get("variants", [])
+    )
+    fields = catalog.dict()
+    # Keep the original id and creation time when a product is re-imported
+    on_insert = {"id": fields.pop("id"), "created_at": fields.pop("created_at")}
+    
+    return UpdateOne(
+        {"tenant_id": tenant_id, "product_id": catalog.product_id},
+        {"$set": fields, "$setOnInsert": on_insert},
+        upsert=True
+    )
+
+def prewarm_summary(tenant_id: str, product_ids: List[str], prewarm: bool) -> Dict[str, Any]:
+    """Queue imported products for garment pre-warming once their upserts are written"""
+    if not prewarm:
+        return {}
+    return {"prewarm_queued": garment_assets.enqueue(tenant_id, list(dict.fromkeys(product_ids)))}
 
 @api_router.post("/catalog/import")
-async def import_catalog(catalog_data: Dict[str, Any]):
-    """Import product catalog for SDK integration"""
-    tenant_id = catalog_data.get("tenant_id", "default_tenant")
+async def import_catalog(
+    request: Request,
+    catalog_data: Dict[str, Any],
+    batch_size: int = Query(default=CATALOG_IMPORT_BATCH_SIZE, ge=1, le=10000),
+    prewarm: bool = False
+):
+    """Import product catalog for SDK integration.
+
+    With ``prewarm=true`` every variant's garment image is prepared in the
+    background so try-ons naming the variant can skip it. Under session auth
+    products go to the session's client; a different ``tenant_id`` is refused with 403.
+    """
+    tenant_id = session_tenant(request.scope.get("state", {}), catalog_data.get("tenant_id"), "default_tenant")
     products = catalog_data.get("products", [])
     
-    imported_count = 0
+    importer = CatalogImporter(
+        db.product_catalog,
+        lambda product_data: catalog_upsert(tenant_id, product_data),
+        batch_size=batch_size
+    )
     for product_data in products:
-        catalog = ProductCatalog(
-            tenant_id=tenant_id,
-            product_id=product_data["productId"],
-            title=product_data["title"],
-            variants=product_data.get("variants", [])
-        )
-        
-        # Upsert product
-        await db.product_catalog.update_one(
-            {"tenant_id": tenant_id, "product_id": catalog.product_id},
-            {"$set": catalog.dict()},
-            upsert=True
+        await importer.add(product_data)
+    await importer.flush()
+    product_ids = [
+        product_data["productId"] for product_data in products
+        if isinstance(product_data, dict) and product_data.get("productId")
+    ]
+    
+    return {
+        **importer.summary(),
+        **prewarm_summary(tenant_id, product_ids, prewarm),
+        "tenant_id": tenant_id
+    }
+
+@api_router.post("/catalog/import/ndjson")
+async def import_catalog_ndjson(
+    request: Request,
+    tenant_id: Optional[str] = None,
+    batch_size: int = Query(default=CATALOG_IMPORT_BATCH_SIZE, ge=1, le=10000),
+    prewarm: bool = False
+):
+    """Stream a catalog as NDJSON (optionally gzipped), one product per line.
+
+    Lines are parsed and written in batches as the body arrives, so the whole
+    catalog is never held in memory. Malformed lines are counted as errors;
+    bodies over ``CATALOG_IMPORT_MAX_BYTES`` once gunzipped stop with 413.
+    ``prewarm`` and ``tenant_id`` work as for ``POST /api/catalog/import``.
+    """
+    tenant_id = session_tenant(request.scope.get("state", {}), tenant_id, "default_tenant")
+    importer = CatalogImporter(
+        db.product_catalog,
+        lambda product_data: catalog_upsert(tenant_id, product_data),
+        batch_size=batch_size
+    )
+    product_ids = []
+    
+    try:
+        async for product_data in iter_ndjson(request.stream(), CATALOG_IMPORT_MAX_LINE_BYTES, CATALOG_IMPORT_MAX_BYTES):
+            if product_data is None:
+                importer.add_error()
+            else:
+                await importer.add(product_data)
+                if prewarm and isinstance(product_data, dict) and product_data.get("productId"):
+                    product_ids.append(product_data["productId"])
+    except (CatalogLineError, CatalogTooLargeError, zlib.error) as e:
+        await importer.flush()
+        return JSONResponse(
+            status_code=413 if isinstance(e, CatalogTooLargeError) else 400,
+            content={**importer.summary(), **prewarm_summary(tenant_id, product_ids, prewarm), "tenant_id": tenant_id, "detail": str(e)}
         )
-        imported_count += 1
+    await importer.flush()
     
     return {
-        "imported_products": imported_count,
+        **importer.summary(),
+        **prewarm_summary(tenant_id, product_ids, prewarm),
         "tenant_id": tenant_id
     }
 
+def encode_catalog_cursor(product_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": product_id}).encode('utf-8')).decode('ascii')
+
+def decode_catalog_cursor(cursor: str) -> str:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))["after"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @api_router.get("/catalog/products")
-async def get_catalog_products(tenant_id: str = "default_tenant"):
-    """Get catalog products for a tenant"""
-    products = await db.product_catalog.find({"tenant_id": tenant_id}).to_list(100)
-    # Convert ObjectId to string to make it JSON serializable
-    for product in products:
-        if '_id' in product:
-            product['_id'] = str(product['_id'])
-    return {"products": products}
+async def get_catalog_products(
+    request: Request,
+    tenant_id: Optional[str] = None,
+    limit: int = Query(default=CATALOG_PAGE_SIZE, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(default=None, description="Comma separated fields to return, e.g. product_id,title")
+):
+    """Get catalog products for a tenant, one page at a time.
+
+    Products are ordered by ``product_id``; pass ``next_cursor`` from the
+    previous page as ``cursor`` to continue. ``next_cursor`` is null on the
+    last page. Under session auth only the session's client's products are
+    listed; a different ``tenant_id`` is refused with 403.
+    """
+    tenant_id = session_tenant(request.scope.get("state", {}), tenant_id, "default_tenant")
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - CATALOG_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # product_id is always needed to build the next cursor
+        projection = {"_id": 0, "product_id": 1, **{field: 1 for field in requested}}
+    else:
+        projection = {"_id": 0}
+    
+    query: Dict[str, Any] = {"tenant_id": tenant_id}
+    if cursor:
+        query["product_id"] = {"$gt": decode_catalog_cursor(cursor)}
+    
+    # Fetch one extra document to learn whether another page exists
+    products = await db.product_catalog.find(query, projection).sort(
+        [("product_id", ASCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_catalog_cursor(products[-1]["product_id"])
+    
+    return {"products": products, "next_cursor": next_cursor}
 
 @api_router.post("/tenants")
 async def create_tenant(tenant_data: Dict[str, Any]):
     """Create or update tenant configuration"""
+    try:
+        flags = validate_flags(tenant_data.get("flags", {}))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     tenant = TenantConfig(
         client_id=tenant_data["client_id"],
         plan_tier=tenant_data.get("plan_tier", "basic"),
-        flags=tenant_data.get("flags", {})
+        flags=flags
     )
     
-    await db.tenant_configs.update_one(
+    previous = await db.tenant_configs.find_one_and_update(
         {"client_id": tenant.client_id},
         {"$set": tenant.dict()},
+        projection={"_id": 0, "plan_tier": 1, "flags": 1},
         upsert=True
     )
+    tenant_configs.invalidate(tenant.client_id)
+    # Stored jobs were stamped with the old retention; move them so none goes early or lingers
+    retention_days = resolve_profile(tenant.client_id, tenant.dict()).retention_days
+    if previous is not None and resolve_profile(tenant.client_id, previous).retention_days != retention_days:
+        retention_service.schedule_restamp(tenant.client_id, retention_days)
     
     return {"client_id": tenant.client_id, "status": "configured"}
 
 @api_router.get("/analytics/usage")
-async def get_usage_analytics(tenant_id: str = "default_tenant"):
-    """Get usage analytics for tenant"""
-    total_jobs = await db.tryon_jobs.count_documents({"tenant_id": tenant_id})
-    completed_jobs = await db.tryon_jobs.count_documents({
-        "tenant_id": tenant_id,
-        "status": "completed"
-    })
-    
-    # Get average latency
-    pipeline = [
-        {"$match": {"tenant_id": tenant_id, "status": "completed"}},
-        {"$group": {"_id": None, "avg_latency": {"$avg": "$latency_ms"}}}
-    ]
-    
-    latency_result = await db.tryon_jobs.aggregate(pipeline).to_list(1)
-    avg_latency = latency_result[0]["avg_latency"] if latency_result else 0
+async def get_usage_analytics(
+    tenant_id: str = "default_tenant",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Optional[str] = Query(default=None, pattern="^(minute|hour|day)$")
+):
+    """Get usage analytics for tenant.
+
+    Without ``start``/``end`` this covers all time. With a window, counts,
+    success rate, throughput and p50/p95/p99 latency are merged from the
+    minute/hour/day rollups covering it (widened to whole buckets).
+    """
+    # Bounds without an offset are UTC, so they compare with aware ones
+    start = as_utc(start) if start else None
+    end = as_utc(end) if end else None
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
     
-    return {
-        "tenant_id": tenant_id,
-        "total_jobs": total_jobs,
-        "completed_jobs": completed_jobs,
-        "success_rate": (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0,
-        "average_latency_ms": round(avg_latency, 2)
-    }
+    try:
+        return await usage_rollups.summary(tenant_id, start=start, end=end, granularity=granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/ready", include_in_schema=False)
+async def readiness():
+    """Readiness probe: 503 until warm-up has finished, then the start-up timings"""
+    if not startup_timer.ready:
+        return JSONResponse(status_code=503, content=startup_timer.report(), headers={"Retry-After": "1"})
+    return startup_timer.report()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Added before CORS so that CORS wraps it and 401s still carry CORS headers
+app.add_middleware(
+    SessionAuthMiddleware,
+    authenticator=session_authenticator,
+    protected_prefixes=SESSION_AUTH_PREFIXES,
+    enabled=SESSION_AUTH_ENABLED
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -387,6 +1914,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def create_indexes():
+    """Create the declared indexes, retrying while Mongo is unreachable"""
+    delay = 0.5
+    while True:
+        try:
+            await ensure_indexes(db)
+            return
+        except ConnectionFailure as e:
+            logging.warning(f"Index creation waiting for Mongo, retrying in {delay}s: {str(e)}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5)
+
+async def backfill_usage_rollups():
+    # Deployments that predate the rollups get them rebuilt once from job history;
+    # every process tries, one holds the lease, and a failed run is resumed later
+    while True:
+        try:
+            if await usage_rollups.backfill_done():
+                return
+            jobs = await usage_rollups.backfill(db.tryon_jobs)
+            if jobs is not None:
+                logging.info(f"Backfilled usage rollups from {jobs} existing jobs")
+                return
+        except Exception as e:
+            logging.error(f"Usage rollup backfill failed: {str(e)}")
+        await asyncio.sleep(USAGE_BACKFILL_RETRY_SECONDS)
+
+async def start_usage_rollups():
+    global usage_backfill_task
+    usage_backfill_task = asyncio.create_task(backfill_usage_rollups())
+
+async def stop_usage_rollups():
+    if usage_backfill_task is not None:
+        usage_backfill_task.cancel()
+        await asyncio.gather(usage_backfill_task, return_exceptions=True)
+
+async def start_worker_pool():
+    image_executor.start()
+    await tryon_backend.start()
+    await worker_pool.start()
+    await garment_assets.start()
+
+async def start_retention():
+    if RETENTION_ENABLED:
+        retention_service.start()
+
+async def start_services():
+    await start_usage_rollups()
+    with startup_timer.phase("services"):
+        await start_worker_pool()
+        await start_retention()
+
+async def ping_mongo():
+    """Wait until Mongo answers, opening the connection pool on the way"""
+    delay = 0.5
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except Exception as e:
+            logging.warning(f"Mongo not reachable yet, retrying in {delay}s: {str(e)}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5)
+
+async def warm_up():
+    """Reach Mongo, create the indexes and start every image worker with Pillow's codecs
+    and fonts loaded, then report ready; readiness waits for Mongo and the indexes, a
+    failed executor warm-up does not"""
+    with startup_timer.phase("mongo"):
+        await ping_mongo()
+    with startup_timer.phase("indexes"):
+        await create_indexes()
+    with startup_timer.phase("image_executor"):
+        try:
+            workers = await image_executor.warm_up(warm_up_codecs)
+        except Exception as e:
+            workers = 0
+            logging.error(f"Image executor warm-up failed: {str(e)}")
+    startup_timer.mark_ready()
+    logging.info(
+        f"Ready {startup_timer.import_to_ready_seconds}s after import started "
+        f"({workers} image workers warmed): {startup_timer.phases}"
+    )
+
+async def stop_services():
+    await stop_usage_rollups()
+    await retention_service.stop()
+    await garment_assets.stop()
+    abandoned = await worker_pool.stop()
+    if abandoned:
+        await fail_abandoned_jobs(abandoned)
+    await tryon_backend.close()
+    image_executor.shutdown()
+    await blob_store.close()
+    client.close()
+# Everything above runs at import; the rest of start-up happens in the lifespan
+startup_timer.mark("module")
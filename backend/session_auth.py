@@ -0,0 +1,156 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_timestamp(expires_at: datetime) -> float:
+    # Mongo hands back naive datetimes that are in UTC
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+class SessionAuthenticator:
+    """Validates SDK session tokens against ``sdk_sessions`` with bounded caches.
+
+    Valid tokens are kept in an LRU (``max_size`` entries) for up to
+    ``cache_ttl_seconds``, so repeat requests skip Mongo; each hit still
+    checks the session's own expiry. Unknown tokens are remembered briefly
+    so a client retrying a bad token does not cause a lookup per request.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_size: int = 100000,
+        cache_ttl_seconds: float = 300,
+        negative_ttl_seconds: float = 5
+    ):
+        self.collection = collection
+        self.valid = TTLCache(maxsize=max(1, max_size), ttl=cache_ttl_seconds)
+        self.invalid = TTLCache(maxsize=max(1, max_size // 10), ttl=negative_ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    async def authenticate(self, token: str) -> Optional[str]:
+        """Return the session's client id, or None if the token is unknown or expired"""
+        session = await self.lookup(token)
+        return session[0] if session is not None else None
+
+    async def lookup(self, token: str) -> Optional[Tuple[str, float]]:
+        """Return the session's client id and expiry timestamp, or None if the token is unknown or expired"""
+        cached: Optional[Tuple[str, float]] = self.valid.get(token)
+        if cached is not None:
+            self.hits += 1
+            if cached[1] > time.time():
+                return cached
+            self.valid.pop(token, None)
+            return None
+        if token in self.invalid:
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        session = await self.collection.find_one(
+            {"session_token": token},
+            {"_id": 0, "client_id": 1, "expires_at": 1}
+        )
+        if session is None:
+            self.invalid[token] = True
+            return None
+        expires_at = expiry_timestamp(session["expires_at"])
+        if expires_at <= time.time():
+            # The TTL monitor has not purged it yet
+            return None
+        cached = (session["client_id"], expires_at)
+        self.valid[token] = cached
+        return cached
+
+    def revoke(self, token: str):
+        """Forget a token that was just deleted from ``sdk_sessions``, so this process rejects it at once"""
+        self.valid.pop(token, None)
+        self.invalid[token] = True
+
+
+def request_token(scope) -> Optional[str]:
+    """Session token from ``Authorization: Bearer <token>`` or a ``session_token`` query parameter.
+
+    The query parameter exists for URLs loaded without custom headers, such as
+    ``<img src>`` pointing at a try-on result.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token.strip():
+                return token.strip()
+            return None
+    if scope.get("query_string"):
+        tokens = parse_qs(scope["query_string"].decode("latin-1")).get("session_token")
+        if tokens:
+            return tokens[0]
+    return None
+
+
+class SessionAuthMiddleware:
+    """ASGI middleware requiring a valid session token under the protected path prefixes.
+
+    Covers HTTP requests and WebSocket handshakes. The authenticated client id
+    is exposed to handlers as ``request.state.session_client_id``. Written as
+    plain ASGI rather than ``BaseHTTPMiddleware`` so streaming responses pass
+    through untouched and cached checks stay cheap.
+    """
+
+    def __init__(self, app, authenticator: SessionAuthenticator, protected_prefixes: Tuple[str, ...], enabled: bool = True):
+        self.app = app
+        self.authenticator = authenticator
+        self.protected_prefixes = protected_prefixes
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.enabled
+            or scope["type"] not in ("http", "websocket")
+            or scope.get("method") == "OPTIONS"
+            or not scope["path"].startswith(self.protected_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        reject = self.reject if scope["type"] == "http" else self.reject_websocket
+        token = request_token(scope)
+        if token is None:
+            await reject(send, "Missing session token")
+            return
+        try:
+            client_id = await self.authenticator.authenticate(token)
+        except Exception as e:
+            logger.error(f"Session lookup failed: {str(e)}")
+            await reject(send, "Session validation unavailable", status=503)
+            return
+        if client_id is None:
+            await reject(send, "Invalid or expired session token")
+            return
+
+        scope.setdefault("state", {})["session_client_id"] = client_id
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def reject(send, detail: str, status: int = 401):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status == 401:
+            headers.append((b"www-authenticate", b"Bearer"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def reject_websocket(send, detail: str, status: int = 401):
+        # Closing before accepting makes the server answer the handshake with 403
+        await send({"type": "websocket.close", "code": 1008 if status == 401 else 1011, "reason": detail})
@@ -0,0 +1,91 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+
+def entry_size(entry: Tuple[str, Any]) -> int:
+    """Bytes an entry holds: the upload's length, or a decoded image's pixel buffer"""
+    kind, value = entry
+    if kind == "source":
+        return len(value)
+    return value.width * value.height * len(value.getbands())
+
+
+class SessionImageCache:
+    """Person images registered by an SDK session, kept decoded for repeat try-ons.
+
+    Entries are keyed by session token and content hash, so only the session
+    that uploaded an image can reference it. Each registered image keeps its
+    original bytes plus one preprocessed copy per ``max_res`` used, all in one
+    LRU bounded by ``max_bytes``; a preprocessed copy can outlive its source.
+    Entries of expired sessions are dropped when read and swept periodically.
+    """
+
+    def __init__(self, max_bytes: int, sweep_interval_seconds: float = 60):
+        self.entries = LRUCache(maxsize=max(1, max_bytes), getsizeof=entry_size)
+        self.session_expiry: Dict[str, float] = {}
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self._last_sweep = time.monotonic()
+
+    @property
+    def bytes(self) -> int:
+        return self.entries.currsize
+
+    def _alive(self, token: str) -> bool:
+        expires_at = self.session_expiry.get(token)
+        return expires_at is not None and expires_at > time.time()
+
+    def _store(self, key: tuple, entry: Tuple[str, Any]):
+        # Entries larger than the whole cache are simply not kept
+        if entry_size(entry) <= self.entries.maxsize:
+            self.entries[key] = entry
+
+    def sweep(self):
+        """Drop every entry belonging to an expired session"""
+        now = time.time()
+        expired = {token for token, expires_at in self.session_expiry.items() if expires_at <= now}
+        for key in [key for key in list(self.entries.keys()) if key[0] in expired]:
+            self.entries.pop(key, None)
+        for token in expired:
+            del self.session_expiry[token]
+        self._last_sweep = time.monotonic()
+
+    def end_session(self, token: str):
+        """Drop a session's entries right away, e.g. on logout"""
+        self.session_expiry.pop(token, None)
+        for key in [key for key in list(self.entries.keys()) if key[0] == token]:
+            self.entries.pop(key, None)
+
+    def register(self, token: str, session_expires_at: float, digest: str, source: bytes, max_res: int, image: Any):
+        """Keep an upload and its preprocessed image under the session until it expires"""
+        if time.monotonic() - self._last_sweep > self.sweep_interval_seconds:
+            self.sweep()
+        self.session_expiry[token] = session_expires_at
+        self._store((token, digest, None), ("source", source))
+        self._store((token, digest, max_res), ("image", image))
+
+    def add_variant(self, token: str, digest: str, max_res: int, image: Any):
+        if self._alive(token):
+            self._store((token, digest, max_res), ("image", image))
+
+    def get(self, token: str, digest: str, max_res: int) -> Tuple[Optional[Any], Optional[bytes]]:
+        """The preprocessed image for ``max_res`` if cached, else the original bytes if still held.
+
+        Both are None when the session expired or the image was evicted.
+        """
+        if not self._alive(token):
+            self.misses += 1
+            return None, None
+        entry = self.entries.get((token, digest, max_res))
+        if entry is not None:
+            self.hits += 1
+            return entry[1], None
+        entry = self.entries.get((token, digest, None))
+        if entry is not None:
+            self.hits += 1
+            return None, entry[1]
+        self.misses += 1
+        return None, None
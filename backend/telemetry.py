@@ -0,0 +1,266 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Stage latency buckets in milliseconds
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            # Per-bucket counts followed by the running sum and total count
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def total(self, **labels: str) -> Tuple[float, int]:
+        """Sum and count of the observations whose labels match ``labels``"""
+        wanted = [(self.label_names.index(name), value) for name, value in labels.items()]
+        total, count = 0.0, 0
+        with self._lock:
+            for label_values, series in self._series.items():
+                if all(label_values[i] == value for i, value in wanted):
+                    total += series[-2]
+                    count += series[-1]
+        return total, count
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(labels, list(series)) for labels, series in items]
+        for label_values, series in items:
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(series[-2])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {format_value(series[-1])}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def total(self, **labels: str) -> float:
+        """Sum of the series whose labels match ``labels``"""
+        wanted = [(self.label_names.index(name), value) for name, value in labels.items()]
+        with self._lock:
+            return sum(
+                value for label_values, value in self._values.items()
+                if all(label_values[i] == expected for i, expected in wanted)
+            )
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{format_labels(dict(zip(self.label_names, label_values)))} {format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {format_value(self.read())}"
+        ]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS_MS) -> Histogram:
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...]) -> Counter:
+        return self.register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help_text, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class JobTrace:
+    """Per-job record of how long each pipeline stage took, in milliseconds.
+
+    Stages timed on the event loop use ``with trace.stage(name)``; stages timed
+    elsewhere (e.g. in an executor process) are merged in with ``add``. The
+    optional ``listener`` is called with each stage name and duration as it is
+    recorded, e.g. to push job progress to subscribers.
+    """
+
+    def __init__(self, tenant_id: str, listener: Optional[Callable[[str, float], None]] = None):
+        self.tenant_id = tenant_id
+        self.stages: Dict[str, float] = {}
+        self.listener = listener
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float):
+        # Stages can run more than once per job (e.g. two DB updates); accumulate them
+        self.stages[name] = round(self.stages.get(name, 0) + duration_ms, 2)
+        if self.listener is not None:
+            self.listener(name, round(duration_ms, 2))
+
+    def timings(self) -> Dict[str, float]:
+        """Stage timings keyed the way they are stored in job metrics"""
+        return {f"{name}_ms": duration for name, duration in self.stages.items()}
+
+
+class StageMetrics:
+    """Exports job traces as per-stage, per-tenant latency histograms"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.stage_latency = registry.histogram(
+            "tryon_stage_duration_ms",
+            "Duration of each try-on pipeline stage in milliseconds",
+            ("stage", "tenant")
+        )
+        self.job_latency = registry.histogram(
+            "tryon_job_duration_ms",
+            "End-to-end try-on job latency in milliseconds",
+            ("tenant", "status")
+        )
+        self.jobs = registry.counter(
+            "tryon_jobs_total",
+            "Try-on jobs finished, by tenant and final status",
+            ("tenant", "status")
+        )
+
+    def observe_stage(self, trace: JobTrace, name: str, duration_ms: Optional[float] = None):
+        """Record a single stage that finished after the job trace was exported"""
+        if duration_ms is None:
+            duration_ms = trace.stages.get(name, 0)
+        self.stage_latency.observe(duration_ms, name, trace.tenant_id)
+
+    def observe_job(self, trace: JobTrace, status: str, latency_ms: Optional[float]):
+        for name, duration_ms in trace.stages.items():
+            self.stage_latency.observe(duration_ms, name, trace.tenant_id)
+        if latency_ms is not None:
+            self.job_latency.observe(latency_ms, trace.tenant_id, status)
+        self.jobs.inc(trace.tenant_id, status)
+
+
+class StartupTimer:
+    """Phases of process start-up, from the first import to ready for traffic, in milliseconds.
+
+    ``started_at`` is a ``time.perf_counter()`` reading taken as early as
+    possible during import; phases are timed with ``with timer.phase(name)``
+    (or ``mark`` for the time since the previous mark) and ``mark_ready``
+    closes the record once warm-up is done.
+    """
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self._last_mark = self.started_at
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def import_to_ready_seconds(self) -> Optional[float]:
+        return round(self.ready_at - self.started_at, 3) if self.ready_at is not None else None
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last_mark) * 1000, 2)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+            self._last_mark = time.perf_counter()
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter()
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "import_to_ready_seconds": self.import_to_ready_seconds,
+            "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+            "phases_ms": dict(self.phases)
+        }
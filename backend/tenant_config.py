@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+from pydantic import BaseModel
+
+from imaging import RENDITIONS
+from result_cache import normalize_options
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLAN_TIER = "basic"
+DEFAULT_TENANT_FLAGS = {
+    "speed_profile": "fast",
+    "fidelity_profile": "medium",
+    "watermarks": False,
+    "retention_days": 72
+}
+
+# Jobs are kept at least a day and at most ten years
+RETENTION_DAYS_RANGE = (1, 3650)
+
+# Output canvas and the largest input side each speed profile renders from
+SPEED_PROFILES = {
+    "fast": {"output_size": (1024, 1536), "max_input_res": 1024},
+    "balanced": {"output_size": (1280, 1920), "max_input_res": 1536},
+    "quality": {"output_size": (1536, 2304), "max_input_res": 2048},
+}
+
+# Default quality for lossy formats; PNG is lossless, so there fidelity trades
+# encode time for smaller files
+FIDELITY_PROFILES = {
+    "low": {"quality": 70, "png_compress_level": 1},
+    "medium": {"quality": 82, "png_compress_level": 6},
+    "high": {"quality": 92, "png_compress_level": 9},
+}
+
+# Lower values get image executor slots first
+PLAN_PRIORITIES = {
+    "enterprise": 0,
+    "premium": 1,
+    "basic": 2,
+}
+
+# Share of the try-on queue and of the tenant rate limit each plan gets under contention
+PLAN_WEIGHTS = {
+    "enterprise": 4.0,
+    "premium": 2.0,
+    "basic": 1.0,
+}
+
+
+class TenantProfile(BaseModel):
+    """Rendering and scheduling settings resolved from a tenant's configuration"""
+    tenant_id: str
+    plan_tier: str
+    speed_profile: str
+    fidelity_profile: str
+    output_size: Tuple[int, int]
+    max_input_res: int
+    quality: int
+    png_compress_level: int
+    watermark: bool
+    priority: int
+    weight: float
+    retention_days: int
+
+    def render_settings(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Everything that changes the rendered bytes for this tenant and request.
+
+        Requests may ask for a smaller ``maxRes``, a watermark, an output format
+        and quality, but never for more resolution than the tenant's speed
+        profile allows. Raises ValueError for invalid options.
+        """
+        options = normalize_options(options)
+        return {
+            "max_res": min(options["maxRes"], self.max_input_res),
+            "output_size": list(self.output_size),
+            "format": options["format"],
+            # Quality only affects lossy formats; keeping it out of PNG keys lets them share results
+            "quality": None if options["format"] == "png" else options["quality"] or self.quality,
+            "png_compress_level": self.png_compress_level,
+            "watermark": self.watermark or options["watermark"],
+            "renditions": RENDITIONS
+        }
+
+
+def _choice(value: Any, options: Dict[str, Any], default: Optional[str]) -> Optional[str]:
+    return value if isinstance(value, str) and value in options else default
+
+
+def parse_retention_days(value: Any) -> int:
+    """Whole days within ``RETENTION_DAYS_RANGE``; raises ValueError otherwise"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("retention_days must be a whole number of days")
+    days = float(value)
+    if not days.is_integer():
+        raise ValueError("retention_days must be a whole number of days")
+    low, high = RETENTION_DAYS_RANGE
+    if not low <= days <= high:
+        raise ValueError(f"retention_days must be between {low} and {high}")
+    return int(days)
+
+
+def validate_flags(flags: Any) -> Dict[str, Any]:
+    """Check tenant flags written through the API; raises ValueError naming the first bad one"""
+    if not isinstance(flags, dict):
+        raise ValueError("flags must be an object")
+    if "speed_profile" in flags and _choice(flags["speed_profile"], SPEED_PROFILES, None) is None:
+        raise ValueError(f"speed_profile must be one of {', '.join(SPEED_PROFILES)}")
+    if "fidelity_profile" in flags and _choice(flags["fidelity_profile"], FIDELITY_PROFILES, None) is None:
+        raise ValueError(f"fidelity_profile must be one of {', '.join(FIDELITY_PROFILES)}")
+    if "watermarks" in flags and not isinstance(flags["watermarks"], bool):
+        raise ValueError("watermarks must be true or false")
+    if "retention_days" in flags:
+        if isinstance(flags["retention_days"], str):
+            raise ValueError("retention_days must be a whole number of days")
+        flags = {**flags, "retention_days": parse_retention_days(flags["retention_days"])}
+    return flags
+
+
+def resolve_profile(tenant_id: str, config: Optional[Dict[str, Any]]) -> TenantProfile:
+    """Map a stored tenant config (or none) to a profile, falling back to defaults per unusable value"""
+    config = config or {}
+    flags = config.get("flags")
+    flags = {**DEFAULT_TENANT_FLAGS, **(flags if isinstance(flags, dict) else {})}
+    plan_tier = config.get("plan_tier")
+    plan_tier = plan_tier if isinstance(plan_tier, str) and plan_tier else DEFAULT_PLAN_TIER
+    speed_profile = _choice(flags["speed_profile"], SPEED_PROFILES, DEFAULT_TENANT_FLAGS["speed_profile"])
+    fidelity_profile = _choice(flags["fidelity_profile"], FIDELITY_PROFILES, DEFAULT_TENANT_FLAGS["fidelity_profile"])
+    watermark = flags["watermarks"] if isinstance(flags["watermarks"], bool) else DEFAULT_TENANT_FLAGS["watermarks"]
+    try:
+        retention_days = parse_retention_days(flags["retention_days"])
+    except ValueError:
+        retention_days = DEFAULT_TENANT_FLAGS["retention_days"]
+    return TenantProfile(
+        tenant_id=tenant_id,
+        plan_tier=plan_tier,
+        speed_profile=speed_profile,
+        fidelity_profile=fidelity_profile,
+        watermark=watermark,
+        priority=PLAN_PRIORITIES.get(plan_tier, PLAN_PRIORITIES[DEFAULT_PLAN_TIER]),
+        weight=PLAN_WEIGHTS.get(plan_tier, PLAN_WEIGHTS[DEFAULT_PLAN_TIER]),
+        retention_days=retention_days,
+        **SPEED_PROFILES[speed_profile],
+        **FIDELITY_PROFILES[fidelity_profile]
+    )
+
+
+class TenantConfigCache:
+    """Resolves tenant profiles from ``tenant_configs`` through an in-memory TTL cache.
+
+    Tenants without a stored config are cached too, so steady-state jobs make
+    no database round trip. Writes through this process call ``invalidate``;
+    other processes see changes once the TTL expires. Concurrent misses for
+    the same tenant share one lookup.
+    """
+
+    def __init__(self, collection, ttl_seconds: float = 60, max_size: int = 10000):
+        self.collection = collection
+        self.profiles = TTLCache(maxsize=max(1, max_size), ttl=ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+    async def _load(self, tenant_id: str) -> TenantProfile:
+        generation = self._generation
+        try:
+            config = await self.collection.find_one(
+                {"client_id": tenant_id},
+                {"_id": 0, "plan_tier": 1, "flags": 1}
+            )
+        except Exception as e:
+            # Serve defaults without caching them, so the next job retries the lookup
+            logger.warning(f"Tenant config lookup failed for {tenant_id}: {str(e)}")
+            return resolve_profile(tenant_id, None)
+        profile = resolve_profile(tenant_id, config)
+        # A config written while this lookup ran may have been missed; don't cache it
+        if generation == self._generation:
+            self.profiles[tenant_id] = profile
+        return profile
+
+    async def get(self, tenant_id: str) -> TenantProfile:
+        profile = self.profiles.get(tenant_id)
+        if profile is not None:
+            self.hits += 1
+            return profile
+
+        in_flight = self._in_flight.get(tenant_id)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[tenant_id] = future
+        try:
+            profile = await self._load(tenant_id)
+            future.set_result(profile)
+            return profile
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if self._in_flight.get(tenant_id) is future:
+                del self._in_flight[tenant_id]
+
+    def invalidate(self, tenant_id: str):
+        self._generation += 1
+        self.profiles.pop(tenant_id, None)
+        # Callers arriving after the write should not join a lookup that started before it
+        self._in_flight.pop(tenant_id, None)
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+from imaging import finish_remote_result, prepare_remote_inputs, render_tryon
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BackendError(Exception):
+    """Raised when a try-on backend cannot produce a result"""
+
+
+class RetryableBackendError(BackendError):
+    """A transient backend failure (timeout, connection error, 429 or 5xx) worth retrying"""
+
+
+def elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class TenantLimiter:
+    """Caps concurrent backend calls per tenant.
+
+    A tenant's semaphore only exists while it has calls in flight, so idle
+    tenants cost nothing.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._tenants: Dict[str, list] = {}  # tenant -> [semaphore, callers]
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: str) -> AsyncIterator[None]:
+        entry = self._tenants.get(tenant_id)
+        if entry is None:
+            entry = self._tenants[tenant_id] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._tenants[tenant_id]
+
+
+class BackendPolicy:
+    """Concurrency caps, timeouts, retries and hedging around backend calls.
+
+    Each call holds one of ``max_concurrency`` global slots and one of the
+    tenant's ``tenant_concurrency`` slots, so one tenant cannot use up the
+    backend. Every attempt is bounded by ``timeout``. Retryable failures are
+    retried up to ``retries`` times with full-jitter exponential backoff.
+    With ``hedge_after`` set, an attempt still running after that many
+    seconds is raced against a second one; the first success wins. Hedges only
+    start when a global slot is free, so they never queue behind real work.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        tenant_concurrency: int = 4,
+        timeout: float = 30.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+        max_backoff: float = 5.0,
+        hedge_after: Optional[float] = None,
+        outcomes=None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        # Optional telemetry Counter labelled by outcome
+        self.outcomes = outcomes
+        self.tenants = TenantLimiter(tenant_concurrency)
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    def _count(self, outcome: str):
+        if self.outcomes is not None:
+            self.outcomes.inc(outcome)
+
+    async def call(self, tenant_id: str, fn: Callable[[], Awaitable[T]]) -> T:
+        async with self.tenants.slot(tenant_id):
+            async with self._slots:
+                self.in_flight += 1
+                try:
+                    return await self._with_retries(fn)
+                finally:
+                    self.in_flight -= 1
+
+    async def _with_retries(self, fn: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(fn)
+            except RetryableBackendError as e:
+                if attempt >= self.retries:
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                attempt += 1
+                self._count("retry")
+                logger.warning(f"Backend call failed ({str(e)}), retry {attempt}/{self.retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            result = await asyncio.wait_for(fn(), self.timeout)
+        except asyncio.TimeoutError:
+            self._count("timeout")
+            raise RetryableBackendError(f"Backend call timed out after {self.timeout}s")
+        except RetryableBackendError:
+            self._count("retryable_error")
+            raise
+        except Exception:
+            self._count("error")
+            raise
+        self._count("ok")
+        return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if self.hedge_after is None:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+            if done or self._slots.locked():
+                return await primary
+            async with self._slots:
+                self._count("hedge")
+                hedge = asyncio.ensure_future(self._timed(fn))
+                pending = {primary, hedge}
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is hedge:
+                                self._count("hedge_won")
+                            return task.result()
+                # Both attempts failed; report the original one
+                raise primary.exception()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+class TryOnBackend:
+    """Produces the encoded renditions of a try-on result from two inputs.
+
+    Inputs are image bytes or images already prepared by ``prepare_input``.
+    ``render`` returns the renditions (see ``imaging.encode_renditions``) and
+    the time spent in each stage in ms.
+    """
+
+    name = "base"
+
+    def __init__(self, executor, policy: BackendPolicy):
+        self.executor = executor
+        self.policy = policy
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def render(
+        self,
+        person: Any,
+        clothing: Any,
+        settings: Dict[str, Any],
+        tenant_id: str,
+        priority: int
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, float]]:
+        raise NotImplementedError
+
+
+class DemoBackend(TryOnBackend):
+    """Renders the placeholder result locally on the image executor"""
+
+    name = "demo"
+
+    async def render(self, person, clothing, settings, tenant_id, priority):
+        return await self.policy.call(
+            tenant_id,
+            lambda: self.executor.run(render_tryon, person, clothing, settings, priority=priority)
+        )
+
+
+class HTTPBackend(TryOnBackend):
+    """Calls a remote inference service through one pooled async HTTP client.
+
+    Protocol: ``POST {base_url}/render`` with multipart ``person_image`` and
+    ``clothing_image`` (JPEG, already shrunk to ``max_res``) and a JSON
+    ``settings`` field; the response body is the result image. Decoding,
+    watermarking and rendition encoding stay on the local image executor.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        base_url: str,
+        executor,
+        policy: BackendPolicy,
+        pool_size: int = 32,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        super().__init__(executor, policy)
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                # Attempts are bounded by the policy timeout
+                timeout=None,
+                transport=self.transport
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def infer(self, person_bytes: bytes, clothing_bytes: bytes, settings: Dict[str, Any]) -> bytes:
+        try:
+            response = await self.client.post(
+                "/render",
+                files={
+                    "person_image": ("person.jpg", person_bytes, "image/jpeg"),
+                    "clothing_image": ("clothing.jpg", clothing_bytes, "image/jpeg")
+                },
+                data={"settings": json.dumps(settings)}
+            )
+        except httpx.TransportError as e:
+            raise RetryableBackendError(f"Backend request failed: {str(e) or type(e).__name__}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableBackendError(f"Backend answered {response.status_code}")
+        if response.status_code >= 400:
+            raise BackendError(f"Backend rejected the request ({response.status_code}): {response.text[:200]}")
+        return response.content
+
+    async def render(self, person, clothing, settings, tenant_id, priority):
+        await self.start()
+        (person_bytes, clothing_bytes), timings = await self.executor.run(
+            prepare_remote_inputs, person, clothing, settings, priority=priority
+        )
+        start = time.perf_counter()
+        result = await self.policy.call(tenant_id, lambda: self.infer(person_bytes, clothing_bytes, settings))
+        timings["inference"] = elapsed_ms(start)
+        renditions, finishing = await self.executor.run(finish_remote_result, result, settings, priority=priority)
+        return renditions, {**timings, **finishing}
+
+
+def create_tryon_backend(
+    kind: str,
+    executor,
+    policy: BackendPolicy,
+    url: Optional[str] = None,
+    pool_size: int = 32
+) -> TryOnBackend:
+    """Build the configured backend: ``demo``, ``http`` (needs ``url``) or ``fake``"""
+    if kind == "demo":
+        return DemoBackend(executor, policy)
+    if kind == "http":
+        if not url:
+            raise ValueError("TRYON_BACKEND_URL is required for the http try-on backend")
+        return HTTPBackend(url, executor, policy, pool_size=pool_size)
+    if kind == "fake":
+        # The fake inference app served in-process, exercising the full HTTP path
+        import fake_inference
+        return HTTPBackend(
+            "http://fake-inference",
+            executor,
+            policy,
+            pool_size=pool_size,
+            transport=httpx.ASGITransport(app=fake_inference.app)
+        )
+    raise ValueError(f"Unknown try-on backend: {kind}")
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Dict, Tuple
+
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.types import Message, Receive
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as a multipart body grows past its size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+class UploadFormatError(Exception):
+    """Raised when a multipart body is missing required parts"""
+
+
+def limited_receive(receive: Receive, limit: int) -> Receive:
+    """Wrap an ASGI receive callable so the body is cut off once it exceeds ``limit`` bytes"""
+    received = 0
+
+    async def receive_with_limit() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise UploadTooLargeError(limit)
+        return message
+
+    return receive_with_limit
+
+
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """Read a spooled upload back into bytes, enforcing the per-file limit"""
+    if upload.size is not None and upload.size > limit:
+        raise UploadTooLargeError(limit)
+    # Large parts were rolled over to disk by the parser; read them off the event loop
+    upload.file.seek(0)
+    data = await asyncio.to_thread(upload.file.read, limit + 1)
+    if len(data) > limit:
+        raise UploadTooLargeError(limit)
+    return data
+
+
+async def parse_multipart_upload(
+    request: Request,
+    file_fields: Tuple[str, ...],
+    max_file_bytes: int,
+    max_body_bytes: int
+) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    """Stream a multipart/form-data body into spooled temporary files.
+
+    Oversize bodies are rejected from the Content-Length header before reading,
+    or while streaming when the header is absent or wrong. Returns the plain
+    form fields and the bytes of each requested file part.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body_bytes:
+        raise UploadTooLargeError(max_body_bytes)
+
+    limited = Request(request.scope, limited_receive(request.receive, max_body_bytes))
+    try:
+        form = await limited.form(max_files=len(file_fields), max_fields=16)
+    except ValueError as e:
+        # python-multipart parse errors are ValueErrors
+        raise UploadFormatError(f"Malformed multipart body: {str(e)}")
+    try:
+        fields = {}
+        for name, value in form.multi_items():
+            if isinstance(value, str):
+                fields[name] = value
+
+        files = {}
+        for name in file_fields:
+            upload = form.get(name)
+            if not isinstance(upload, UploadFile):
+                raise UploadFormatError(f"Missing file part: {name}")
+            files[name] = await read_upload(upload, max_file_bytes)
+    finally:
+        await form.close()
+
+    return fields, files
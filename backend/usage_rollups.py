@@ -0,0 +1,284 @@
+import logging
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+ALL_TIME = "all"
+ALL_TIME_BUCKET = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Upper bound on buckets read per query; windows pick the finest granularity under it
+MAX_QUERY_BUCKETS = 400
+
+# State document of the one-off backfill from job history
+BACKFILL_MARKER_ID = "backfill"
+
+
+class LatencySketch:
+    """Log-bucketed latency histogram (HDR style) that merges by adding counts.
+
+    Bucket ``i`` holds latencies in ``(GROWTH**(i-1), GROWTH**i]`` ms and is
+    reported at its geometric midpoint, so quantiles carry at most about
+    ``(GROWTH - 1) / 2`` relative error. Bucket 0 holds latencies up to 1 ms.
+    """
+
+    GROWTH = 1.05
+
+    @classmethod
+    def bucket_index(cls, latency_ms: float) -> int:
+        if latency_ms <= 1:
+            return 0
+        return math.ceil(math.log(latency_ms) / math.log(cls.GROWTH))
+
+    @classmethod
+    def bucket_value(cls, index: int) -> float:
+        if index == 0:
+            return 1.0
+        return round(cls.GROWTH ** (index - 0.5), 2)
+
+    @staticmethod
+    def merge(histograms: Iterable[Dict[str, int]]) -> Dict[int, int]:
+        merged: Dict[int, int] = {}
+        for histogram in histograms:
+            for index, count in (histogram or {}).items():
+                merged[int(index)] = merged.get(int(index), 0) + count
+        return merged
+
+    @classmethod
+    def quantiles(cls, histogram: Dict[int, int], qs: Tuple[float, ...]) -> Dict[float, Optional[float]]:
+        total = sum(histogram.values())
+        if total == 0:
+            return {q: None for q in qs}
+        results = {}
+        ordered = sorted(histogram.items())
+        for q in qs:
+            rank = max(1, math.ceil(q * total))
+            seen = 0
+            for index, count in ordered:
+                seen += count
+                if seen >= rank:
+                    results[q] = cls.bucket_value(index)
+                    break
+        return results
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Aware UTC datetime; naive ones (as Mongo returns them, or query strings without an offset) are taken as UTC"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == ALL_TIME:
+        return ALL_TIME_BUCKET
+    moment = as_utc(moment)
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def pick_granularity(start: datetime, end: datetime) -> str:
+    """Finest granularity that covers the window in at most MAX_QUERY_BUCKETS buckets"""
+    span = end - start
+    for granularity, step in GRANULARITIES.items():
+        if span / step <= MAX_QUERY_BUCKETS:
+            return granularity
+    return "day"
+
+
+class UsageRollups:
+    """Per-tenant job counters and latency sketches, maintained as jobs finish.
+
+    Each finished job increments one document per granularity (minute, hour,
+    day and all-time) in a single ``bulk_write``, so analytics read a bounded
+    number of small documents instead of scanning ``tryon_jobs``.
+    """
+
+    def __init__(self, collection, state_collection):
+        self.collection = collection
+        self.state_collection = state_collection
+
+    def _updates(self, tenant_id: str, status: str, latency_ms: Optional[float], finished_at: datetime) -> List[UpdateOne]:
+        inc: Dict[str, Any] = {"total": 1, status: 1}
+        if status == "completed" and latency_ms is not None:
+            inc["latency_sum_ms"] = latency_ms
+            inc["latency_count"] = 1
+            inc[f"latency_hist.{LatencySketch.bucket_index(latency_ms)}"] = 1
+        return [
+            UpdateOne(
+                {"tenant_id": tenant_id, "granularity": granularity, "bucket": bucket_start(finished_at, granularity)},
+                {"$inc": inc},
+                upsert=True
+            )
+            for granularity in (*GRANULARITIES, ALL_TIME)
+        ]
+
+    async def record(self, tenant_id: str, status: str, latency_ms: Optional[float], finished_at: Optional[datetime] = None):
+        """Fold one finished job (``completed`` or ``failed``) into the rollups"""
+        finished_at = finished_at or datetime.now(timezone.utc)
+        await self.collection.bulk_write(self._updates(tenant_id, status, latency_ms, finished_at), ordered=False)
+
+    async def backfill_done(self) -> bool:
+        marker = await self.state_collection.find_one({"_id": BACKFILL_MARKER_ID}, {"status": 1})
+        return marker is not None and marker.get("status") == "done"
+
+    async def _backfill_cutoff(self) -> datetime:
+        """Jobs finished from here on are (or will be) recorded live: the first minute with rollups, else now"""
+        first = await self.collection.find_one({"granularity": "minute"}, {"bucket": 1}, sort=[("bucket", 1)])
+        return as_utc(first["bucket"]) if first else datetime.now(timezone.utc)
+
+    async def _claim_backfill(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        cutoff = await self._backfill_cutoff()
+        try:
+            return await self.state_collection.find_one_and_update(
+                {
+                    "_id": BACKFILL_MARKER_ID,
+                    "status": {"$ne": "done"},
+                    "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}]
+                },
+                {
+                    "$set": {"status": "running", "owner": owner, "lease_expires_at": now + timedelta(seconds=lease_seconds)},
+                    # A resumed backfill keeps the first run's cutoff and progress
+                    "$setOnInsert": {"cutoff": cutoff, "jobs": 0}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Done already, or another process holds a live lease
+            return None
+
+    async def _save_backfill_progress(self, owner: str, lease_seconds: float, update: Dict[str, Any]):
+        result = await self.state_collection.update_one(
+            {"_id": BACKFILL_MARKER_ID, "owner": owner, "status": "running"},
+            {**update, "$set": {**update.get("$set", {}), "lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}}
+        )
+        if not result.matched_count:
+            raise RuntimeError("Usage rollup backfill lease was taken over")
+
+    async def backfill(self, jobs_collection, batch_size: int = 1000, lease_seconds: float = 300) -> Optional[int]:
+        """Build rollups from jobs that finished before live recording started.
+
+        Runs once per deployment: a marker document in ``state_collection``
+        is leased by one process at a time and only set to ``done`` once the
+        scan completes. Only jobs finished before the marker's cutoff are
+        counted, so jobs completing during the scan are not counted twice,
+        and progress is saved per batch so a run that dies is resumed from
+        its last batch. Returns the jobs counted so far, or None when the
+        backfill is done or running elsewhere.
+        """
+        owner = uuid.uuid4().hex
+        marker = await self._claim_backfill(owner, lease_seconds)
+        if marker is None:
+            return None
+        cutoff = as_utc(marker["cutoff"])
+        query: Dict[str, Any] = {
+            "status": {"$in": ["completed", "failed"]},
+            "$or": [
+                {"completed_at": {"$lt": cutoff}},
+                {"completed_at": None, "created_at": {"$lt": cutoff}}
+            ]
+        }
+        if marker.get("last_id") is not None:
+            query["_id"] = {"$gt": marker["last_id"]}
+        cursor = jobs_collection.find(
+            query,
+            {"_id": 1, "tenant_id": 1, "status": 1, "latency_ms": 1, "completed_at": 1, "created_at": 1}
+        ).sort("_id", 1)
+
+        jobs = marker.get("jobs", 0)
+        ops: List[UpdateOne] = []
+        batch_jobs = 0
+        last_id = None
+
+        async def flush():
+            # The lease is checked before writing, so a batch is never counted by two processes
+            await self._save_backfill_progress(owner, lease_seconds, {})
+            await self.collection.bulk_write(ops, ordered=False)
+            await self._save_backfill_progress(owner, lease_seconds, {"$set": {"last_id": last_id}, "$inc": {"jobs": batch_jobs}})
+
+        async for job in cursor:
+            finished_at = job.get("completed_at") or job.get("created_at") or cutoff
+            ops.extend(self._updates(job["tenant_id"], job["status"], job.get("latency_ms"), finished_at))
+            last_id = job["_id"]
+            batch_jobs += 1
+            if batch_jobs >= batch_size:
+                await flush()
+                jobs += batch_jobs
+                ops, batch_jobs = [], 0
+        if ops:
+            await flush()
+            jobs += batch_jobs
+        await self._save_backfill_progress(owner, lease_seconds, {
+            "$set": {"status": "done", "completed_at": datetime.now(timezone.utc)},
+            "$unset": {"owner": ""}
+        })
+        return jobs
+
+    async def summary(
+        self,
+        tenant_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        granularity: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Aggregate the rollups for a window; no window means all time"""
+        if start is None and end is None:
+            granularity = ALL_TIME
+            query = {"tenant_id": tenant_id, "granularity": ALL_TIME}
+        else:
+            end = as_utc(end) if end else datetime.now(timezone.utc)
+            start = as_utc(start) if start else end - timedelta(days=1)
+            granularity = granularity or pick_granularity(start, end)
+            if (end - start) / GRANULARITIES[granularity] > MAX_QUERY_BUCKETS:
+                raise ValueError(f"Window spans more than {MAX_QUERY_BUCKETS} {granularity} buckets")
+            # Windows are widened to whole buckets of the chosen granularity
+            query = {
+                "tenant_id": tenant_id,
+                "granularity": granularity,
+                "bucket": {"$gte": bucket_start(start, granularity), "$lte": bucket_start(end, granularity)}
+            }
+
+        docs = await self.collection.find(query, {"_id": 0}).to_list(MAX_QUERY_BUCKETS + 2)
+
+        total = sum(doc.get("total", 0) for doc in docs)
+        completed = sum(doc.get("completed", 0) for doc in docs)
+        failed = sum(doc.get("failed", 0) for doc in docs)
+        latency_sum = sum(doc.get("latency_sum_ms", 0) for doc in docs)
+        latency_count = sum(doc.get("latency_count", 0) for doc in docs)
+        histogram = LatencySketch.merge(doc.get("latency_hist") for doc in docs)
+        quantiles = LatencySketch.quantiles(histogram, (0.5, 0.95, 0.99))
+
+        result = {
+            "tenant_id": tenant_id,
+            "total_jobs": total,
+            "completed_jobs": completed,
+            "failed_jobs": failed,
+            "success_rate": (completed / total * 100) if total > 0 else 0,
+            "average_latency_ms": round(latency_sum / latency_count, 2) if latency_count else 0,
+            "p50_latency_ms": quantiles[0.5],
+            "p95_latency_ms": quantiles[0.95],
+            "p99_latency_ms": quantiles[0.99],
+            "granularity": granularity
+        }
+        if granularity != ALL_TIME:
+            window_start = bucket_start(start, granularity)
+            window_end = bucket_start(end, granularity) + GRANULARITIES[granularity]
+            minutes = (window_end - window_start).total_seconds() / 60
+            result["window"] = {"start": window_start.isoformat(), "end": window_end.isoformat()}
+            result["throughput_per_minute"] = round(total / minutes, 4) if minutes > 0 else 0
+        return result
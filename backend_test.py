@@ -104,6 +104,45 @@ class TryOnAPITester:
         
         return success, response
 
+    def test_create_tryon_job_async(self):
+        """Test async try-on job creation returns 202 with a pending job"""
+        data = {
+            "tenant_id": "test_tenant",
+            "person_image": self.create_test_image_base64((100, 150, 200)),
+            "clothing_image": self.create_test_image_base64((200, 100, 50))
+        }
+        
+        success, response = self.run_test(
+            "Create Async Try-On Job",
+            "POST",
+            "tryon/jobs?mode=async",
+            202,
+            data=data
+        )
+        
+        if success and response.get('status') != 'pending':
+            print(f"❌ Expected pending status, got {response.get('status')}")
+            return False, response
+        
+        return success, response
+
+    def test_create_tryon_job_upload(self):
+        """Test try-on job creation from multipart image uploads"""
+        person_bytes = base64.b64decode(self.create_test_image_base64((100, 150, 200)))
+        clothing_bytes = base64.b64decode(self.create_test_image_base64((200, 100, 50)))
+        
+        return self.run_test(
+            "Create Try-On Job (multipart)",
+            "POST",
+            "tryon/jobs/upload",
+            200,
+            files={
+                'person_image': ('person.png', person_bytes, 'image/png'),
+                'clothing_image': ('clothing.png', clothing_bytes, 'image/png'),
+                'tenant_id': ('', 'test_tenant')
+            }
+        )
+
     def test_get_tryon_job(self):
         """Test getting try-on job by ID"""
         if not self.job_id:
@@ -117,6 +156,20 @@ class TryOnAPITester:
             200
         )
 
+    def test_batch_job_status(self):
+        """Test resolving several job statuses in one request"""
+        if not self.job_id:
+            print("❌ No job ID available for testing")
+            return False, {}
+        
+        return self.run_test(
+            "Batch Job Status",
+            "POST",
+            "tryon/jobs/status",
+            200,
+            data={"job_ids": [self.job_id, "missing_job_id"]}
+        )
+
     def test_get_tryon_base64(self):
         """Test getting try-on result as base64"""
         if not self.job_id:
@@ -130,6 +183,19 @@ class TryOnAPITester:
             200
         )
 
+    def test_get_tryon_image(self):
+        """Test streaming the try-on result as raw image bytes"""
+        if not self.job_id:
+            print("❌ No job ID available for testing")
+            return False, {}
+        
+        return self.run_test(
+            "Get Try-On Image",
+            "GET",
+            f"tryon/{self.job_id}/image",
+            200
+        )
+
     def test_import_catalog(self):
         """Test catalog import"""
         catalog_data = {
@@ -205,16 +271,10 @@ class TryOnAPITester:
             "Invalid Try-On Job (should fail)",
             "POST",
             "tryon/jobs",
-            500,  # Expecting error
+            400,  # Rejected before a job is stored
             data=data
         )
         
-        # For this test, failure is success
-        if not success and self.tests_run > 0:
-            self.tests_passed += 1
-            print("✅ Correctly handled invalid data")
-            return True, response
-        
         return success, response
 
 def main():
@@ -231,8 +291,12 @@ def main():
         tester.test_import_catalog,
         tester.test_get_catalog_products,
         tester.test_create_tryon_job,
+        tester.test_create_tryon_job_async,
+        tester.test_create_tryon_job_upload,
         tester.test_get_tryon_job,
+        tester.test_batch_job_status,
         tester.test_get_tryon_base64,
+        tester.test_get_tryon_image,
         tester.test_get_usage_analytics,
         tester.test_invalid_tryon_job
     ]
@@ -0,0 +1,69 @@
+import asyncio
+import base64
+import io
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from PIL import Image
+
+# The backend modules are imported flat, as uvicorn runs them from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The API module running against mongomock and a temporary blob store, as the benchmark runs it"""
+    os.environ.setdefault("IMAGE_EXECUTOR", "thread")
+    import benchmark
+    benchmark.offline_environment(str(tmp_path_factory.mktemp("server")))
+    import server
+    return server
+
+
+@pytest.fixture
+def run_app(server):
+    """Runs ``scenario(client)`` against the started app and returns its result"""
+    def run(scenario):
+        async def main():
+            async with server.app.router.lifespan_context(server.app):
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+                    return await scenario(client)
+        return asyncio.run(main())
+    return run
+
+
+@pytest.fixture
+def session_auth(server, monkeypatch):
+    """Turns session auth on for one test; the app is built with it off"""
+    from session_auth import SessionAuthMiddleware
+    app = server.app
+    # Starlette builds the stack on the first request; build it now so it can be patched first
+    if app.middleware_stack is None:
+        app.middleware_stack = app.build_middleware_stack()
+    node = app.middleware_stack
+    while not isinstance(node, SessionAuthMiddleware):
+        node = node.app
+    monkeypatch.setattr(node, "enabled", True)
+
+
+def image_base64(color: str) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (48, 64), color).save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def job_request():
+    """Builds a try-on job body with small valid images"""
+    def build(tenant_id: str, **options):
+        return {
+            "tenant_id": tenant_id,
+            "person_image": image_base64("red"),
+            "clothing_image": image_base64("blue"),
+            "options": {"format": "png", **options}
+        }
+    return build
@@ -0,0 +1,80 @@
+from rate_limits import TokenBucketLimiter
+
+
+def test_invalid_options_do_not_spend_rate_limit_tokens(server, run_app, job_request, monkeypatch):
+    monkeypatch.setattr(server, "tenant_rate_limiter", TokenBucketLimiter("tenant", rate=0.001, burst=1))
+
+    async def scenario(client):
+        invalid = [
+            (await client.post("/api/tryon/jobs?mode=async", json=job_request("limited", format="bmp"))).status_code
+            for _ in range(3)
+        ]
+        accepted = await client.post("/api/tryon/jobs?mode=async", json=job_request("limited"))
+        limited = await client.post("/api/tryon/jobs?mode=async", json=job_request("limited"))
+        other_tenant = await client.post("/api/tryon/jobs?mode=async", json=job_request("unlimited"))
+        return invalid, accepted.status_code, limited, other_tenant.status_code
+
+    invalid, accepted, limited, other_tenant = run_app(scenario)
+    assert invalid == [400, 400, 400]
+    assert accepted == 202
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) >= 1
+    assert other_tenant == 202
+
+
+def test_rate_limits_are_off_by_default(server, run_app, job_request):
+    assert not server.tenant_rate_limiter.enabled
+    assert not server.session_rate_limiter.enabled
+
+    async def scenario(client):
+        return [
+            (await client.post("/api/tryon/jobs?mode=async", json=job_request("demo_tenant"))).status_code
+            for _ in range(30)
+        ]
+
+    assert run_app(scenario) == [202] * 30
+
+
+def test_full_or_stopped_pool_rejects_with_retry_after(server, run_app, job_request, monkeypatch):
+    async def scenario(client):
+        monkeypatch.setattr(server.worker_pool, "max_queue", 0)
+        full = await client.post("/api/tryon/jobs?mode=async", json=job_request("busy"))
+        monkeypatch.undo()
+        monkeypatch.setattr(server.worker_pool, "_accepting", False)
+        stopped = await client.post("/api/tryon/jobs?mode=async", json=job_request("busy"))
+        monkeypatch.undo()
+        return full, stopped
+
+    full, stopped = run_app(scenario)
+    assert full.status_code == 429
+    assert stopped.status_code == 503
+    assert full.headers["Retry-After"] == stopped.headers["Retry-After"] == str(server.TRYON_RETRY_AFTER_SECONDS)
+
+
+def test_session_callers_are_scheduled_and_limited_as_their_own_tenant(server, run_app, job_request, session_auth, monkeypatch):
+    limiter = TokenBucketLimiter("tenant", rate=0.001, burst=1)
+    monkeypatch.setattr(server, "tenant_rate_limiter", limiter)
+    submitted = []
+    submit = server.worker_pool.submit
+
+    def recording_submit(job_id, handler, tenant_id="default", weight=1.0, on_dequeue=None):
+        submitted.append((tenant_id, weight))
+        return submit(job_id, handler, tenant_id=tenant_id, weight=weight, on_dequeue=on_dequeue)
+
+    monkeypatch.setattr(server.worker_pool, "submit", recording_submit)
+
+    async def scenario(client):
+        await client.post("/api/tenants", json={"client_id": "gold", "plan_tier": "enterprise"})
+        token = (await client.post("/api/auth/session", json={"client_id": "tin"})).json()["session_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        claimed = await client.post("/api/tryon/jobs?mode=async", json=job_request("gold"), headers=headers)
+        own = job_request("gold")
+        del own["tenant_id"]
+        accepted = await client.post("/api/tryon/jobs?mode=async", json=own, headers=headers)
+        limited = await client.post("/api/tryon/jobs?mode=async", json=own, headers=headers)
+        return claimed.status_code, accepted.status_code, limited.status_code
+
+    claimed, accepted, limited = run_app(scenario)
+    assert (claimed, accepted, limited) == (403, 202, 429)
+    # Only the basic session tenant was queued and charged; the enterprise bucket is untouched
+    assert submitted == [("tin", 1.0)]
+    assert set(limiter.buckets) == {"tin"}
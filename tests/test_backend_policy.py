@@ -0,0 +1,110 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from tryon_backends import BackendError, BackendPolicy, RetryableBackendError
+
+
+class Outcomes(Counter):
+    """Stands in for the telemetry counter the policy reports to"""
+
+    def inc(self, outcome):
+        self[outcome] += 1
+
+
+def test_timeouts_are_retried_with_full_jitter_backoff(monkeypatch):
+    bounds = []
+    monkeypatch.setattr("tryon_backends.random.uniform", lambda low, high: bounds.append((low, high)) or 0)
+    outcomes = Outcomes()
+    policy = BackendPolicy(timeout=0.01, retries=3, backoff=0.2, max_backoff=0.5, outcomes=outcomes)
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1)
+
+    with pytest.raises(RetryableBackendError):
+        asyncio.run(policy.call("t", slow))
+    assert calls == 4
+    # Each delay is drawn from zero up to the capped exponential backoff
+    assert bounds == [(0, 0.2), (0, 0.4), (0, 0.5)]
+    assert (outcomes["timeout"], outcomes["retry"]) == (4, 3)
+
+
+def test_only_retryable_errors_are_retried():
+    outcomes = Outcomes()
+    policy = BackendPolicy(retries=2, backoff=0, outcomes=outcomes)
+    attempts = []
+
+    async def flaky():
+        attempts.append("flaky")
+        if len(attempts) < 2:
+            raise RetryableBackendError("503 from backend")
+        return "rendered"
+
+    async def broken():
+        attempts.append("broken")
+        raise BackendError("bad input")
+
+    async def scenario():
+        result = await policy.call("t", flaky)
+        with pytest.raises(BackendError):
+            await policy.call("t", broken)
+        return result
+
+    assert asyncio.run(scenario()) == "rendered"
+    assert attempts == ["flaky", "flaky", "broken"]
+    assert (outcomes["retryable_error"], outcomes["ok"], outcomes["error"], outcomes["retry"]) == (1, 1, 1, 1)
+
+
+@pytest.mark.parametrize("max_concurrency,expected", [(2, ("hedge", True)), (1, ("primary", False))])
+def test_slow_attempts_are_hedged_when_a_slot_is_free(max_concurrency, expected):
+    outcomes = Outcomes()
+    policy = BackendPolicy(max_concurrency=max_concurrency, hedge_after=0.02, retries=0, outcomes=outcomes)
+    attempts = 0
+
+    async def first_attempt_is_slow():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            await asyncio.sleep(0.2)
+            return "primary"
+        return "hedge"
+
+    result = asyncio.run(policy.call("t", first_attempt_is_slow))
+    assert (result, outcomes["hedge_won"] == 1) == expected
+    # Without a free global slot the hedge never starts
+    assert outcomes["hedge"] == (1 if expected[1] else 0)
+
+
+def test_tenant_cap_leaves_room_for_other_tenants():
+    policy = BackendPolicy(max_concurrency=8, tenant_concurrency=2)
+    running = Counter()
+    peaks = Counter()
+    release = asyncio.Event()
+
+    def call(tenant_id):
+        async def work():
+            running[tenant_id] += 1
+            peaks[tenant_id] = max(peaks[tenant_id], running[tenant_id])
+            await release.wait()
+            running[tenant_id] -= 1
+        return policy.call(tenant_id, work)
+
+    async def scenario():
+        busy = [asyncio.ensure_future(call("busy")) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        # The busy tenant holds its two slots; another tenant still gets in at once
+        other = asyncio.ensure_future(call("other"))
+        await asyncio.sleep(0.01)
+        in_flight = policy.in_flight
+        release.set()
+        await asyncio.gather(*busy, other)
+        return in_flight, dict(policy.tenants._tenants)
+
+    in_flight, tenants_left = asyncio.run(scenario())
+    assert peaks == {"busy": 2, "other": 1}
+    assert in_flight == 3
+    assert tenants_left == {}
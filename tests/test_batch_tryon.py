@@ -0,0 +1,73 @@
+import base64
+import json
+
+NOT_AN_IMAGE = base64.b64encode(b"not an image").decode()
+
+
+def ndjson_lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_batch_streams_one_result_per_item_and_a_summary(server, run_app, job_request):
+    body = job_request("batch")
+
+    async def scenario(client):
+        response = await client.post("/api/tryon/batch", json={
+            "tenant_id": "batch",
+            "person_image": body["person_image"],
+            "items": [
+                {"clothing_image": body["clothing_image"]},
+                {"product_id": "missing-product", "variant_id": "v1"},
+                {"clothing_image": NOT_AN_IMAGE},
+                {"clothing_image": job_request("batch")["person_image"]},
+            ]
+        })
+        lines = ndjson_lines(response)
+        stored = await server.db.tryon_jobs.count_documents({"batch_id": lines[0]["batch_id"]})
+        return response, lines, stored
+
+    response, lines, stored = run_app(scenario)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    started, results, finished = lines[0], lines[1:-1], lines[-1]
+    assert started["event"] == "started" and started["items"] == 4
+    assert finished == {**finished, "event": "finished", "batch_id": started["batch_id"], "items": 4, "completed": 2, "failed": 2}
+    by_index = {line["index"]: line for line in results}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert [by_index[i]["status"] for i in range(4)] == ["completed", "failed", "failed", "completed"]
+    assert by_index[1]["product_id"] == "missing-product"
+    assert "No garment image" in by_index[1]["error_message"]
+    assert by_index[0]["result_url"] and by_index[0]["result_renditions"]
+    # Every item is a stored job of the batch, failures included
+    assert stored == 4
+
+
+def test_batch_is_admitted_or_rejected_as_a_whole(server, run_app, job_request, monkeypatch):
+    body = job_request("batch-full")
+    monkeypatch.setattr(server.worker_pool, "max_queue", 2)
+
+    async def scenario(client):
+        before = await server.db.tryon_jobs.count_documents({})
+        response = await client.post("/api/tryon/batch", json={
+            "tenant_id": "batch-full",
+            "person_image": body["person_image"],
+            "items": [{"clothing_image": body["clothing_image"]}] * 3
+        })
+        return response, await server.db.tryon_jobs.count_documents({}) - before
+
+    response, stored = run_app(scenario)
+    assert response.status_code == 429
+    assert stored == 0
+
+
+def test_batch_rejects_a_bad_person_image_before_streaming(server, run_app, job_request):
+    async def scenario(client):
+        return await client.post("/api/tryon/batch", json={
+            "tenant_id": "batch",
+            "person_image": NOT_AN_IMAGE,
+            "items": [{"clothing_image": job_request("batch")["clothing_image"]}]
+        })
+
+    response = run_app(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid person image")
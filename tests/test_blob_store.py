@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import hashlib
+import io
+
+import pytest
+
+from blob_store import BlobNotFoundError, LocalBlobStore, S3BlobStore, create_blob_store
+
+
+class MissingKey(Exception):
+    def __init__(self, code="NoSuchKey"):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """The four boto3 S3 calls the store makes, against a dict"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingKey()
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingKey("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def s3_store(tmp_path):
+    store = S3BlobStore.__new__(S3BlobStore)
+    store.bucket = "results"
+    store.client = FakeS3Client()
+    return store
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return create_blob_store("local", root=str(tmp_path / "blobs"))
+    return s3_store(tmp_path)
+
+
+def test_blob_round_trip_in_chunks(store):
+    data = bytes(range(256)) * 40
+
+    async def scenario():
+        info = await store.put("results/ab/abc.png", data, "image/png")
+        chunks = [chunk async for chunk in store.stream(info.key, chunk_size=1000)]
+        return info, chunks, await store.exists(info.key), await store.delete(info.key), await store.exists(info.key), await store.delete(info.key)
+
+    info, chunks, existed, reclaimed, exists_after, reclaimed_again = asyncio.run(scenario())
+    assert (info.size, info.sha256, info.content_type) == (len(data), hashlib.sha256(data).hexdigest(), "image/png")
+    assert [len(chunk) for chunk in chunks] == [1000] * 10 + [240]
+    assert b"".join(chunks) == data
+    assert (existed, reclaimed, exists_after, reclaimed_again) == (True, len(data), False, 0)
+
+
+def test_missing_blob_raises_on_first_chunk(store):
+    async def scenario():
+        with pytest.raises(BlobNotFoundError):
+            await store.stream("results/missing.png").__anext__()
+        with pytest.raises(BlobNotFoundError):
+            await store.read("results/missing.png")
+
+    asyncio.run(scenario())
+
+
+def test_local_store_rejects_keys_outside_its_root(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    with pytest.raises(ValueError):
+        asyncio.run(store.put("../escape.png", b"x", "image/png"))
+
+
+def test_unknown_blob_store_kind():
+    with pytest.raises(ValueError):
+        create_blob_store("ftp")
+
+
+def test_result_image_is_streamed_from_the_blob_store(server, run_app, job_request, monkeypatch):
+    monkeypatch.setattr(server, "BLOB_CHUNK_SIZE", 1024)
+
+    async def scenario(client):
+        job = (await client.post("/api/tryon/jobs?mode=sync", json=job_request("blobs"))).json()
+        stored = await server.db.tryon_jobs.find_one({"id": job["job_id"]})
+        full = await client.get(job["result_url"])
+        thumb = await client.get(job["result_renditions"]["thumb"]["url"])
+        as_base64 = await client.get(f"/api/tryon/{job['job_id']}/base64")
+        await server.blob_store.delete(stored["result_renditions"]["thumb"]["key"])
+        missing = await client.get(job["result_renditions"]["thumb"]["url"])
+        return job, stored, full, thumb, as_base64, missing
+
+    job, stored, full, thumb, as_base64, missing = run_app(scenario)
+    # Results live in the blob store; the job document only points at them
+    assert "result_base64" not in stored
+    assert full.status_code == 200 and full.headers["content-type"] == "image/png"
+    assert full.content == base64.b64decode(job["result_base64"])
+    assert full.headers["content-length"] == str(len(full.content)) == str(stored["result_size_bytes"])
+    assert full.headers["etag"] == f'"{stored["result_sha256"]}"'
+    assert thumb.status_code == 200 and len(thumb.content) == job["result_renditions"]["thumb"]["size_bytes"]
+    assert as_base64.json()["image_data"] == f"data:image/png;base64,{job['result_base64']}"
+    assert missing.status_code == 404
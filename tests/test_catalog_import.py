@@ -0,0 +1,49 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from catalog_import import GUNZIP_STEP_BYTES, CatalogLineError, CatalogTooLargeError, iter_ndjson
+
+
+async def body(data: bytes, chunk_size: int = 1000):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
+
+
+def parse(data: bytes, **kwargs):
+    async def collect():
+        return [item async for item in iter_ndjson(body(data), **kwargs)]
+    return asyncio.run(collect())
+
+
+NDJSON = b"".join(json.dumps({"productId": f"p{i}"}).encode() + b"\n" for i in range(500)) + b"[1]\n\n{\"productId\": \"last\"}"
+
+
+@pytest.mark.parametrize("data", [NDJSON, gzip.compress(NDJSON)])
+def test_iter_ndjson_plain_and_gzipped(data):
+    items = parse(data, max_line_bytes=1024)
+    assert len(items) == 502
+    assert items[0] == {"productId": "p0"}
+    assert items[-2] is None
+    assert items[-1] == {"productId": "last"}
+
+
+def test_gzip_inflates_in_bounded_steps():
+    # A few KB of gzip that inflates to many steps' worth of short lines
+    lines = b"{}\n" * (GUNZIP_STEP_BYTES * 4 // 3)
+    items = parse(gzip.compress(lines), max_line_bytes=16)
+    assert len(items) == GUNZIP_STEP_BYTES * 4 // 3
+
+
+def test_gzip_bomb_is_cut_off():
+    bomb = gzip.compress(b"\n" * (64 * 1024 * 1024))
+    assert len(bomb) < 128 * 1024
+    with pytest.raises(CatalogTooLargeError):
+        parse(bomb, max_line_bytes=1024, max_total_bytes=1024 * 1024)
+
+
+def test_long_line_is_rejected():
+    with pytest.raises(CatalogLineError):
+        parse(gzip.compress(b"x" * 10000), max_line_bytes=1024)
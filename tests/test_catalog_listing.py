@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+from indexes import INDEXES, ensure_indexes
+
+
+def products_ndjson(tenant_id: str, count: int) -> bytes:
+    # Imported out of order; listing sorts by product_id
+    return b"\n".join(
+        json.dumps({"productId": f"{tenant_id}-{i:03d}", "title": f"Product {i}", "variants": []}).encode()
+        for i in reversed(range(count))
+    )
+
+
+def test_keyset_pages_cover_the_catalog_once_in_order(server, run_app):
+    async def scenario(client):
+        await client.post("/api/catalog/import/ndjson?tenant_id=paged", content=products_ndjson("paged", 25))
+        await client.post("/api/catalog/import/ndjson?tenant_id=neighbour", content=products_ndjson("neighbour", 3))
+        pages, cursor = [], None
+        while True:
+            params = {"tenant_id": "paged", "limit": 10, "fields": "title"}
+            if cursor:
+                params["cursor"] = cursor
+            page = (await client.get("/api/catalog/products", params=params)).json()
+            pages.append(page["products"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return pages
+
+    pages = run_app(scenario)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [product["product_id"] for page in pages for product in page]
+    assert ids == [f"paged-{i:03d}" for i in range(25)]
+    # Only the requested fields, plus the product_id cursors are built from
+    assert set(pages[0][0]) == {"product_id", "title"}
+
+
+@pytest.mark.parametrize("params,detail", [
+    ({"cursor": "not-a-cursor"}, "Invalid cursor"),
+    ({"fields": "title,price"}, "Unknown fields: price"),
+])
+def test_bad_listing_parameters_are_rejected(server, run_app, params, detail):
+    async def scenario(client):
+        return await client.get("/api/catalog/products", params={"tenant_id": "paged", **params})
+
+    response = run_app(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
+
+
+def test_ensure_indexes_creates_every_declared_index():
+    async def scenario():
+        db = AsyncMongoMockClient()["indexes"]
+        created = await ensure_indexes(db)
+        # Idempotent: a second start-up changes nothing
+        await ensure_indexes(db)
+        return created, {name: await db[name].index_information() for name in INDEXES}
+
+    created, existing = asyncio.run(scenario())
+    assert set(created) == set(INDEXES)
+    for name, models in INDEXES.items():
+        assert {model.document["name"] for model in models} <= set(existing[name])
+
+
+def test_ensure_indexes_logs_data_errors_and_raises_connection_errors():
+    class Collection:
+        def __init__(self, error):
+            self.error = error
+
+        async def create_indexes(self, models):
+            if self.error:
+                raise self.error
+            return [model.document["name"] for model in models]
+
+    class Database(dict):
+        def __missing__(self, name):
+            return Collection(None)
+
+    async def scenario():
+        # A unique index blocked by duplicates leaves the rest to be created
+        partial = await ensure_indexes(Database(product_catalog=Collection(ValueError("duplicate key"))))
+        with pytest.raises(ServerSelectionTimeoutError):
+            await ensure_indexes(Database(product_catalog=Collection(ServerSelectionTimeoutError("mongo is down"))))
+        return partial
+
+    partial = asyncio.run(scenario())
+    assert set(partial) == set(INDEXES) - {"product_catalog"}
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from garments import GarmentSourceError, GarmentSources, url_origin
+
+
+def test_url_origin():
+    assert url_origin("http://LocalHost/a.png") == ("http", "localhost", 80)
+    assert url_origin("https://cdn.example.com:8443/a.png") == ("https", "cdn.example.com", 8443)
+    assert url_origin("ftp://localhost/a.png") is None
+    assert url_origin("http://localhost:notaport/a.png") is None
+    assert url_origin("http:///a.png") is None
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost.attacker.com/a.png",
+    "http://localhost@attacker.com/a.png",
+    "http://127.0.0.1.nip.io/a.png",
+    "https://localhost/a.png",
+    "http://localhost:9000/a.png",
+    "http://attacker.com/?http://localhost",
+])
+def test_fetch_rejects_urls_off_the_allowed_origins(url):
+    sources = GarmentSources(None, ("http://localhost", "http://127.0.0.1:8001"))
+    with pytest.raises(GarmentSourceError, match="not allowed"):
+        asyncio.run(sources.load({"image": url}))
+
+
+def test_no_urls_are_fetched_unless_origins_are_configured():
+    # GARMENT_SOURCE_URL_ORIGINS defaults to empty
+    sources = GarmentSources(None, ("",))
+    assert not sources.allowed_origins
+    with pytest.raises(GarmentSourceError, match="not allowed"):
+        asyncio.run(sources.load({"image": "http://127.0.0.1/a.png"}))
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost/a.png",
+    "http://localhost:80/a.png",
+    "http://127.0.0.1:8001/garments/a.png",
+])
+def test_fetch_allows_exact_origins(url):
+    sources = GarmentSources(None, ("http://localhost", "http://127.0.0.1:8001", "not a url", ""))
+    fetched = []
+
+    async def fake_get(requested):
+        fetched.append(requested)
+        raise GarmentSourceError("stopped before the network")
+
+    sources._client = type("Client", (), {"get": staticmethod(fake_get)})()
+    with pytest.raises(GarmentSourceError, match="stopped"):
+        asyncio.run(sources.load({"image": url}))
+    assert fetched == [url]
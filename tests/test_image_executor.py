@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+from image_executor import ImageExecutor
+
+
+def test_a_cancelled_caller_keeps_its_slot_until_the_work_finishes():
+    async def scenario():
+        executor = ImageExecutor("thread", workers=1, queue_depth=1)
+        release = threading.Event()
+        try:
+            with_timeout = asyncio.ensure_future(asyncio.wait_for(executor.run(release.wait, 5), timeout=0.05))
+            try:
+                await with_timeout
+            except asyncio.TimeoutError:
+                pass
+            # The timed-out work is still running on the pool, so a retry has to wait for it
+            retry = asyncio.ensure_future(executor.run(lambda: "retried"))
+            await asyncio.sleep(0.05)
+            held = (executor.in_flight, executor.waiting, retry.done())
+            release.set()
+            return held, await asyncio.wait_for(retry, timeout=5), (executor.in_flight, executor.waiting)
+        finally:
+            release.set()
+            executor.shutdown()
+
+    held, result, after = asyncio.run(scenario())
+    assert held == (1, 1, False)
+    assert result == "retried"
+    assert after == (0, 0)
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+from PIL import Image
+
+from imaging import normalize_input, prepare_input
+
+
+@pytest.mark.parametrize("mode", ["P", "1", "I;16", "L", "LA", "RGBA", "CMYK"])
+def test_normalize_input_downscales_every_mode(mode):
+    img = Image.new(mode, (3000, 2000))
+    out = normalize_input(img, None, 1024)
+    assert out.mode == "RGB"
+    assert max(out.size) == 1024
+
+
+def test_normalize_input_rotates_after_downscaling():
+    out = normalize_input(Image.new("P", (3000, 2000)), 6, 1024)
+    assert out.size == (683, 1024)
+
+
+def test_normalize_input_composites_palette_transparency_on_white():
+    img = Image.new("P", (2500, 2500))
+    img.info["transparency"] = 0
+    out = normalize_input(img, None, 1000)
+    assert out.getpixel((10, 10)) == (255, 255, 255)
+
+
+def test_prepare_input_accepts_large_palette_png():
+    buffer = io.BytesIO()
+    Image.new("P", (2400, 1600)).save(buffer, format="PNG")
+    img, timings = prepare_input(buffer.getvalue(), 1024)
+    assert img.mode == "RGB" and max(img.size) == 1024
+    assert set(timings) == {"decode", "preprocessing"}
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from job_events import JobEventHub, job_topic
+
+
+def sse_events(text: str) -> list:
+    events = []
+    for block in text.split("\n\n"):
+        data = [line[len("data: "):] for line in block.splitlines() if line.startswith("data: ")]
+        if data:
+            events.append(json.loads(data[0]))
+    return events
+
+
+def test_slow_subscribers_lose_the_oldest_events_but_keep_the_last():
+    async def scenario():
+        hub = JobEventHub(max_pending=2)
+        subscription = hub.subscribe(job_topic("j"))
+        for status in ("pending", "processing", "completed"):
+            hub.publish("j", "t", {"type": "status", "status": status})
+        received = [await subscription.get(0.01), await subscription.get(0.01), await subscription.get(0.01)]
+        subscription.close()
+        return received, subscription.dropped, hub.subscriber_count, hub.latest("j")["status"]
+
+    received, dropped, subscribers, latest = asyncio.run(scenario())
+    assert [event["status"] for event in received[:2]] == ["processing", "completed"]
+    assert received[2] is None
+    assert (dropped, subscribers, latest) == (1, 0, "completed")
+
+
+def test_job_stream_pushes_progress_and_ends_after_the_final_status(server, run_app, job_request, monkeypatch):
+    release = {}
+    generate = server.generate_tryon_image
+
+    async def held_generate(*args):
+        await release["event"].wait()
+        return await generate(*args)
+
+    monkeypatch.setattr(server, "generate_tryon_image", held_generate)
+
+    async def scenario(client):
+        release["event"] = asyncio.Event()
+        job_id = (await client.post("/api/tryon/jobs?mode=async", json=job_request("events"))).json()["job_id"]
+        stream = asyncio.create_task(client.get(f"/api/tryon/jobs/{job_id}/events"))
+        await asyncio.sleep(0.05)
+        release["event"].set()
+        response = await stream
+        missing = await client.get("/api/tryon/jobs/no-such-job/events")
+        return job_id, response, missing
+
+    job_id, response, missing = run_app(scenario)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[0]["type"] == "status" and events[0]["status"] in ("pending", "processing")
+    assert {"stage"} <= {event["type"] for event in events[1:-1]}
+    final = events[-1]
+    assert (final["type"], final["status"], final["job_id"]) == ("status", "completed", job_id)
+    assert final["result_url"] == f"/api/tryon/{job_id}/image" and "thumb" in final["result_renditions"]
+    assert [event["seq"] for event in events] == sorted(event["seq"] for event in events)
+    assert missing.status_code == 404
+
+
+def test_job_stream_ends_when_a_queue_worker_finishes_elsewhere(server, run_app, monkeypatch):
+    monkeypatch.setattr(server, "TRYON_EXECUTION", "queue")
+    monkeypatch.setattr(server, "JOB_EVENTS_KEEPALIVE_SECONDS", 0.05)
+    job_id = str(uuid.uuid4())
+
+    async def scenario(client):
+        await server.db.tryon_jobs.insert_one({"id": job_id, "tenant_id": "events", "status": "processing", "created_at": datetime.now(timezone.utc)})
+        stream = asyncio.create_task(client.get(f"/api/tryon/jobs/{job_id}/events"))
+        await asyncio.sleep(0.1)
+        # Another process's worker publishes nothing here; only the stored outcome changes
+        await server.db.tryon_jobs.update_one({"id": job_id}, {"$set": {"status": "failed", "error_message": "boom"}})
+        return await asyncio.wait_for(stream, 5)
+
+    events = sse_events(run_app(scenario).text)
+    assert events[0]["status"] == "processing"
+    assert (events[-1]["status"], events[-1]["error_message"]) == ("failed", "boom")
+
+
+def test_websockets_carry_job_and_tenant_events(server, job_request):
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/api/tryon/ws?tenant_id=ws-events") as tenant_socket:
+            job_id = client.post("/api/tryon/jobs?mode=sync", json=job_request("ws-events")).json()["job_id"]
+            tenant_events = []
+            while not (tenant_events and tenant_events[-1].get("status") == "completed"):
+                tenant_events.append(tenant_socket.receive_json())
+        with client.websocket_connect(f"/api/tryon/jobs/{job_id}/ws") as job_socket:
+            # The job already finished, so the snapshot is its final status and the socket closes
+            final = job_socket.receive_json()
+            closed = job_socket.receive()
+        # Closed before the handshake is accepted
+        with pytest.raises(WebSocketDisconnect) as refused:
+            with client.websocket_connect("/api/tryon/jobs/no-such-job/ws"):
+                pass
+
+    assert {event["job_id"] for event in tenant_events} == {job_id}
+    assert [event["status"] for event in tenant_events if event["type"] == "status"] == ["pending", "processing", "completed"]
+    assert (final["status"], final["job_id"]) == ("completed", job_id)
+    assert closed["type"] == "websocket.close"
+    assert refused.value.code == 1008
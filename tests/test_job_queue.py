@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from job_queue import PoolUnavailableError, QueueFullError, TryOnWorkerPool
+
+
+def test_weighted_fair_dispatch_order():
+    async def scenario():
+        pool = TryOnWorkerPool(workers=1, max_queue=32)
+        await pool.start()
+        order = []
+        blocker = asyncio.Event()
+
+        async def block():
+            await blocker.wait()
+
+        def job(name):
+            async def run():
+                order.append(name)
+            return run
+
+        # Hold the only worker so everything below queues up before dispatch starts
+        first = pool.submit("blocker", block, tenant_id="warmup")
+        await asyncio.sleep(0)
+        futures = [pool.submit(f"flood-{i}", job(f"flood-{i}"), tenant_id="flood", weight=1.0) for i in range(4)]
+        futures += [pool.submit(f"gold-{i}", job(f"gold-{i}"), tenant_id="gold", weight=3.0) for i in range(3)]
+        blocker.set()
+        await asyncio.gather(first, *futures)
+        await pool.stop()
+        return order
+
+    order = asyncio.run(scenario())
+    # A weight-3 tenant arriving later still gets three dispatches per flood dispatch
+    assert order[:4] == ["gold-0", "gold-1", "gold-2", "flood-0"]
+    assert order[4:] == ["flood-1", "flood-2", "flood-3"]
+
+
+def test_capacity_checks_overall_and_per_tenant():
+    async def scenario():
+        pool = TryOnWorkerPool(workers=1, max_queue=3, retry_after=9, max_tenant_queue=2)
+        with pytest.raises(PoolUnavailableError):
+            pool.check_capacity()
+        await pool.start()
+        blocker = asyncio.Event()
+
+        async def block():
+            await blocker.wait()
+
+        futures = [pool.submit("running", block, tenant_id="a")]
+        await asyncio.sleep(0)
+        futures += [pool.submit(f"a-{i}", block, tenant_id="a") for i in range(2)]
+        with pytest.raises(QueueFullError) as tenant_full:
+            pool.submit("a-2", block, tenant_id="a")
+        pool.check_capacity(1, tenant_id="b")
+        with pytest.raises(QueueFullError):
+            pool.check_capacity(2, tenant_id="b")
+        futures.append(pool.submit("b-0", block, tenant_id="b"))
+        assert pool.depth == 3
+        with pytest.raises(QueueFullError):
+            pool.check_capacity(1, tenant_id="c")
+        blocker.set()
+        await asyncio.gather(*futures)
+        await pool.stop()
+        with pytest.raises(PoolUnavailableError):
+            pool.check_capacity()
+        return tenant_full.value.retry_after
+
+    assert asyncio.run(scenario()) == 9
+
+
+def test_stop_releases_jobs_left_after_the_drain_timeout():
+    async def scenario():
+        pool = TryOnWorkerPool(workers=1, max_queue=8)
+        await pool.start()
+        never = asyncio.Event()
+
+        async def block():
+            await never.wait()
+
+        futures = [pool.submit("running", block, tenant_id="a")]
+        await asyncio.sleep(0)
+        futures += [pool.submit(f"queued-{i}", block, tenant_id="a") for i in range(2)]
+        abandoned = await pool.stop(drain_timeout=0.05)
+        results = await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True), timeout=1)
+        return abandoned, results, pool
+
+    abandoned, results, pool = asyncio.run(scenario())
+    assert sorted(abandoned) == ["queued-0", "queued-1", "running"]
+    assert all(isinstance(result, PoolUnavailableError) for result in results)
+    assert pool.depth == 0 and pool.tenant_depth("a") == 0
+
+
+def test_jobs_dropped_at_shutdown_are_marked_failed(server, run_app):
+    async def scenario(client):
+        await server.db.tryon_jobs.insert_many([
+            {"id": "dropped-queued", "tenant_id": "shutdown", "status": "pending"},
+            {"id": "dropped-running", "tenant_id": "shutdown", "status": "processing"},
+            {"id": "dropped-done", "tenant_id": "shutdown", "status": "completed"},
+        ])
+        await server.fail_abandoned_jobs(["dropped-queued", "dropped-running", "dropped-done"])
+        return {
+            job["id"]: job async for job in server.db.tryon_jobs.find({"tenant_id": "shutdown"}, {"_id": 0})
+        }
+
+    jobs = run_app(scenario)
+    for job_id in ("dropped-queued", "dropped-running"):
+        assert jobs[job_id]["status"] == "failed"
+        assert jobs[job_id]["error_message"] and jobs[job_id]["completed_at"]
+    assert jobs["dropped-done"]["status"] == "completed"
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from lease_queue import JobLeaseQueue, QueueBacklog, QueueBacklogError, held_lease_query
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def queued_job(job_id: str, priority: int = 2, minutes: int = 0, tenant_id: str = "tenant"):
+    return {
+        "id": job_id,
+        "tenant_id": tenant_id,
+        "status": "pending",
+        "priority": priority,
+        "created_at": T0 + timedelta(minutes=minutes),
+        "inputs": {"person": {"key": f"inputs/{job_id}/person"}}
+    }
+
+
+async def expire_leases(collection):
+    await collection.update_many({"status": "processing"}, {"$set": {"lease_expires_at": T0}})
+
+
+def jobs_collection():
+    return AsyncMongoMockClient()["test"].tryon_jobs
+
+
+def test_claim_by_priority_then_age_and_only_once():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_many([
+            queued_job("basic-old", 2, 0),
+            queued_job("enterprise", 0, 5),
+            queued_job("basic-new", 2, 1),
+            # Batch jobs are inserted before their inputs are stored
+            {"id": "no-inputs", "tenant_id": "tenant", "status": "pending", "priority": 0, "created_at": T0},
+        ])
+        first = await JobLeaseQueue(jobs, "a").claim(2)
+        second = await JobLeaseQueue(jobs, "b").claim(5)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert [job["id"] for job in first] == ["enterprise", "basic-old"]
+    assert [job["id"] for job in second] == ["basic-new"]
+    assert all(job["status"] == "processing" and job["attempts"] == 1 for job in first + second)
+    assert {job["lease_owner"] for job in first} == {"a"}
+    assert "_id" not in first[0]
+
+
+def test_heartbeat_and_release_only_touch_own_leases():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_many([queued_job("a-job"), queued_job("b-job", minutes=1)])
+        a, b = JobLeaseQueue(jobs, "a"), JobLeaseQueue(jobs, "b")
+        await a.claim(1)
+        await b.claim(1)
+        renewed = await a.heartbeat(["a-job", "b-job"])
+        released = await a.release(["a-job", "b-job"])
+        return renewed, released, await jobs.find_one({"id": "a-job"}), await jobs.find_one({"id": "b-job"})
+
+    renewed, released, a_job, b_job = asyncio.run(scenario())
+    assert (renewed, released) == (1, 1)
+    assert a_job["status"] == "pending" and a_job["attempts"] == 0 and "lease_owner" not in a_job
+    assert b_job["status"] == "processing" and b_job["lease_owner"] == "b"
+
+
+def test_reap_requeues_then_fails_after_max_attempts():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_one(queued_job("flaky"))
+        queue = JobLeaseQueue(jobs, "a", max_attempts=2)
+        rounds = []
+        for _ in range(2):
+            await queue.claim(1)
+            await expire_leases(jobs)
+            rounds.append(await queue.reap())
+        return rounds, await jobs.find_one({"id": "flaky"})
+
+    (first, second), stored = asyncio.run(scenario())
+    assert first == (["flaky"], [])
+    requeued, failed = second
+    assert requeued == [] and [job["id"] for job in failed] == ["flaky"]
+    assert stored["status"] == "failed" and "lost the job 2 times" in stored["error_message"]
+
+
+def test_reap_leaves_live_leases_alone():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_one(queued_job("running"))
+        queue = JobLeaseQueue(jobs, "a")
+        await queue.claim(1)
+        return await queue.reap()
+
+    assert asyncio.run(scenario()) == ([], [])
+
+
+def test_stale_owner_cannot_write_a_reclaimed_job():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_one(queued_job("job"))
+        await JobLeaseQueue(jobs, "stale").claim(1)
+        await expire_leases(jobs)
+        await JobLeaseQueue(jobs, "reaper").reap()
+        await JobLeaseQueue(jobs, "fresh").claim(1)
+        stale = await jobs.update_one(held_lease_query("job", "stale"), {"$set": {"status": "completed", "by": "stale"}})
+        fresh = await jobs.update_one(held_lease_query("job", "fresh"), {"$set": {"status": "completed", "by": "fresh"}})
+        return stale.matched_count, fresh.matched_count, await jobs.find_one({"id": "job"})
+
+    stale, fresh, stored = asyncio.run(scenario())
+    assert (stale, fresh) == (0, 1)
+    assert stored["by"] == "fresh" and stored["attempts"] == 2
+
+
+def test_backlog_limits_pending_jobs_overall_and_per_tenant():
+    async def scenario():
+        jobs = jobs_collection()
+        await jobs.insert_many([queued_job(f"a-{i}", minutes=i, tenant_id="a") for i in range(3)])
+        await jobs.insert_one(queued_job("b-0", tenant_id="b"))
+        backlog = QueueBacklog(jobs, max_pending=5, max_tenant_pending=3, retry_after=7)
+        await backlog.check(1, tenant_id="b")
+        outcomes = []
+        for jobs_wanted, tenant_id in ((1, "a"), (2, "b")):
+            try:
+                await backlog.check(jobs_wanted, tenant_id=tenant_id)
+                outcomes.append(None)
+            except QueueBacklogError as e:
+                outcomes.append(e.retry_after)
+        # Claimed jobs no longer count against the backlog
+        await JobLeaseQueue(jobs, "w").claim(2)
+        await backlog.check(2, tenant_id="b")
+        return outcomes
+
+    assert asyncio.run(scenario()) == [7, 7]
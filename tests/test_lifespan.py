@@ -0,0 +1,38 @@
+import asyncio
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+from telemetry import StartupTimer
+
+
+def test_indexes_are_created_during_warm_up_and_retried_until_mongo_answers(server, run_app, monkeypatch):
+    monkeypatch.setattr(server, "startup_timer", StartupTimer())
+    attempts = []
+    mongo_up = asyncio.Event()
+    create = server.ensure_indexes
+
+    async def flaky_ensure_indexes(db):
+        attempts.append(mongo_up.is_set())
+        if not mongo_up.is_set():
+            raise ServerSelectionTimeoutError("mongo is down")
+        return await create(db)
+
+    monkeypatch.setattr(server, "ensure_indexes", flaky_ensure_indexes)
+
+    async def scenario(client):
+        # The app serves right away; only readiness waits for the indexes
+        served = (await client.get("/api/")).status_code
+        await asyncio.sleep(0.1)
+        not_ready = (await client.get("/ready")).status_code
+        mongo_up.set()
+        for _ in range(100):
+            ready = (await client.get("/ready")).status_code
+            if ready == 200:
+                break
+            await asyncio.sleep(0.05)
+        return served, not_ready, ready
+
+    served, not_ready, ready = run_app(scenario)
+    assert (served, not_ready, ready) == (200, 503, 200)
+    assert attempts[0] is False and attempts[-1] is True
+    assert "indexes" in server.startup_timer.phases
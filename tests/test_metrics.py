@@ -0,0 +1,65 @@
+import re
+
+from telemetry import JobTrace, MetricsRegistry, StageMetrics
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_ms", "Latency", ("tenant",), buckets=(10, 100))
+    for value in (5, 50, 50, 500):
+        histogram.observe(value, "acme")
+
+    assert registry.render().splitlines() == [
+        "# HELP latency_ms Latency",
+        "# TYPE latency_ms histogram",
+        'latency_ms_bucket{tenant="acme",le="10"} 1',
+        'latency_ms_bucket{tenant="acme",le="100"} 3',
+        'latency_ms_bucket{tenant="acme",le="+Inf"} 4',
+        'latency_ms_sum{tenant="acme"} 605',
+        'latency_ms_count{tenant="acme"} 4',
+    ]
+    assert histogram.total(tenant="acme") == (605, 4)
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs", ("tenant",)).inc('a"b\\c\nd')
+    assert 'jobs_total{tenant="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_stage_metrics_export_each_stage_of_a_trace():
+    registry = MetricsRegistry()
+    stage_metrics = StageMetrics(registry)
+    trace = JobTrace("acme")
+    trace.add("decode", 3)
+    trace.add("decode", 4)
+    trace.add("storage", 20)
+    stage_metrics.observe_job(trace, "completed", 40)
+    stage_metrics.observe_stage(trace, "serialization", 2)
+
+    assert stage_metrics.stage_latency.total(stage="decode") == (7, 1)
+    assert stage_metrics.stage_latency.total(tenant="acme") == (29, 3)
+    assert stage_metrics.job_latency.total(status="completed") == (40, 1)
+    assert stage_metrics.jobs.total(tenant="acme", status="completed") == 1
+
+
+def test_metrics_endpoint_exports_stage_histograms_per_tenant(run_app, job_request):
+    async def scenario(client):
+        job = await client.post("/api/tryon/jobs?mode=sync", json=job_request("metrics-tenant"))
+        return job.json(), await client.get("/metrics")
+
+    job, response = run_app(scenario)
+    assert job["status"] == "completed"
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+
+    assert "# TYPE tryon_stage_duration_ms histogram" in body
+    for stage in ("tenant_config", "db_insert", "serialization"):
+        labels = f'stage="{stage}",tenant="metrics-tenant"'
+        assert f'tryon_stage_duration_ms_bucket{{{labels},le="+Inf"}} ' in body
+        assert re.search(rf"^tryon_stage_duration_ms_count{{{labels}}} [1-9]", body, re.M)
+    assert re.search(r'^tryon_job_duration_ms_count\{tenant="metrics-tenant",status="completed"\} 1$', body, re.M)
+    assert re.search(r'^tryon_jobs_total\{tenant="metrics-tenant",status="completed"\} 1$', body, re.M)
+    for gauge in ("tryon_queue_depth", "tryon_workers_busy", "image_executor_in_flight"):
+        assert re.search(rf"^{gauge} \d", body, re.M)
@@ -0,0 +1,77 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from imaging import RENDITIONS, encode_renditions, format_available
+from tenant_config import resolve_profile
+
+
+def profile(fidelity: str = "medium"):
+    return resolve_profile("encoding", {"flags": {"fidelity_profile": fidelity}})
+
+
+@pytest.mark.parametrize("options,expected", [
+    ({}, ("png", None)),
+    ({"format": "JPG"}, ("jpeg", 82)),
+    ({"format": "webp", "quality": 55}, ("webp", 55)),
+    ({"format": "jpeg", "quality": 500}, ("jpeg", 100)),
+    # PNG is lossless, so a quality would only split the cache
+    ({"format": "png", "quality": 40}, ("png", None)),
+])
+def test_render_settings_pick_format_and_quality(options, expected):
+    settings = profile().render_settings(options)
+    assert (settings["format"], settings["quality"]) == expected
+    assert settings["renditions"] == RENDITIONS
+
+
+def test_lossy_quality_defaults_to_the_fidelity_profile():
+    assert profile("low").render_settings({"format": "jpeg"})["quality"] == 70
+    assert profile("high").render_settings({"format": "jpeg"})["quality"] == 92
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        profile().render_settings({"format": "bmp"})
+
+
+@pytest.mark.parametrize("output_format,pillow_format", [("png", "PNG"), ("jpeg", "JPEG"), ("webp", "WEBP")])
+def test_renditions_are_encoded_in_the_format_at_each_width(output_format, pillow_format):
+    if not format_available(output_format):
+        pytest.skip(f"{output_format} encoding is not available in this Pillow build")
+    settings = profile().render_settings({"format": output_format})
+    renditions = encode_renditions(Image.new("RGB", (1024, 1536), "purple"), settings)
+    assert {name: (entry["width"], entry["height"]) for name, entry in renditions.items()} == {
+        "full": (1024, 1536), "mobile": (640, 960), "thumb": (256, 384)
+    }
+    for entry in renditions.values():
+        decoded = Image.open(io.BytesIO(entry["data"]))
+        assert decoded.format == pillow_format and decoded.size == (entry["width"], entry["height"])
+
+
+def test_lower_quality_encodes_smaller():
+    noisy = Image.effect_noise((512, 512), 64).convert("RGB")
+    sizes = [
+        len(encode_renditions(noisy, profile().render_settings({"format": "jpeg", "quality": quality}))["full"]["data"])
+        for quality in (30, 95)
+    ]
+    assert sizes[0] < sizes[1]
+
+
+def test_jobs_return_renditions_in_the_requested_format(server, run_app, job_request, monkeypatch):
+    async def scenario(client):
+        jpeg = await client.post("/api/tryon/jobs?mode=sync", json=job_request("encoding", format="jpeg", quality=60))
+        monkeypatch.setattr(server, "format_available", lambda output_format: output_format != "avif")
+        unavailable = await client.post("/api/tryon/jobs?mode=sync", json=job_request("encoding", format="avif"))
+        thumb = await client.get(jpeg.json()["result_renditions"]["thumb"]["url"])
+        return jpeg.json(), unavailable, thumb
+
+    job, unavailable, thumb = run_app(scenario)
+    assert base64.b64decode(job["result_base64"]).startswith(b"\xff\xd8")
+    assert job["metrics"]["format"] == "jpeg"
+    assert set(job["result_renditions"]) == set(RENDITIONS)
+    assert {entry["content_type"] for entry in job["result_renditions"].values()} == {"image/jpeg"}
+    assert thumb.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(thumb.content)).width == job["result_renditions"]["thumb"]["width"] == 256
+    assert unavailable.status_code == 400
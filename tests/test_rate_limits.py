@@ -0,0 +1,35 @@
+import pytest
+
+from rate_limits import RateLimitedError, TokenBucketLimiter
+
+
+def test_disabled_limiter_never_limits():
+    limiter = TokenBucketLimiter("tenant", rate=0, burst=1)
+    for _ in range(100):
+        limiter.acquire("tenant")
+
+
+def test_bucket_empties_and_reports_retry_after(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("rate_limits.time.monotonic", lambda: now[0])
+    limiter = TokenBucketLimiter("session", rate=0.5, burst=2)
+    limiter.acquire("s")
+    limiter.acquire("s")
+    with pytest.raises(RateLimitedError) as limited:
+        limiter.acquire("s")
+    assert (limited.value.scope, limited.value.retry_after) == ("session", 2)
+    # Other keys have their own buckets
+    limiter.acquire("other")
+    now[0] += 2
+    limiter.acquire("s")
+
+
+def test_scale_and_oversized_requests(monkeypatch):
+    monkeypatch.setattr("rate_limits.time.monotonic", lambda: 1000.0)
+    limiter = TokenBucketLimiter("tenant", rate=1, burst=2)
+    # A weight-2 plan gets twice the burst
+    limiter.acquire("premium", 4, scale=2.0)
+    # A batch larger than the bucket is charged a full bucket instead of never fitting
+    limiter.acquire("basic", 10)
+    with pytest.raises(RateLimitedError):
+        limiter.acquire("basic", 1)
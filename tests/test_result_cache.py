@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from result_cache import TryOnResultCache, normalize_options
+
+
+class DictStore:
+    """Durable tier shared by every process, as the Mongo tier is"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def put(self, key, data):
+        self.data[key] = data
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_get_or_compute_caches_and_coalesces():
+    async def scenario():
+        cache = TryOnResultCache(1024)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return b"result"
+
+        first = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)))
+        second = await cache.get_or_compute("key", compute)
+        return calls, [status for _, status in first], second
+
+    calls, statuses, second = asyncio.run(scenario())
+    assert calls == 1
+    assert sorted(statuses) == ["coalesced", "coalesced", "miss"]
+    assert second == (b"result", "memory")
+
+
+def test_invalid_cached_entry_is_evicted_and_recomputed():
+    async def scenario():
+        store = DictStore()
+        # This process cached the manifest; another one's retention deleted its blobs
+        cache = TryOnResultCache(1024, store)
+        await cache.put("key", b"stale")
+        blobs = {b"fresh"}
+
+        async def is_valid(data):
+            return data in blobs
+
+        async def compute():
+            return b"fresh"
+
+        recomputed = await cache.get_or_compute("key", compute, is_valid)
+        cached = await cache.get_or_compute("key", compute, is_valid)
+        return recomputed, cached, store.data["key"], cache.misses
+
+    recomputed, cached, stored, misses = asyncio.run(scenario())
+    assert recomputed == (b"fresh", "miss")
+    assert cached == (b"fresh", "memory")
+    assert stored == b"fresh"
+    assert misses == 1
+
+
+@pytest.mark.parametrize("value,expected", [
+    (True, True), (False, False), (None, False),
+    ("true", True), ("Yes", True), ("1", True), ("false", False), ("no", False), ("0", False), ("off", False),
+])
+def test_watermark_option_parses_booleans_strictly(value, expected):
+    assert normalize_options({"watermark": value})["watermark"] is expected
+
+
+@pytest.mark.parametrize("value", ["maybe", 2, 1, [], {}])
+def test_watermark_option_rejects_anything_else(value):
+    with pytest.raises(ValueError):
+        normalize_options({"watermark": value})
+
+
+def test_non_boolean_watermark_is_a_bad_request(server, run_app, job_request):
+    async def scenario(client):
+        rejected = await client.post("/api/tryon/jobs?mode=sync", json=job_request("watermarks", watermark="maybe"))
+        plain = await client.post("/api/tryon/jobs?mode=sync", json=job_request("watermarks", watermark="no"))
+        unmarked = await client.post("/api/tryon/jobs?mode=sync", json=job_request("watermarks", watermark=False))
+        return rejected.status_code, plain.json()["result_base64"], unmarked.json()["result_base64"]
+
+    rejected, plain, unmarked = run_app(scenario)
+    assert rejected == 400
+    # "no" renders, and is cached, exactly as false does
+    assert plain == unmarked
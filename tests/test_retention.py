@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from blob_store import LocalBlobStore
+from result_cache import TryOnResultCache
+from retention import RetentionService, job_expiry
+
+DEFAULT_DAYS = 72
+
+
+def retention_service(tmp_path):
+    db = AsyncMongoMockClient()["retention"]
+    blobs = LocalBlobStore(str(tmp_path / "blobs"))
+    cache = TryOnResultCache(max_bytes=1024 * 1024)
+    service = RetentionService(db.tryon_jobs, db.tenant_configs, blobs, cache, DEFAULT_DAYS, batch_size=2, pause_seconds=0, measure_bytes=False)
+    return db, blobs, cache, service
+
+
+def job(job_id: str, tenant_id: str, age_days: float, stamped_days=None, blob_key=None, cache_key=None):
+    created_at = datetime.now(timezone.utc) - timedelta(days=age_days)
+    document = {"id": job_id, "tenant_id": tenant_id, "created_at": created_at}
+    if stamped_days is not None:
+        document["expires_at"] = job_expiry(created_at, stamped_days)
+    if blob_key is not None:
+        document["result_blob_key"] = blob_key
+    if cache_key is not None:
+        document["result_cache_key"] = cache_key
+    return document
+
+
+def test_run_once_honours_overrides_expiry_and_legacy_jobs(tmp_path):
+    async def scenario():
+        db, _, _, service = retention_service(tmp_path)
+        await db.tenant_configs.insert_many([
+            {"client_id": "short", "flags": {"retention_days": 10}},
+            {"client_id": "long", "flags": {"retention_days": 90}},
+        ])
+        await db.tryon_jobs.insert_many([
+            # Shortened retention applies to jobs stamped with the default
+            job("short-old", "short", 20, stamped_days=DEFAULT_DAYS),
+            job("short-new", "short", 5, stamped_days=DEFAULT_DAYS),
+            # Lengthened retention keeps jobs stamped for 30 days and moves their stamp
+            job("long-kept", "long", 40, stamped_days=30),
+            job("long-old", "long", 100, stamped_days=30),
+            job("default-expired", "plain", 80, stamped_days=DEFAULT_DAYS),
+            job("default-live", "plain", 10, stamped_days=DEFAULT_DAYS),
+            # Legacy jobs without a stamp fall back to the default retention
+            job("legacy-old", "plain", 80),
+            job("legacy-new", "plain", 10),
+        ])
+        report = await service.run_once()
+        remaining = {document["id"]: document async for document in db.tryon_jobs.find({})}
+        return report, remaining
+
+    report, remaining = asyncio.run(scenario())
+    assert set(remaining) == {"short-new", "long-kept", "default-live", "legacy-new"}
+    assert report.documents == 4 and report.tenants == 2 and report.restamped == 1
+    kept = remaining["long-kept"]
+    assert kept["expires_at"] == job_expiry(kept["created_at"], 90)
+
+
+def test_shared_blobs_outlive_jobs_that_still_reference_them(tmp_path):
+    async def scenario():
+        db, blobs, cache, service = retention_service(tmp_path)
+        await blobs.put("results/shared.png", b"shared", "image/png")
+        await blobs.put("results/own.png", b"own", "image/png")
+        await cache.get_or_compute("shared-key", lambda: asyncio.sleep(0, b"{}"))
+        await db.tryon_jobs.insert_many([
+            job("expired-shared", "plain", 80, stamped_days=DEFAULT_DAYS, blob_key="results/shared.png", cache_key="shared-key"),
+            job("live-shared", "plain", 1, stamped_days=DEFAULT_DAYS, blob_key="results/shared.png", cache_key="shared-key"),
+            job("expired-own", "plain", 80, stamped_days=DEFAULT_DAYS, blob_key="results/own.png"),
+        ])
+        first = await service.run_once()
+        shared_after_first = await blobs.exists("results/shared.png"), "shared-key" in cache.memory
+        await db.tryon_jobs.update_one({"id": "live-shared"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(days=1)}})
+        second = await service.run_once()
+        return first, shared_after_first, await blobs.exists("results/own.png"), second, await blobs.exists("results/shared.png"), "shared-key" in cache.memory
+
+    first, shared_after_first, own_exists, second, shared_exists, cached = asyncio.run(scenario())
+    assert (first.documents, first.blobs, first.blob_bytes) == (2, 1, 3)
+    assert shared_after_first == (True, True)
+    assert not own_exists
+    assert (second.documents, second.blobs) == (1, 1)
+    assert not shared_exists and not cached
+
+
+def test_changing_retention_restamps_stored_jobs(server, run_app):
+    async def scenario(client):
+        await client.post("/api/tenants", json={"client_id": "growing", "flags": {"retention_days": 30}})
+        stored = job("growing-job", "growing", 20, stamped_days=30)
+        await server.db.tryon_jobs.insert_one(stored)
+        await client.post("/api/tenants", json={"client_id": "growing", "flags": {"retention_days": 90}})
+        await asyncio.gather(*server.retention_service._restamps)
+        return stored["created_at"], (await server.db.tryon_jobs.find_one({"id": "growing-job"}))["expires_at"]
+
+    created_at, expires_at = run_app(scenario)
+    assert abs(expires_at.replace(tzinfo=timezone.utc) - job_expiry(created_at, 90)) < timedelta(seconds=1)
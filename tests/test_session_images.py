@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.mark.parametrize("auth_enabled,tenant_id,expected_status,expected_max_res", [
+    (True, None, 200, 1024),
+    (True, "other-tenant", 403, None),
+    (False, "other-tenant", 200, 2048),
+])
+def test_person_image_tenant_comes_from_the_session(request, server, run_app, job_request, auth_enabled, tenant_id, expected_status, expected_max_res):
+    if auth_enabled:
+        request.getfixturevalue("session_auth")
+
+    async def scenario(client):
+        # The session's own tenant renders from at most 1024px; the one named in the body from 2048px
+        await client.post("/api/tenants", json={"client_id": "session-tenant", "flags": {"speed_profile": "fast"}})
+        await client.post("/api/tenants", json={"client_id": "other-tenant", "flags": {"speed_profile": "quality"}})
+        token = (await client.post("/api/auth/session", json={"client_id": "session-tenant"})).json()["session_token"]
+        registration = {"person_image": job_request("other-tenant")["person_image"], "options": {"maxRes": 4096}}
+        if tenant_id is not None:
+            registration["tenant_id"] = tenant_id
+        return await client.post("/api/tryon/person-images", json=registration, headers={"Authorization": f"Bearer {token}"})
+
+    response = run_app(scenario)
+    assert response.status_code == expected_status
+    if expected_max_res is not None:
+        assert response.json()["max_res"] == expected_max_res
+
+
+def test_logout_revokes_the_token_and_drops_its_images(server, run_app, job_request, session_auth):
+    async def scenario(client):
+        token = (await client.post("/api/auth/session", json={"client_id": "logout-tenant"})).json()["session_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        registration = {"person_image": job_request("logout-tenant")["person_image"]}
+        registered = await client.post("/api/tryon/person-images", json=registration, headers=headers)
+        held_before = sum(1 for key in server.session_images.entries.keys() if key[0] == token)
+        logout = await client.delete("/api/auth/session", headers=headers)
+        after = await client.post("/api/tryon/person-images", json=registration, headers=headers)
+        again = await client.delete("/api/auth/session", headers=headers)
+        held_after = sum(1 for key in server.session_images.entries.keys() if key[0] == token)
+        return registered.status_code, held_before, held_after, logout.status_code, after.status_code, again.status_code
+
+    registered, held_before, held_after, logout, after, again = run_app(scenario)
+    assert registered == 200
+    assert held_before > 0 and held_after == 0
+    assert (logout, after, again) == (204, 401, 401)
@@ -0,0 +1,75 @@
+import io
+import json
+
+import pytest
+
+
+async def cheap_session(client) -> dict:
+    """A session for the basic "cheap" tenant, next to an enterprise "rich" tenant with a catalog"""
+    await client.post("/api/tenants", json={"client_id": "rich", "plan_tier": "enterprise", "flags": {"speed_profile": "balanced"}})
+    await client.post("/api/catalog/import", json={"tenant_id": "rich", "products": [{"productId": "rich-p1", "title": "Rich", "variants": []}]})
+    token = (await client.post("/api/auth/session", json={"client_id": "cheap"})).json()["session_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cross_tenant_requests_are_refused(server, run_app, job_request, session_auth):
+    async def scenario(client):
+        headers = await cheap_session(client)
+        person = job_request("rich")["person_image"]
+        before = await server.db.tryon_jobs.count_documents({"tenant_id": "rich"})
+        responses = {
+            "job": await client.post("/api/tryon/jobs?mode=async", json=job_request("rich"), headers=headers),
+            "upload": await client.post(
+                "/api/tryon/jobs/upload?mode=async",
+                data={"tenant_id": "rich"},
+                files={"person_image": ("p.png", io.BytesIO(b"p")), "clothing_image": ("c.png", io.BytesIO(b"c"))},
+                headers=headers
+            ),
+            "batch": await client.post(
+                "/api/tryon/batch",
+                json={"tenant_id": "rich", "person_image": person, "items": [{"clothing_image": person}]},
+                headers=headers
+            ),
+            "import": await client.post("/api/catalog/import", json={"tenant_id": "rich", "products": []}, headers=headers),
+            "ndjson": await client.post("/api/catalog/import/ndjson?tenant_id=rich", content=b"", headers=headers),
+            "products": await client.get("/api/catalog/products?tenant_id=rich", headers=headers),
+            "events": await client.get("/api/tryon/events?tenant_id=rich", headers=headers),
+        }
+        stored = await server.db.tryon_jobs.count_documents({"tenant_id": "rich"}) - before
+        return {name: response.status_code for name, response in responses.items()}, stored
+
+    statuses, stored = run_app(scenario)
+    assert statuses == {name: 403 for name in statuses}
+    assert stored == 0
+
+
+def test_session_tenant_applies_when_the_request_names_none(server, run_app, job_request, session_auth):
+    async def scenario(client):
+        headers = await cheap_session(client)
+        body = job_request("ignored")
+        del body["tenant_id"]
+        created = await client.post("/api/tryon/jobs?mode=async", json=body, headers=headers)
+        await client.post(
+            "/api/catalog/import/ndjson",
+            content=json.dumps({"productId": "cheap-p1", "title": "Cheap", "variants": []}).encode(),
+            headers=headers
+        )
+        listed = await client.get("/api/catalog/products", headers=headers)
+        job = await server.db.tryon_jobs.find_one({"id": created.json()["job_id"]})
+        return created.status_code, job["tenant_id"], [product["tenant_id"] for product in listed.json()["products"]]
+
+    status, job_tenant, product_tenants = run_app(scenario)
+    assert status == 202
+    assert job_tenant == "cheap"
+    assert product_tenants == ["cheap"]
+
+
+@pytest.mark.parametrize("tenant_id", ["rich", None])
+def test_catalog_tenant_follows_the_request_without_session_auth(server, run_app, tenant_id):
+    async def scenario(client):
+        await cheap_session(client)
+        query = {"tenant_id": tenant_id} if tenant_id else {}
+        return (await client.get("/api/catalog/products", params=query)).json()["products"]
+
+    products = run_app(scenario)
+    assert [product["tenant_id"] for product in products] == (["rich"] if tenant_id else [])
@@ -0,0 +1,65 @@
+import pytest
+
+from tenant_config import DEFAULT_TENANT_FLAGS, parse_retention_days, resolve_profile, validate_flags
+
+
+def test_resolve_profile_defaults():
+    profile = resolve_profile("tenant", None)
+    assert profile.plan_tier == "basic"
+    assert profile.speed_profile == DEFAULT_TENANT_FLAGS["speed_profile"]
+    assert profile.retention_days == DEFAULT_TENANT_FLAGS["retention_days"]
+
+
+def test_resolve_profile_uses_valid_flags():
+    profile = resolve_profile("tenant", {
+        "plan_tier": "enterprise",
+        "flags": {"speed_profile": "quality", "fidelity_profile": "high", "watermarks": True, "retention_days": 30}
+    })
+    assert (profile.priority, profile.max_input_res, profile.quality) == (0, 2048, 92)
+    assert profile.watermark is True
+    assert profile.retention_days == 30
+
+
+@pytest.mark.parametrize("flags", [
+    {"retention_days": "soon"},
+    {"retention_days": -5},
+    {"retention_days": 10 ** 9},
+    {"retention_days": None},
+    {"speed_profile": ["fast"], "fidelity_profile": {}, "watermarks": "yes"},
+    "not-a-dict",
+])
+def test_resolve_profile_falls_back_per_field(flags):
+    profile = resolve_profile("tenant", {"plan_tier": ["basic"], "flags": flags})
+    defaults = resolve_profile("tenant", None)
+    assert profile == defaults
+
+
+def test_resolve_profile_keeps_valid_fields_next_to_bad_ones():
+    profile = resolve_profile("tenant", {"flags": {"speed_profile": "balanced", "retention_days": -1}})
+    assert profile.speed_profile == "balanced"
+    assert profile.retention_days == DEFAULT_TENANT_FLAGS["retention_days"]
+
+
+def test_parse_retention_days():
+    assert parse_retention_days(7) == 7
+    assert parse_retention_days("7") == 7
+    assert parse_retention_days(7.0) == 7
+    for value in (0, 3651, 1.5, True, None, "x"):
+        with pytest.raises(ValueError):
+            parse_retention_days(value)
+
+
+def test_validate_flags():
+    assert validate_flags({"speed_profile": "fast", "retention_days": 14.0}) == {"speed_profile": "fast", "retention_days": 14}
+    assert validate_flags({"custom": "kept"}) == {"custom": "kept"}
+    for flags in (
+        [],
+        {"speed_profile": "ludicrous"},
+        {"fidelity_profile": ["high"]},
+        {"watermarks": "true"},
+        {"retention_days": "30"},
+        {"retention_days": -1},
+        {"retention_days": 100000},
+    ):
+        with pytest.raises(ValueError):
+            validate_flags(flags)
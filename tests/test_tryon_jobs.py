@@ -0,0 +1,50 @@
+import base64
+
+import pytest
+
+NOT_AN_IMAGE = base64.b64encode(b"definitely not an image").decode()
+
+
+@pytest.mark.parametrize("execution", ["local", "queue"])
+@pytest.mark.parametrize("field,value", [
+    ("person_image", "invalid_base64"),
+    ("clothing_image", NOT_AN_IMAGE),
+])
+def test_invalid_images_are_rejected_before_the_job_is_stored(server, run_app, job_request, monkeypatch, execution, field, value):
+    monkeypatch.setattr(server, "TRYON_EXECUTION", execution)
+
+    async def scenario(client):
+        before = await server.db.tryon_jobs.count_documents({})
+        response = await client.post("/api/tryon/jobs?mode=sync", json={**job_request("invalid"), field: value})
+        return response, await server.db.tryon_jobs.count_documents({}) - before
+
+    response, stored = run_app(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid image")
+    assert stored == 0
+
+
+def test_valid_sync_job_completes(server, run_app, job_request):
+    async def scenario(client):
+        return await client.post("/api/tryon/jobs?mode=sync", json=job_request("valid"))
+
+    response = run_app(scenario)
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert base64.b64decode(response.json()["result_base64"]).startswith(b"\x89PNG")
+
+
+def test_status_polls_of_a_completed_job_link_its_result(run_app, job_request):
+    async def scenario(client):
+        job = (await client.post("/api/tryon/jobs?mode=sync", json=job_request("polled"))).json()
+        status = await client.get(f"/api/tryon/jobs/{job['job_id']}")
+        batch = await client.post("/api/tryon/jobs/status", json={"job_ids": [job["job_id"]]})
+        return job, status.json(), batch.json()["jobs"][0]
+
+    job, status, batch_status = run_app(scenario)
+    for polled in (status, batch_status):
+        assert polled["status"] == "completed"
+        assert polled["result_url"] == job["result_url"] is not None
+        assert polled["result_renditions"] == job["result_renditions"]
+        # The image itself is only returned with include_result
+        assert polled["result_base64"] is None
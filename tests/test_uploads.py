@@ -0,0 +1,81 @@
+import base64
+
+import pytest
+
+BOUNDARY = "tryon-test-boundary"
+
+
+def multipart_body(parts) -> bytes:
+    """A multipart/form-data body from (name, filename or None, bytes) parts"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def images(job_request):
+    body = job_request("uploads")
+    return base64.b64decode(body["person_image"]), base64.b64decode(body["clothing_image"])
+
+
+def test_upload_runs_the_same_pipeline_as_json(server, run_app, images):
+    person, clothing = images
+
+    async def scenario(client):
+        return await client.post(
+            "/api/tryon/jobs/upload?mode=sync",
+            data={"tenant_id": "uploads", "options": '{"format": "png"}'},
+            files={"person_image": ("person.png", person, "image/png"), "clothing_image": ("clothing.png", clothing, "image/png")}
+        )
+
+    response = run_app(scenario)
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert base64.b64decode(response.json()["result_base64"]).startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("case", ["declared_body", "streamed_body", "file"])
+def test_oversize_uploads_are_rejected_with_413(server, run_app, images, monkeypatch, case):
+    person, clothing = images
+    monkeypatch.setattr(server, "TRYON_UPLOAD_MAX_BYTES", 1024)
+    # Roomy enough for two small files, so the per-file limit is what trips in the "file" case
+    monkeypatch.setattr(server, "TRYON_UPLOAD_MAX_BODY_BYTES", 8 * 1024 if case == "file" else 2048)
+    large = b"x" * 4096
+    body = multipart_body([("person_image", "p.png", large), ("clothing_image", "c.png", clothing)])
+
+    async def chunks():
+        for start in range(0, len(body), 512):
+            yield body[start:start + 512]
+
+    async def scenario(client):
+        before = await server.db.tryon_jobs.count_documents({})
+        response = await client.post(
+            "/api/tryon/jobs/upload",
+            # A streamed body has no Content-Length, so the limit trips while reading it
+            content=chunks() if case == "streamed_body" else body,
+            headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+        )
+        return response, await server.db.tryon_jobs.count_documents({}) - before
+
+    response, stored = run_app(scenario)
+    assert response.status_code == 413
+    assert stored == 0
+
+
+@pytest.mark.parametrize("parts,detail", [
+    ([("person_image", "p.png", b"p")], "Missing file part: clothing_image"),
+    ([("person_image", "p.png", b"p"), ("clothing_image", "c.png", b"c"), ("options", None, b"[1]")], "options must be a JSON object"),
+])
+def test_malformed_uploads_are_rejected_with_400(server, run_app, parts, detail):
+    async def scenario(client):
+        return await client.post(
+            "/api/tryon/jobs/upload",
+            content=multipart_body(parts),
+            headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+        )
+
+    response = run_app(scenario)
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
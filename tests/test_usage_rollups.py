@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from usage_rollups import UsageRollups, as_utc
+
+NOW = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def make_rollups(db=None) -> UsageRollups:
+    db = db if db is not None else AsyncMongoMockClient()["test"]
+    return UsageRollups(db.usage_rollups, db.usage_rollup_state)
+
+
+async def record_jobs(rollups: UsageRollups):
+    await rollups.record("tenant", "completed", 120.0, NOW)
+    await rollups.record("tenant", "failed", None, NOW + timedelta(minutes=5))
+    await rollups.record("tenant", "completed", 80.0, NOW - timedelta(days=3))
+
+
+def test_as_utc_treats_naive_as_utc():
+    assert as_utc(datetime(2026, 10, 1)) == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    offset = datetime(2026, 10, 1, 2, tzinfo=timezone(timedelta(hours=2)))
+    assert as_utc(offset) == datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def test_summary_all_time():
+    async def scenario():
+        rollups = make_rollups()
+        await record_jobs(rollups)
+        return await rollups.summary("tenant")
+
+    summary = asyncio.run(scenario())
+    assert summary["granularity"] == "all"
+    assert (summary["total_jobs"], summary["completed_jobs"], summary["failed_jobs"]) == (3, 2, 1)
+
+
+def test_summary_accepts_naive_and_aware_bounds():
+    async def scenario():
+        rollups = make_rollups()
+        await record_jobs(rollups)
+        naive_start = datetime(2026, 10, 1)
+        aware_end = datetime(2026, 10, 2, tzinfo=timezone.utc)
+        return [
+            await rollups.summary("tenant", naive_start, aware_end),
+            await rollups.summary("tenant", naive_start.replace(tzinfo=timezone.utc), aware_end.replace(tzinfo=None)),
+            await rollups.summary("tenant", naive_start),
+        ]
+
+    mixed, swapped, open_ended = asyncio.run(scenario())
+    assert mixed == swapped
+    assert mixed["total_jobs"] == 2
+    assert mixed["window"]["start"] == "2026-10-01T00:00:00+00:00"
+    assert open_ended["total_jobs"] == 2
+
+
+def test_summary_rejects_too_many_buckets():
+    rollups = make_rollups()
+    start = datetime(2026, 1, 1)
+    with pytest.raises(ValueError):
+        asyncio.run(rollups.summary("tenant", start, start + timedelta(days=30), "minute"))
+
+
+def finished_job(job_id: str, completed_at: datetime, status: str = "completed"):
+    return {"id": job_id, "tenant_id": "tenant", "status": status, "latency_ms": 100.0, "completed_at": completed_at}
+
+
+def test_backfill_counts_jobs_before_live_recording_once():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        rollups = make_rollups(db)
+        await db.tryon_jobs.insert_many([
+            finished_job("old-1", NOW - timedelta(days=2)),
+            finished_job("old-2", NOW - timedelta(days=1), "failed"),
+            # Finished after live recording started, so already counted
+            finished_job("live", NOW + timedelta(minutes=1)),
+            {"id": "running", "tenant_id": "tenant", "status": "processing"},
+        ])
+        await rollups.record("tenant", "completed", 100.0, NOW + timedelta(minutes=1))
+        counted = await rollups.backfill(db.tryon_jobs, batch_size=1)
+        again = await rollups.backfill(db.tryon_jobs)
+        return counted, again, await rollups.backfill_done(), await rollups.summary("tenant")
+
+    counted, again, done, summary = asyncio.run(scenario())
+    assert counted == 2
+    assert again is None
+    assert done
+    assert (summary["total_jobs"], summary["completed_jobs"], summary["failed_jobs"]) == (3, 2, 1)
+
+
+def test_backfill_is_leased_to_one_process():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        rollups = make_rollups(db)
+        await db.tryon_jobs.insert_one(finished_job("old", NOW))
+        await db.usage_rollup_state.insert_one({
+            "_id": "backfill", "status": "running", "owner": "other", "cutoff": NOW + timedelta(days=1), "jobs": 0,
+            "lease_expires_at": datetime.now(timezone.utc) + timedelta(minutes=5)
+        })
+        held = await rollups.backfill(db.tryon_jobs)
+        # Once the other process's lease runs out, its run is taken over
+        await db.usage_rollup_state.update_one({"_id": "backfill"}, {"$set": {"lease_expires_at": NOW}})
+        taken_over = await rollups.backfill(db.tryon_jobs)
+        return held, taken_over
+
+    assert asyncio.run(scenario()) == (None, 1)
+
+
+def test_backfill_resumes_after_a_failed_run():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        rollups = make_rollups(db)
+        await db.tryon_jobs.insert_many([finished_job(f"old-{i}", NOW - timedelta(hours=i)) for i in range(3)])
+        original = rollups.collection.bulk_write
+        writes = 0
+
+        async def failing_bulk_write(ops, ordered=True):
+            nonlocal writes
+            writes += 1
+            if writes == 2:
+                raise RuntimeError("connection lost")
+            return await original(ops, ordered=ordered)
+
+        rollups.collection.bulk_write = failing_bulk_write
+        with pytest.raises(RuntimeError):
+            await rollups.backfill(db.tryon_jobs, batch_size=1)
+        rollups.collection.bulk_write = original
+        await db.usage_rollup_state.update_one({"_id": "backfill"}, {"$set": {"lease_expires_at": NOW}})
+        counted = await rollups.backfill(db.tryon_jobs, batch_size=1)
+        return counted, await rollups.summary("tenant")
+
+    counted, summary = asyncio.run(scenario())
+    assert counted == 3
+    assert summary["total_jobs"] == 3